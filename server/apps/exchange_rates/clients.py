@@ -1,10 +1,10 @@
 import abc
-import decimal
 from typing import Optional
 
 import aiohttp
 
 import settings
+from core.common import amounts
 
 
 class BaseClient(metaclass=abc.ABCMeta):
@@ -16,7 +16,8 @@ class BaseClient(metaclass=abc.ABCMeta):
         async with aiohttp.ClientSession(base_url=cls.url, headers=cls.headers) as session:
             async with session.get(method, params=params or {}) as response:
                 response.raise_for_status()
-                response = await response.json()
+                # Prices keep the digits they were sent with
+                response = await response.json(loads=amounts.loads)
         return response
 
     @abc.abstractclassmethod
@@ -39,7 +40,7 @@ class CoinGeckoClient(BaseClient):
         )
         return {
             coin: {
-                'value': decimal.Decimal(repr(info['usd'])),
+                'value': amounts.to_decimal(info['usd']),
                 'timestamp': info['last_updated_at'],
             }
             for coin, info in response.items()
@@ -60,7 +61,7 @@ class ExchangeRateClient(BaseClient):
             if price := response['conversion_rates'].get(coin.upper()):
                 result.update({
                     coin: {
-                        'value': decimal.Decimal(repr(price)),
+                        'value': amounts.to_decimal(price),
                         'timestamp': response['time_last_update_unix'],
                     }
                 })
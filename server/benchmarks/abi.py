@@ -0,0 +1,30 @@
+"""
+Transfer calldata decoding: generic ABI codecs vs node codec cache.
+Run: python -m benchmarks.abi
+"""
+import eth_abi
+from tronpy.abi import tron_abi
+
+from core.blockchain.gates import TronNode, EVMNode
+from core.blockchain.gates.abi import TRANSFER_TYPES
+from benchmarks.utils import measure, report
+
+DATA = (
+    '000000000000000000000000a614f803b6fd780986a42c78ec9c7f77e6ded13c'
+    '00000000000000000000000000000000000000000000000000000000017d7840'
+)
+
+
+def main():
+    report('TRC20 transfer(address,uint256)', {
+        'tron_abi.decode_single': measure(lambda: tron_abi.decode_single('(address,uint256)', bytes.fromhex(DATA))),
+        'TronNode.decode_data': measure(lambda: TronNode.decode_data(TRANSFER_TYPES, DATA)),
+    })
+    report('ERC20 transfer(address,uint256)', {
+        'eth_abi.decode': measure(lambda: eth_abi.decode(TRANSFER_TYPES, bytes.fromhex(DATA))),
+        'EVMNode.decode_data': measure(lambda: EVMNode.decode_data(TRANSFER_TYPES, DATA)),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Address matching: the former text forms (base58 from `visible=True`, checksummed EVM) vs 20 byte keys.
+Base58 encoding done by the node for `visible=True` is not measured here, only the scraper side.
+Run: python -m benchmarks.addresses
+"""
+import random
+
+from eth_utils import to_checksum_address
+from tronpy.keys import to_base58check_address, to_hex_address
+
+from core.blockchain import addresses
+from benchmarks.utils import measure, report
+
+WATCHED_ADDRESSES = 10_000
+
+
+def main():
+    rng = random.Random(1)
+    keys = [rng.randbytes(20) for _ in range(WATCHED_ADDRESSES)]
+    key = keys[0]
+    base58_address, tron_hex_address = addresses.to_base58(key), '41' + key.hex()
+    evm_address = addresses.to_checksum(key)
+    by_base58 = {addresses.to_base58(key): order_id for order_id, key in enumerate(keys)}
+    by_key = {key: order_id for order_id, key in enumerate(keys)}
+
+    report('Tron native transfer recipient lookup', {
+        'base58 str in dict': measure(lambda: by_base58.get(base58_address)),
+        'from_tron_hex(hex) in dict': measure(lambda: by_key.get(addresses.from_tron_hex(tron_hex_address))),
+    })
+    report('TRC20 `transfer` data recipient lookup', {
+        'to_base58check_address(data)': measure(
+            lambda: by_base58.get(to_base58check_address('41' + tron_hex_address[2:])),
+        ),
+        'bytes.fromhex(data)': measure(lambda: by_key.get(bytes.fromhex(tron_hex_address[2:]))),
+    })
+    report('EVM log recipient lookup', {
+        'to_checksum_address(topic)': measure(lambda: {evm_address: 1}.get(to_checksum_address(key))),
+        'bytes(topic)': measure(lambda: by_key.get(bytes(key))),
+    })
+    report('Conversions, cached vs tronpy / eth_utils', {
+        'to_hex_address(base58)': measure(lambda: to_hex_address(base58_address)),
+        'to_key(base58), cached': measure(lambda: addresses.to_key(base58_address)),
+        'to_checksum_address(key)': measure(lambda: to_checksum_address(key)),
+        'to_checksum(key), cached': measure(lambda: addresses.to_checksum(key)),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Raw token units to `Decimal`: the former float round-trip vs the exact scales.
+Run: python -m benchmarks.amounts
+"""
+import decimal
+
+from core.common.amounts import get_scale
+from benchmarks.utils import measure, report
+
+USDT_AMOUNT = 1_250_123_456                         # 6 decimal places
+TOKEN_AMOUNT = 1_250_123_456_789_012_345_678        # 18 decimal places
+BATCH = [USDT_AMOUNT + number for number in range(1000)]
+
+
+def main():
+    for title, raw_amount, decimal_place in (
+        ('USDT amount, 6 decimal places', USDT_AMOUNT, 6),
+        ('Token amount, 18 decimal places', TOKEN_AMOUNT, 18),
+    ):
+        scale = get_scale(decimal_place)
+        report(title, {
+            'Decimal(repr(raw / 10 ** places))': measure(
+                lambda: decimal.Decimal(repr(raw_amount / 10 ** decimal_place)),
+            ),
+            'Decimal(raw).scaleb(-places)': measure(lambda: decimal.Decimal(raw_amount).scaleb(-decimal_place)),
+            'get_scale(places)(raw)': measure(lambda: get_scale(decimal_place)(raw_amount)),
+            'Scale(raw), bound': measure(lambda: scale(raw_amount)),
+        })
+        exact = scale(raw_amount)
+        legacy = decimal.Decimal(repr(raw_amount / 10 ** decimal_place))
+        print(f'  exact {exact}, float round-trip {legacy}{"" if legacy == exact else " (lost digits)"}')
+
+    scale = get_scale(6)
+    report(f'Batch of {len(BATCH)} amounts (batches/sec)', {
+        'Decimal(repr(raw / 10 ** places))': measure(
+            lambda: [decimal.Decimal(repr(raw_amount / 10 ** 6)) for raw_amount in BATCH], number=1000,
+        ),
+        'Scale.many': measure(lambda: scale.many(BATCH), number=1000),
+    })
+
+
+if __name__ == '__main__':
+    main()
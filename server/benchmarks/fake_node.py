@@ -0,0 +1,356 @@
+"""
+Stand-in Tron and EVM node for load tests: an aiohttp server with the endpoints `gates.tron.Node` and
+`gates.evm.Node` call, producing synthetic blocks (or replaying a recorded corpus) at a fixed block rate,
+with injected latency, errors and reorgs. EVM also pushes `newHeads` on `/ws`.
+Run: python -m benchmarks.fake_node tron --port 8090 --block-time 3 --transactions 300 --reorg-rate 0.05
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Optional
+from dataclasses import dataclass
+
+from aiohttp import web
+
+from core.blockchain.models import NetworkFamily
+from core.blockchain.addresses import from_tron_hex, to_key
+from core.blockchain.gates import TronNode
+from core.blockchain.gates.abi import TRANSFER_SELECTOR
+from benchmarks.replay import (
+    Corpus, TRON_USDT, EVM_USDT,
+    get_tron_record, get_evm_record, get_tron_addresses, get_evm_addresses,
+)
+
+
+@dataclass
+class ChainConfig:
+    block_time: float = 3
+    transactions: int = 300                     # per block
+    transfers: int = 40                         # EVM stable coin `Transfer` logs per block
+    payment_share: float = 0.01                 # transfers to a watched address
+    watched: int = 50                           # addresses with an order
+    latency: float = 0                          # mean seconds added to every request
+    error_rate: float = 0                       # share of requests answered with 503
+    reorg_rate: float = 0                       # share of new blocks replacing the top ones
+    reorg_depth: int = 1
+    seed: int = 1
+
+
+class FakeChain:
+    """
+    Canonical chain of block records (`benchmarks.replay` format) and the moment every payment was produced.
+    A reorg replaces the top `reorg_depth` blocks: their payments are orphaned and must never be detected.
+    """
+
+    def __init__(self, family: NetworkFamily, config: ChainConfig, corpus: Optional[Corpus] = None):
+        self.family = family
+        self.config = config
+        self.corpus = corpus
+        self.rng = random.Random(config.seed)
+        if corpus is not None:
+            self.stable_coins = corpus.stable_coins
+            self.watched = corpus.watched
+            self._recipients = self._raw_watched = None
+            self._corpus_records = iter(corpus.records)
+        elif family == NetworkFamily.tron:
+            self.stable_coins = {TRON_USDT: 6}
+            self._recipients = get_tron_addresses(self.rng)
+            self._raw_watched = self._recipients[:config.watched]
+            self.watched = [TronNode.format_key(address) for address in self._raw_watched]
+        else:
+            self.stable_coins = {EVM_USDT: 6}
+            self._recipients = get_evm_addresses(self.rng)
+            self._raw_watched = self.watched = self._recipients[:config.watched]
+        self._watched_keys = self.get_watched_keys()
+
+        self.records: dict[int, dict] = {}
+        self.head: Optional[int] = None
+        self.payments: dict[str, tuple[int, float]] = {}    # transaction id: (block number, time.monotonic())
+        self.orphaned: set[str] = set()
+        self.reorgs = 0
+        self.listeners: list = []                       # callables of a new head record
+
+    def get_watched_keys(self) -> set[bytes]:
+        return {to_key(address) for address in self.watched}
+
+    def get_block_hash(self, record: dict) -> str:
+        if self.family == NetworkFamily.tron:
+            return record['block']['blockID']
+        return record['header']['hash']
+
+    def get_payments(self, record: dict) -> list[str]:
+        if self.family == NetworkFamily.evm:
+            return [
+                log['transactionHash'] for log in record['logs']
+                if bytes.fromhex(log['topics'][2][-40:]) in self._watched_keys
+            ]
+        payments = []
+        for transaction in record['block']['transactions']:
+            contract = transaction['raw_data']['contract'][0]
+            value = contract['parameter']['value']
+            if transaction['ret'][0]['contractRet'] != 'SUCCESS':
+                continue
+            if contract['type'] == 'TransferContract':
+                recipient = from_tron_hex(value['to_address'])
+            elif contract['type'] == 'TriggerSmartContract' and value['data'][:8] == TRANSFER_SELECTOR:
+                recipient = bytes.fromhex(value['data'][32:72])
+            else:
+                continue
+            if recipient in self._watched_keys:
+                payments.append(transaction['txID'])
+        return payments
+
+    def create_record(self, number: int) -> Optional[dict]:
+        if self.corpus is not None:
+            return next(self._corpus_records, None)
+        parent_hash = self.get_block_hash(self.records[number - 1]) if number - 1 in self.records else '0' * 64
+        now = time.time()
+        if self.family == NetworkFamily.tron:
+            return get_tron_record(
+                self.rng, number, parent_hash, self._recipients, self._raw_watched,
+                block_size=self.config.transactions,
+                payment_share=self.config.payment_share,
+                timestamp=int(now * 1000),
+            )
+        return get_evm_record(
+            self.rng, number, '0x' + parent_hash.removeprefix('0x'), self._recipients, self._raw_watched,
+            block_size=self.config.transactions,
+            transfers=self.config.transfers,
+            payment_share=self.config.payment_share,
+            timestamp=int(now),
+        )
+
+    def add_record(self, record: dict):
+        self.records[record['number']] = record
+        produced_at = time.monotonic()
+        for payment in self.get_payments(record):
+            self.payments[payment] = (record['number'], produced_at)
+        self.head = record['number']
+
+    def reorg(self):
+        if (depth := min(self.config.reorg_depth, len(self.records) - 1)) < 1:
+            return
+        for number in range(self.head - depth + 1, self.head + 1):
+            for payment in self.get_payments(self.records.pop(number)):
+                self.orphaned.add(payment)
+                self.payments.pop(payment, None)
+        for number in range(self.head - depth + 1, self.head + 1):
+            self.add_record(self.create_record(number))
+        self.reorgs += 1
+
+    def produce(self) -> bool:
+        """The next block, sometimes on top of replaced ones; False when a corpus is over"""
+        if self.corpus is None and self.head is not None and self.rng.random() < self.config.reorg_rate:
+            self.reorg()
+        number = 60_000_000 if self.family == NetworkFamily.tron else 18_000_000
+        if (record := self.create_record(number if self.head is None else self.head + 1)) is None:
+            return False
+        self.add_record(record)
+        for listener in self.listeners:
+            listener(record)
+        return True
+
+    async def run(self):
+        while self.produce():
+            await asyncio.sleep(self.config.block_time)
+
+
+class FakeNodeServer:
+    def __init__(self, chain: FakeChain):
+        self.chain = chain
+        self.config = chain.config
+        self.requests: dict[str, int] = {}
+        self.errors = 0
+        self.rng = random.Random(chain.config.seed + 1)
+        self.app = web.Application(middlewares=[self.inject_faults])
+        if chain.family == NetworkFamily.tron:
+            self.app.router.add_post('/wallet/{method}', self.handle_tron)
+        else:
+            self.app.router.add_post('/', self.handle_evm)
+            self.app.router.add_get('/ws', self.handle_websocket)
+        self._runner: Optional[web.AppRunner] = None
+        self._subscription = 0
+
+    @web.middleware
+    async def inject_faults(self, request: web.Request, handler):
+        if self.config.latency:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.config.latency))
+        if request.method == 'POST' and self.rng.random() < self.config.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text='Injected error')
+        return await handler(request)
+
+    def count(self, method: str):
+        self.requests[method] = self.requests.get(method, 0) + 1
+
+    def get_record(self, number: int) -> Optional[dict]:
+        return self.chain.records.get(number)
+
+    async def handle_tron(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.count(method)
+        params = await request.json() if request.can_read_body else {}
+        chain = self.chain
+        match method:
+            case 'getnodeinfo':
+                head = chain.records[chain.head]['block']
+                result = {'block': f'Num:{chain.head},ID:{head["blockID"]}'}
+            case 'getnowblock':
+                result = chain.records[chain.head]['block']
+            case 'getblockbynum':
+                result = (record := self.get_record(params['num'])) and record['block'] or {}
+            case 'getblockbylimitnext':
+                result = {'block': [
+                    record['block']
+                    for number in range(params['startNum'], params['endNum'])
+                    if (record := self.get_record(number)) is not None
+                ]}
+            case 'gettransactioninfobyblocknum':
+                result = (record := self.get_record(params['num'])) and record['transactions_info'] or {}
+            case 'listnodes':
+                result = {'nodes': []}
+            case _:
+                return web.json_response({'Error': f'{method} is not supported'})
+        return web.json_response(result)
+
+    def get_evm_block(self, tag: str, full: bool) -> Optional[dict]:
+        number = self.chain.head if tag == 'latest' else int(tag, 16)
+        if (record := self.get_record(number)) is None:
+            return None
+        header = record['header']
+        if not full:
+            return header
+        return {**header, 'transactions': [
+            {'hash': transaction_hash, 'blockNumber': header['number'], 'blockHash': header['hash'],
+             'transactionIndex': hex(index), 'input': '0x', 'value': '0x0'}
+            for index, transaction_hash in enumerate(header['transactions'])
+        ]}
+
+    def get_evm_logs(self, log_filter: dict) -> list[dict]:
+        from_block, to_block = (
+            self.chain.head if tag == 'latest' else int(tag, 16) if isinstance(tag, str) else tag
+            for tag in (log_filter.get('fromBlock', 'latest'), log_filter.get('toBlock', 'latest'))
+        )
+        addresses = log_filter.get('address') or []
+        addresses = {address.lower() for address in ([addresses] if isinstance(addresses, str) else addresses)}
+        topics = log_filter.get('topics') or []
+        recipients = set(topics[2]) if len(topics) > 2 and topics[2] else None
+        return [
+            log
+            for number in range(from_block, to_block + 1)
+            if (record := self.get_record(number)) is not None
+            for log in record['logs']
+            if (not addresses or log['address'] in addresses) and (recipients is None or log['topics'][2] in recipients)
+        ]
+
+    def get_evm_receipt(self, transaction_hash: str) -> Optional[dict]:
+        for record in reversed(self.chain.records.values()):
+            if (receipt := record['receipts'].get(transaction_hash)) is not None:
+                return receipt
+        return None
+
+    def call_evm(self, call: dict) -> dict:
+        method, params = call.get('method'), call.get('params', [])
+        self.count(method)
+        match method:
+            case 'eth_blockNumber':
+                result = hex(self.chain.head)
+            case 'eth_chainId' | 'net_version':
+                result = '0x1' if method == 'eth_chainId' else '1'
+            case 'web3_clientVersion':
+                result = 'fake-node'
+            case 'eth_getBlockByNumber':
+                result = self.get_evm_block(params[0], params[1])
+            case 'eth_getLogs':
+                result = self.get_evm_logs(params[0])
+            case 'eth_getTransactionReceipt':
+                result = self.get_evm_receipt(params[0])
+            case _:
+                return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': 'Not found'}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+    async def handle_evm(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response([self.call_evm(call) for call in payload])
+        return web.json_response(self.call_evm(payload))
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        heads: asyncio.Queue = asyncio.Queue()
+        subscription = None
+        try:
+            async for message in websocket:
+                call = json.loads(message.data)
+                if call.get('method') != 'eth_subscribe' or call.get('params') != ['newHeads']:
+                    await websocket.send_json(self.call_evm(call))
+                    continue
+                self.count('eth_subscribe')
+                self._subscription += 1
+                subscription = hex(self._subscription)
+                self.chain.listeners.append(heads.put_nowait)
+                await websocket.send_json({'jsonrpc': '2.0', 'id': call.get('id'), 'result': subscription})
+                break
+            while subscription is not None and not websocket.closed:
+                record = await heads.get()
+                await websocket.send_json({
+                    'jsonrpc': '2.0',
+                    'method': 'eth_subscription',
+                    'params': {'subscription': subscription, 'result': record['header']},
+                })
+        finally:
+            if heads.put_nowait in self.chain.listeners:
+                self.chain.listeners.remove(heads.put_nowait)
+        return websocket
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Base URL of the node"""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        return f'http://{host}:{port}'
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def add_chain_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('family', choices=[family.value for family in NetworkFamily])
+    parser.add_argument('--corpus', help='Recorded corpus to serve instead of synthetic blocks')
+    for name, config_field in ChainConfig.__dataclass_fields__.items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=config_field.type, default=config_field.default)
+
+
+def get_chain(arguments: argparse.Namespace) -> FakeChain:
+    config = ChainConfig(**{name: getattr(arguments, name) for name in ChainConfig.__dataclass_fields__})
+    return FakeChain(
+        family=NetworkFamily(arguments.family),
+        config=config,
+        corpus=Corpus.load(arguments.corpus) if arguments.corpus else None,
+    )
+
+
+async def serve(arguments: argparse.Namespace):
+    chain = get_chain(arguments)
+    server = FakeNodeServer(chain)
+    chain.produce()
+    url = await server.start(host=arguments.host, port=arguments.port)
+    print(f'{chain.family.value} node on {url}, watched addresses:\n' + '\n'.join(chain.watched))
+    try:
+        await chain.run()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.fake_node')
+    add_chain_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    asyncio.run(serve(parser.parse_args()))
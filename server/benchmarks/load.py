@@ -0,0 +1,156 @@
+"""
+End-to-end load test: the scraper daemon loop against `benchmarks.fake_node` over HTTP, reporting the
+detection latency of every payment from "block produced" to "task received" by the publisher.
+Celery, Redis and the database are left out: the publisher stops at the encoded task, the checkpoint
+is kept in memory and the watched addresses come from the fake chain.
+Run: python -m benchmarks.load tron --duration 60 --block-time 1 --transactions 500 \
+        --latency 0.02 --error-rate 0.01 --reorg-rate 0.05 --confirmation-depth 3
+"""
+import time
+import asyncio
+import argparse
+from typing import Optional
+
+from core.blockchain.models import Network, NetworkFamily
+from core.blockchain.messages import Message
+from core.blockchain.publishers import MessagePublisher
+from core.blockchain.scrapers import TronTransactionScraper, EVMTransactionScraper
+from core.blockchain.storages import Checkpoint
+from benchmarks.replay import NETWORKS, percentile
+from benchmarks.fake_node import FakeChain, FakeNodeServer, add_chain_arguments, get_chain
+
+
+class MemoryStorage:
+    def __init__(self, checkpoint: Optional[Checkpoint] = None):
+        self.checkpoint = checkpoint
+
+    async def save(self, checkpoint: Checkpoint) -> int:
+        self.checkpoint = checkpoint
+        return checkpoint.safe_block
+
+    async def load(self) -> Optional[Checkpoint]:
+        return self.checkpoint
+
+
+class DetectingPublisher(MessagePublisher):
+    """The task is "received" once encoded, as the worker would get it"""
+    __slots__ = ('chain', 'latencies', 'orphaned', 'duplicates', 'unknown', '_detected')
+
+    def __init__(self, chain: FakeChain, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chain = chain
+        self.latencies: list[float] = []
+        self.orphaned = self.duplicates = self.unknown = 0
+        self._detected: set[str] = set()
+
+    def send(self, messages: list[Message]):
+        [self.codec.encode(message) for message in messages]
+        received_at = time.monotonic()
+        for message in messages:
+            transaction_id = message.transaction_id
+            if transaction_id in self._detected:
+                self.duplicates += 1
+            elif transaction_id in self.chain.orphaned:
+                self.orphaned += 1
+            elif (payment := self.chain.payments.get(transaction_id)) is None:
+                self.unknown += 1
+            else:
+                self.latencies.append(received_at - payment[1])
+            self._detected.add(transaction_id)
+
+
+def get_scraper(chain: FakeChain, node_url: str, arguments: argparse.Namespace):
+    family = chain.family
+    network = Network(**NETWORKS[family], node_url=node_url, family=family)
+    if family == NetworkFamily.evm and arguments.ws:
+        network.node_ws_url = node_url.replace('http', 'ws', 1) + '/ws'
+
+    async def setup(scraper):
+        scraper.stable_coins = {
+            scraper.node.address_key(address): (currency_id, decimal_place)
+            for currency_id, (address, decimal_place) in enumerate(chain.stable_coins.items(), start=1)
+        }
+        for order_id, address in enumerate(chain.watched, start=1):
+            scraper.watched_addresses.apply('created', address, order_id)
+        scraper.run_in_background(scraper.publisher.run(logger=scraper.logger))
+        if scraper.prefilter is not None:
+            await scraper.rebuild_prefilter()
+
+    async def check_dependencies_version(scraper):
+        pass
+
+    scraper_class = TronTransactionScraper if family == NetworkFamily.tron else EVMTransactionScraper
+    # No consumer behind the publisher: nothing to wait for
+    attributes = {
+        'setup': setup,
+        'check_dependencies_version': check_dependencies_version,
+        'use_backpressure': False,
+    }
+    if arguments.confirmation_depth is not None:
+        attributes['confirmation_depth'] = arguments.confirmation_depth
+    scraper = type('LoadScraper', (scraper_class,), attributes)(network=network)
+    scraper.node.cache = None
+    # From the first block on, whenever the first poll comes
+    scraper.storage = MemoryStorage(Checkpoint(safe_block=chain.head - 1))
+    scraper.publisher = DetectingPublisher(
+        chain,
+        task_path=scraper.task_path,
+        codec=scraper.publisher.codec,
+        batch_size=scraper.publisher.batch_size,
+        max_latency=scraper.publisher.max_latency,
+    )
+    return scraper
+
+
+async def main(arguments: argparse.Namespace):
+    chain = get_chain(arguments)
+    server = FakeNodeServer(chain)
+    chain.produce()
+    node_url = await server.start()
+    scraper = get_scraper(chain, node_url, arguments)
+    publisher: DetectingPublisher = scraper.publisher
+
+    tasks = [asyncio.create_task(chain.run()), asyncio.create_task(scraper.handler())]
+    started_at = time.monotonic()
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=arguments.duration, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks + list(scraper._background_tasks):
+            task.cancel()
+        await asyncio.gather(*tasks, *scraper._background_tasks, return_exceptions=True)
+        await scraper.node.close()
+        await server.stop()
+    elapsed = time.monotonic() - started_at
+    await publisher.flush()
+
+    # Payments above it still wait for their confirmations
+    confirmed_block = scraper.watermark.safe_block - scraper.confirmation_depth
+    missed = sum(
+        1 for transaction_id, (block_number, _) in chain.payments.items()
+        if block_number <= confirmed_block and transaction_id not in publisher._detected
+    )
+    latencies = publisher.latencies or [float('nan')]
+    print(f'\n{chain.family.value}: {elapsed:.0f} sec, block time {chain.config.block_time} sec, '
+          f'{chain.config.transactions} transactions per block, confirmation depth {scraper.confirmation_depth}')
+    print(f'  {"blocks produced / reorgs":<28} {chain.head - min(chain.records) + 1} / {chain.reorgs}')
+    print(f'  {"scraper safe block lag":<28} {chain.head - scraper.watermark.safe_block}')
+    print(f'  {"payments produced":<28} {len(chain.payments)}')
+    print(f'  {"detected / missed":<28} {len(publisher.latencies)} / {missed}')
+    print(f'  {"orphaned / duplicate / unknown":<28} '
+          f'{publisher.orphaned} / {publisher.duplicates} / {publisher.unknown}')
+    print(f'  {"detection p50 / p99 / max":<28} {percentile(latencies, 0.5):.3f} / '
+          f'{percentile(latencies, 0.99):.3f} / {max(latencies):.3f} sec')
+    print(f'  {"node requests / errors":<28} {sum(server.requests.values())} / {server.errors}')
+    for method, count in sorted(server.requests.items()):
+        print(f'    {method:<26} {count}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.load')
+    add_chain_arguments(parser)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--confirmation-depth', type=int, help='Scraper default when not set')
+    parser.add_argument('--ws', action='store_true', help='EVM: newHeads subscription instead of polling')
+    asyncio.run(main(parser.parse_args()))
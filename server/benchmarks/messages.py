@@ -0,0 +1,46 @@
+"""
+Scraper `Message` serialization: the former `json.dumps(asdict())` path vs the message codecs.
+Run: python -m benchmarks.messages
+"""
+import json
+import decimal
+from dataclasses import asdict
+
+from core.blockchain.messages import Message, Participant, JSONMessageCodec, MsgpackMessageCodec
+from benchmarks.utils import measure, report
+
+AMOUNT = decimal.Decimal('1250.123456')
+MESSAGE = Message(
+    timestamp=1700000000000,
+    order_id=421337,
+    network_id=1,
+    transaction_id='5d8c4d0f3d4b6f0a8f1b2c3d4e5f60718293a4b5c6d7e8f90a1b2c3d4e5f6071',
+    fee=decimal.Decimal('1.1'),
+    commission_detail={'fee': 1100000, 'net_usage': 345, 'energy_usage_total': 14650},
+    amount=AMOUNT,
+    inputs=[Participant(address='TJCnKsPa7y5okkXvQAidZBzqx3QyQ6sxMW', amount=AMOUNT)],
+    outputs=[Participant(address='TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t', amount=AMOUNT)],
+    currency_id=7,
+)
+
+
+def main():
+    legacy = json.dumps(asdict(MESSAGE), default=str)
+    json_payload = JSONMessageCodec.encode(MESSAGE)
+    msgpack_payload = MsgpackMessageCodec.encode(MESSAGE)
+
+    report('Message encode', {
+        'json.dumps(asdict())': measure(lambda: json.dumps(asdict(MESSAGE), default=str)),
+        'JSONMessageCodec.encode': measure(lambda: JSONMessageCodec.encode(MESSAGE)),
+        'MsgpackMessageCodec.encode': measure(lambda: MsgpackMessageCodec.encode(MESSAGE)),
+    })
+    report('Message decode (with Participant and Decimal)', {
+        'JSONMessageCodec.decode': measure(lambda: JSONMessageCodec.decode(json_payload)),
+        'MsgpackMessageCodec.decode': measure(lambda: MsgpackMessageCodec.decode(msgpack_payload)),
+    })
+    print(f'\nPayload bytes: json.dumps(asdict()) {len(legacy)}, '
+          f'JSONMessageCodec {len(json_payload)}, MsgpackMessageCodec {len(msgpack_payload)}')
+
+
+if __name__ == '__main__':
+    main()
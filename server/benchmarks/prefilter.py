@@ -0,0 +1,80 @@
+"""
+Tron block parsing with and without the address prefilter.
+Almost every transaction of a real block is a TRC20 transfer to an address nobody watches.
+Run: python -m benchmarks.prefilter
+"""
+import asyncio
+import random
+
+from core.blockchain.models import Network, NetworkFamily
+from core.blockchain.addresses import to_key
+from core.blockchain.scrapers import TronTransactionScraper
+from benchmarks.utils import measure, report
+
+USDT = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+OWNER = '4159e3741a68ec3e1ebba80ad809d5ccd31674236e'
+BLOCK_SIZE = 2000
+WATCHED_ADDRESSES = 10_000
+
+
+def get_network() -> Network:
+    return Network(
+        id=1,
+        name='Tron',
+        short_name='tron',
+        native_symbol='TRX',
+        native_decimal_place=6,
+        node_url='http://localhost:8090',
+        family=NetworkFamily.tron,
+    )
+
+
+def get_transaction(number: int) -> dict:
+    recipient = f'{random.getrandbits(160):040x}'
+    if number % 10:
+        contract_type, value = 'TriggerSmartContract', {
+            'owner_address': OWNER,
+            'contract_address': '41' + to_key(USDT).hex(),
+            'data': f'a9059cbb{recipient:0>64}{random.getrandbits(40):064x}',
+        }
+    else:
+        contract_type, value = 'TransferContract', {
+            'owner_address': OWNER,
+            'to_address': f'41{recipient}',
+            'amount': random.getrandbits(32),
+        }
+    return {
+        'txID': f'{number:064x}',
+        'ret': [{'contractRet': 'SUCCESS'}],
+        'raw_data': {'timestamp': 0, 'contract': [{'type': contract_type, 'parameter': {'value': value}}]},
+    }
+
+
+def get_scraper(use_prefilter: bool, loop: asyncio.AbstractEventLoop) -> TronTransactionScraper:
+    scraper_class = type('Scraper', (TronTransactionScraper,), {'use_prefilter': use_prefilter})
+    scraper = scraper_class(network=get_network())
+    scraper.stable_coins = {to_key(USDT): (1, 6)}
+    for order_id in range(WATCHED_ADDRESSES):
+        address = scraper.node.format_address(order_id.to_bytes(20, 'big'))
+        scraper.watched_addresses.apply('created', address, order_id)
+    if scraper.prefilter is not None:
+        loop.run_until_complete(scraper.rebuild_prefilter())
+    return scraper
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    block = {'transactions': [get_transaction(number) for number in range(BLOCK_SIZE)]}
+
+    results = {}
+    for name, use_prefilter in (('without prefilter', False), ('with prefilter', True)):
+        scraper = get_scraper(use_prefilter=use_prefilter, loop=loop)
+        results[name] = measure(
+            lambda: loop.run_until_complete(scraper.parse_block(block_number=1, block=block)),
+            number=20,
+        )
+    report(f'Tron block of {BLOCK_SIZE} transactions, {WATCHED_ADDRESSES} watched addresses (blocks/sec)', results)
+
+
+if __name__ == '__main__':
+    main()
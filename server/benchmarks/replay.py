@@ -0,0 +1,511 @@
+"""
+Recorded blocks replayed through the scraper pipeline (`process_blocks` -> `parse_block` -> `scrape_transaction`
+-> publish) with the node and the Celery publisher stubbed out: no network, no broker.
+Reports blocks/sec, transactions/sec, p99 block latency and allocations, and exits with 1
+when throughput falls more than `--threshold` below the saved baseline.
+
+Record:  python -m benchmarks.replay record tron https://api.trongrid.io 60000000 --count 200 \
+            --stable-coin TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t:6
+Run:     python -m benchmarks.replay run [--save-baseline]
+Without a recorded corpus of a family a seeded synthetic one of the same shape is replayed.
+Baselines are machine specific: save one on the base commit, run on the head one.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from dataclasses import dataclass, field
+
+from core.blockchain.models import Network, NetworkFamily
+from core.blockchain.addresses import from_tron_hex, to_key, to_topic
+from core.blockchain.gates import TronNode, EVMNode
+from core.blockchain.gates.abi import TRANSFER_SELECTOR, TRANSFER_TYPES
+from core.blockchain.gates.evm import TRANSFER_TOPIC, format_result, unformat_result
+from core.blockchain.messages import Message
+from core.blockchain.publishers import MessagePublisher
+from core.blockchain.scrapers import TronTransactionScraper, EVMTransactionScraper
+
+DIRECTORY = os.path.dirname(__file__)
+CORPUS_PATH = os.path.join(DIRECTORY, 'corpus', '{family}.jsonl.gz')
+BASELINE_PATH = os.path.join(DIRECTORY, 'baselines', 'replay.json')
+
+TRON_USDT = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+EVM_USDT = '0xdAC17F958D2ee523a2206206994597C13D831ec7'
+
+NETWORKS = {
+    NetworkFamily.tron: dict(id=1, name='Tron', short_name='tron', native_symbol='TRX', native_decimal_place=6),
+    NetworkFamily.evm: dict(id=2, name='Ethereum', short_name='eth', native_symbol='ETH', native_decimal_place=18),
+}
+
+
+def get_network(family: NetworkFamily) -> Network:
+    return Network(**NETWORKS[family], node_url='http://localhost', family=family)
+
+
+@dataclass
+class Corpus:
+    """
+    One record per block. Tron: `block` and `transactions_info` as the node returns them.
+    EVM: `header` (transaction hashes only), stable coin `logs` and the `receipts` of the watched ones.
+    """
+    family: NetworkFamily
+    stable_coins: dict[str, int]                        # address: decimal place
+    watched: list[str]                                  # recipients with an order
+    records: list[dict] = field(default_factory=list)
+    synthetic: bool = False
+
+    @property
+    def transactions(self) -> int:
+        key = 'block' if self.family == NetworkFamily.tron else 'header'
+        return sum(len(record[key].get('transactions', [])) for record in self.records)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'wt') as file:
+            file.write(json.dumps({
+                'family': self.family.value,
+                'stable_coins': self.stable_coins,
+                'watched': self.watched,
+            }) + '\n')
+            for record in self.records:
+                file.write(json.dumps(record) + '\n')
+
+    @classmethod
+    def load(cls, path: str) -> 'Corpus':
+        with gzip.open(path, 'rt') as file:
+            meta = json.loads(file.readline())
+            return cls(
+                family=NetworkFamily(meta['family']),
+                stable_coins=meta['stable_coins'],
+                watched=meta['watched'],
+                records=[json.loads(line) for line in file],
+            )
+
+
+def get_tron_hex(key: bytes) -> str:
+    return '41' + key.hex()
+
+
+def get_tron_record(rng: random.Random, number: int, parent_hash: str, recipients: list[bytes],
+                    watched: list[bytes], block_size: int = 300, payment_share: float = 0.01,
+                    timestamp: int = 0) -> dict:
+    """A block as `getblockbynum` returns it (hex addresses), and its `gettransactioninfobyblocknum`"""
+    contract_address = get_tron_hex(to_key(TRON_USDT))
+    transactions, transactions_info = [], []
+    for _ in range(block_size):
+        tx_id = f'{rng.getrandbits(256):064x}'
+        recipient = rng.choice(watched if rng.random() < payment_share else recipients)
+        kind = rng.random()
+        if kind < 0.85:
+            contract_type, value = 'TriggerSmartContract', {
+                'owner_address': get_tron_hex(rng.choice(recipients)),
+                'contract_address': contract_address,
+                'data': f'{TRANSFER_SELECTOR}{recipient.hex():0>64}{rng.getrandbits(40):064x}',
+            }
+        elif kind < 0.95:
+            contract_type, value = 'TransferContract', {
+                'owner_address': get_tron_hex(rng.choice(recipients)),
+                'to_address': get_tron_hex(recipient),
+                'amount': rng.getrandbits(32),
+            }
+        else:
+            contract_type, value = 'FreezeBalanceV2Contract', {
+                'owner_address': get_tron_hex(recipient),
+                'frozen_balance': rng.getrandbits(32),
+            }
+        transactions.append({
+            'txID': tx_id,
+            'ret': [{'contractRet': 'SUCCESS' if rng.random() < 0.98 else 'REVERT'}],
+            'raw_data': {
+                'timestamp': timestamp,
+                'contract': [{'type': contract_type, 'parameter': {'value': value}}],
+            },
+        })
+        transactions_info.append({
+            'id': tx_id,
+            'fee': rng.getrandbits(24),
+            'receipt': {'energy_usage_total': rng.getrandbits(16), 'net_usage': rng.getrandbits(9)},
+        })
+    return {
+        'number': number,
+        'block': {
+            'blockID': f'{number:016x}{rng.getrandbits(192):048x}',
+            'block_header': {'raw_data': {'number': number, 'parentHash': parent_hash, 'timestamp': timestamp}},
+            'transactions': transactions,
+        },
+        'transactions_info': transactions_info,
+    }
+
+
+def get_evm_record(rng: random.Random, number: int, parent_hash: str, recipients: list[str], watched: list[str],
+                   block_size: int = 150, transfers: int = 40, payment_share: float = 0.01,
+                   timestamp: int = 0) -> dict:
+    """Header with transaction hashes, stable coin `Transfer` logs and the receipts of the watched ones"""
+    block_hash = f'0x{rng.getrandbits(256):064x}'
+    transaction_hashes = [f'0x{rng.getrandbits(256):064x}' for _ in range(block_size)]
+    logs, receipts = [], {}
+    for log_index, transaction_hash in enumerate(rng.sample(transaction_hashes, min(transfers, block_size))):
+        recipient = rng.choice(watched if rng.random() < payment_share else recipients)
+        logs.append({
+            'address': EVM_USDT.lower(),
+            'topics': [TRANSFER_TOPIC, to_topic(to_key(rng.choice(recipients))), to_topic(to_key(recipient))],
+            'data': f'0x{rng.getrandbits(40):064x}',
+            'blockNumber': hex(number),
+            'blockHash': block_hash,
+            'transactionHash': transaction_hash,
+            'logIndex': hex(log_index),
+            'removed': False,
+        })
+        if recipient in watched:
+            receipts[transaction_hash] = {
+                'transactionHash': transaction_hash,
+                'gasUsed': hex(rng.randrange(40_000, 70_000)),
+                'effectiveGasPrice': hex(rng.randrange(10 ** 9, 10 ** 11)),
+            }
+    return {
+        'number': number,
+        'header': {
+            'number': hex(number),
+            'hash': block_hash,
+            'parentHash': parent_hash,
+            'timestamp': hex(timestamp),
+            'transactions': transaction_hashes,
+        },
+        'logs': logs,
+        'receipts': receipts,
+    }
+
+
+def get_tron_addresses(rng: random.Random, count: int = 5000) -> list[bytes]:
+    return [rng.randbytes(20) for _ in range(count)]
+
+
+def get_evm_addresses(rng: random.Random, count: int = 5000) -> list[str]:
+    return [EVMNode.format_key(rng.getrandbits(160).to_bytes(20, 'big')) for _ in range(count)]
+
+
+def generate_tron_corpus(blocks: int = 100, block_size: int = 300, seed: int = 1) -> Corpus:
+    rng = random.Random(seed)
+    recipients = get_tron_addresses(rng)
+    watched = recipients[:50]
+    corpus = Corpus(
+        family=NetworkFamily.tron,
+        stable_coins={TRON_USDT: 6},
+        watched=[TronNode.format_key(recipient) for recipient in watched],
+        synthetic=True,
+    )
+    block_id = f'{rng.getrandbits(256):064x}'
+    for number in range(60_000_000, 60_000_000 + blocks):
+        record = get_tron_record(rng, number, block_id, recipients, watched, block_size, timestamp=number * 3000)
+        block_id = record['block']['blockID']
+        corpus.records.append(record)
+    return corpus
+
+
+def generate_evm_corpus(blocks: int = 100, block_size: int = 150, transfers: int = 40, seed: int = 1) -> Corpus:
+    rng = random.Random(seed)
+    recipients = get_evm_addresses(rng)
+    watched = recipients[:50]
+    corpus = Corpus(
+        family=NetworkFamily.evm,
+        stable_coins={EVM_USDT: 6},
+        watched=watched,
+        synthetic=True,
+    )
+    block_hash = f'0x{rng.getrandbits(256):064x}'
+    for number in range(18_000_000, 18_000_000 + blocks):
+        record = get_evm_record(
+            rng, number, block_hash, recipients, watched, block_size, transfers, timestamp=1_700_000_000 + number * 12,
+        )
+        block_hash = record['header']['hash']
+        corpus.records.append(record)
+    return corpus
+
+
+def get_corpus(family: NetworkFamily) -> Corpus:
+    path = CORPUS_PATH.format(family=family.value)
+    if os.path.exists(path):
+        return Corpus.load(path)
+    return generate_tron_corpus() if family == NetworkFamily.tron else generate_evm_corpus()
+
+
+class ReplayPublisher(MessagePublisher):
+    """Encodes like the real one, the broker is left out"""
+    __slots__ = ()
+
+    def send(self, messages: list[Message]):
+        [self.codec.encode(message) for message in messages]
+
+
+def stub_tron_node(node: TronNode, corpus: Corpus):
+    blocks = {record['number']: record['block'] for record in corpus.records}
+    transactions_info = {record['number']: record['transactions_info'] for record in corpus.records}
+
+    async def fetch_block_detail(block_number: int) -> dict:
+        return blocks[block_number]
+
+    async def get_block_transactions_info(block_number: int) -> list[dict]:
+        return transactions_info[block_number]
+
+    node.fetch_block_detail = fetch_block_detail
+    node.get_block_transactions_info = get_block_transactions_info
+
+
+def stub_evm_node(node: EVMNode, corpus: Corpus):
+    # Formatted once here, the gate does it on the response of every request
+    headers = {record['number']: format_result(record['header']) for record in corpus.records}
+    logs = {record['number']: format_result(record['logs']) for record in corpus.records}
+    receipts = {
+        transaction_hash: format_result(receipt)
+        for record in corpus.records
+        for transaction_hash, receipt in record['receipts'].items()
+    }
+
+    async def get_blocks_header(block_numbers: list[int]) -> dict[int, dict]:
+        return {block_number: headers[block_number] for block_number in block_numbers}
+
+    async def get_transfer_logs(start_block: int, end_block: int, contracts: list[bytes],
+                                recipients: list[bytes] = None) -> list[dict]:
+        # The node filters by the recipient topic
+        recipients = set(recipients) if recipients else None
+        return [
+            log
+            for block_number in range(start_block, end_block + 1)
+            for log in logs[block_number]
+            if recipients is None or bytes(log['topics'][2][-20:]) in recipients
+        ]
+
+    async def get_transactions_receipt(transaction_hashes: list[str]) -> dict[str, dict]:
+        return {tx_hash: receipts[tx_hash] for tx_hash in transaction_hashes if tx_hash in receipts}
+
+    node.get_blocks_header = get_blocks_header
+    node.get_transfer_logs = get_transfer_logs
+    node.get_transactions_receipt = get_transactions_receipt
+
+
+def get_scraper(corpus: Corpus):
+    scraper_class = TronTransactionScraper if corpus.family == NetworkFamily.tron else EVMTransactionScraper
+    scraper = scraper_class(network=get_network(corpus.family))
+    scraper.node.cache = None
+    (stub_tron_node if corpus.family == NetworkFamily.tron else stub_evm_node)(scraper.node, corpus)
+    scraper.publisher = ReplayPublisher(
+        task_path=scraper.task_path,
+        codec=scraper.publisher.codec,
+        batch_size=scraper.publisher.batch_size,
+    )
+    scraper.stable_coins = {
+        scraper.node.address_key(address): (currency_id, decimal_place)
+        for currency_id, (address, decimal_place) in enumerate(corpus.stable_coins.items(), start=1)
+    }
+    for order_id, address in enumerate(corpus.watched, start=1):
+        scraper.watched_addresses.apply('created', address, order_id)
+    return scraper
+
+
+async def replay(corpus: Corpus) -> tuple[float, list[float], int]:
+    """Seconds of the whole replay, seconds of every block, published messages"""
+    scraper = get_scraper(corpus)
+    if scraper.prefilter is not None:
+        await scraper.rebuild_prefilter()
+    latencies = []
+    started_at = time.perf_counter()
+    for record in corpus.records:
+        block_started_at = time.perf_counter()
+        await scraper.process_blocks(start_block=record['number'], end_block=record['number'], checkpoint=False)
+        latencies.append(time.perf_counter() - block_started_at)
+    await scraper.publisher.flush()
+    return time.perf_counter() - started_at, latencies, scraper.publisher.published
+
+
+async def allocations(corpus: Corpus) -> tuple[int, int]:
+    """Peak and retained traced bytes of one replay"""
+    tracemalloc.start()
+    try:
+        await replay(corpus)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, current
+
+
+def percentile(values: list[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+async def benchmark(corpus: Corpus, rounds: int) -> dict:
+    best, latencies, published = float('inf'), [], 0
+    for _ in range(rounds):
+        seconds, round_latencies, published = await replay(corpus)
+        best = min(best, seconds)
+        latencies.extend(round_latencies)
+    peak, retained = await allocations(corpus)
+    return {
+        'blocks': len(corpus.records),
+        'published': published,
+        'blocks_per_sec': len(corpus.records) / best,
+        'transactions_per_sec': corpus.transactions / best,
+        'p50_block_ms': percentile(latencies, 0.5) * 1000,
+        'p99_block_ms': percentile(latencies, 0.99) * 1000,
+        'peak_kib': peak / 1024,
+        'retained_kib': retained / 1024,
+    }
+
+
+def check(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    regressions = []
+    for family, result in results.items():
+        if family not in baseline:
+            continue
+        expected = baseline[family]['blocks_per_sec']
+        if result['blocks_per_sec'] < expected * (1 - threshold):
+            regressions.append(
+                f'{family}: {result["blocks_per_sec"]:,.0f} blocks/sec, baseline {expected:,.0f} (-{threshold:.0%})'
+            )
+    return regressions
+
+
+def run(arguments: argparse.Namespace) -> int:
+    results = {}
+    for family in (NetworkFamily.tron, NetworkFamily.evm):
+        corpus = get_corpus(family)
+        results[family.value] = result = asyncio.run(benchmark(corpus, rounds=arguments.rounds))
+        print(f'\n{family.value} ({"synthetic" if corpus.synthetic else "recorded"} corpus, '
+              f'{result["blocks"]} blocks, {corpus.transactions} transactions, {result["published"]} messages)')
+        print(f'  {"blocks/sec":<24} {result["blocks_per_sec"]:>14,.1f}')
+        print(f'  {"transactions/sec":<24} {result["transactions_per_sec"]:>14,.0f}')
+        print(f'  {"p50 / p99 block, ms":<24} {result["p50_block_ms"]:>7.2f} / {result["p99_block_ms"]:.2f}')
+        print(f'  {"peak / retained, KiB":<24} {result["peak_kib"]:>7,.0f} / {result["retained_kib"]:,.0f}')
+
+    if arguments.save_baseline:
+        os.makedirs(os.path.dirname(arguments.baseline), exist_ok=True)
+        with open(arguments.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'\nBaseline saved: {arguments.baseline}')
+        return 0
+    if not os.path.exists(arguments.baseline):
+        print('\nNo baseline, nothing to compare with')
+        return 0
+    with open(arguments.baseline) as file:
+        regressions = check(results, json.load(file), threshold=arguments.threshold)
+    for regression in regressions:
+        print(f'\nREGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+async def record_tron(node: TronNode, start_block: int, count: int, corpus: Corpus):
+    stable_coins = {to_key(address) for address in corpus.stable_coins}
+    recipients = set()
+    for number in range(start_block, start_block + count):
+        block = await node.fetch_block_detail(block_number=number)
+        corpus.records.append({
+            'number': number,
+            'block': block,
+            'transactions_info': await node.get_block_transactions_info(block_number=number),
+        })
+        for transaction in block.get('transactions', []):
+            contract = transaction['raw_data']['contract'][0]
+            value = contract['parameter']['value']
+            if contract['type'] == 'TransferContract':
+                recipients.add(node.format_key(from_tron_hex(value['to_address'])))
+            elif contract['type'] == 'TriggerSmartContract' and value['data'][:8] == TRANSFER_SELECTOR \
+                    and from_tron_hex(value['contract_address']) in stable_coins:
+                recipients.add(node.decode_data(TRANSFER_TYPES, value['data'][8:])[0])
+    return recipients
+
+
+def get_log_recipient(log: dict) -> str:
+    return EVMNode.format_key(bytes.fromhex(log['topics'][2][-40:]))
+
+
+async def record_evm(node: EVMNode, start_block: int, count: int, corpus: Corpus):
+    contracts = [node.address_key(address) for address in corpus.stable_coins]
+    for number in range(start_block, start_block + count):
+        headers = await node.get_blocks_header(block_numbers=[number])
+        logs = await node.get_transfer_logs(start_block=number, end_block=number, contracts=contracts)
+        corpus.records.append({
+            'number': number,
+            'header': unformat_result(headers[number]),
+            'logs': unformat_result(logs),
+            'receipts': {},
+        })
+    return {
+        get_log_recipient(log)
+        for block_record in corpus.records
+        for log in block_record['logs']
+        if len(log['topics']) == 3
+    }
+
+
+def record(arguments: argparse.Namespace) -> int:
+    family = NetworkFamily(arguments.family)
+    network = get_network(family)
+    network.node_url = arguments.node_url
+    node = (TronNode if family == NetworkFamily.tron else EVMNode)(network=network)
+    corpus = Corpus(
+        family=family,
+        stable_coins={address: int(decimal_place) for address, decimal_place in (
+            stable_coin.split(':') for stable_coin in arguments.stable_coin
+        )},
+        watched=[],
+    )
+
+    async def main():
+        recorder = record_tron if family == NetworkFamily.tron else record_evm
+        recipients = sorted(await recorder(node, arguments.start_block, arguments.count, corpus))
+        corpus.watched = random.Random(arguments.seed).sample(
+            recipients, k=max(1, int(len(recipients) * arguments.watched_share)),
+        )
+        if family == NetworkFamily.evm:
+            # Receipts are only requested for the matched logs
+            watched = set(corpus.watched)
+            for block_record in corpus.records:
+                hashes = list({
+                    log['transactionHash'] for log in block_record['logs']
+                    if len(log['topics']) == 3 and get_log_recipient(log) in watched
+                })
+                if hashes:
+                    receipts = await node.get_transactions_receipt(transaction_hashes=hashes)
+                    block_record['receipts'] = {
+                        tx_hash: unformat_result(receipt) for tx_hash, receipt in receipts.items()
+                    }
+
+    asyncio.run(main())
+    path = arguments.output or CORPUS_PATH.format(family=family.value)
+    corpus.save(path)
+    print(f'{len(corpus.records)} blocks, {corpus.transactions} transactions, {len(corpus.watched)} watched: {path}')
+    return 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.replay')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Replay the corpora')
+    run_parser.add_argument('--rounds', type=int, default=5, help='Best round is reported')
+    run_parser.add_argument('--baseline', default=BASELINE_PATH)
+    run_parser.add_argument('--save-baseline', action='store_true')
+    run_parser.add_argument('--threshold', type=float, default=0.2, help='Allowed throughput drop, 0.2 - 20%%')
+    run_parser.set_defaults(handler=run)
+
+    record_parser = commands.add_parser('record', help='Record blocks of a node')
+    record_parser.add_argument('family', choices=[family.value for family in NetworkFamily])
+    record_parser.add_argument('node_url')
+    record_parser.add_argument('start_block', type=int)
+    record_parser.add_argument('--count', type=int, default=100)
+    record_parser.add_argument('--stable-coin', action='append', required=True, help='ADDRESS:DECIMAL_PLACE')
+    record_parser.add_argument('--watched-share', type=float, default=0.01, help='Recipients with an order')
+    record_parser.add_argument('--seed', type=int, default=1)
+    record_parser.add_argument('--output')
+    record_parser.set_defaults(handler=record)
+    return parser
+
+
+if __name__ == '__main__':
+    parsed = get_parser().parse_args()
+    sys.exit(parsed.handler(parsed))
@@ -0,0 +1,20 @@
+import time
+from typing import Callable
+
+
+def measure(function: Callable, number: int = 100_000, repeat: int = 5) -> float:
+    """Best operations per second of `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def report(title: str, results: dict[str, float]):
+    baseline = next(iter(results.values()))
+    print(f'\n{title}')
+    for name, ops in results.items():
+        print(f'  {name:<40} {ops:>14,.0f} ops/sec  x{ops / baseline:.2f}')
@@ -1,7 +1,7 @@
 from typing import Any
 
 import redis
-import aioredis
+from redis import asyncio as aioredis
 
 
 class RedisConnector:
@@ -13,7 +13,7 @@ class RedisConnector:
         return self.sync_connect.get(key)
 
     async def async_get(self, key: Any) -> Any:
-        return self.async_connect.get(key)
+        return await self.async_connect.get(key)
 
     def sync_set(self, key: Any, value: Any) -> Any:
         self.sync_connect.set(key, value)
@@ -26,3 +26,41 @@ class RedisConnector:
 
     async def async_delete(self, key: Any):
         await self.async_connect.delete(key)
+
+    def sync_xadd(self, stream: str, fields: dict, maxlen: int) -> Any:
+        return self.sync_connect.xadd(stream, fields, maxlen=maxlen, approximate=True)
+
+    def sync_xadd_many(self, entries: list[tuple[str, dict]], maxlen: int) -> list:
+        """(stream, fields) entries in one round trip"""
+        pipeline = self.sync_connect.pipeline(transaction=False)
+        for stream, fields in entries:
+            pipeline.xadd(stream, fields, maxlen=maxlen, approximate=True)
+        return pipeline.execute()
+
+    async def async_xadd(self, stream: str, fields: dict, maxlen: int) -> Any:
+        return await self.async_connect.xadd(stream, fields, maxlen=maxlen, approximate=True)
+
+    async def async_xread(self, streams: dict, count: int, block: int) -> list:
+        return await self.async_connect.xread(streams, count=count, block=block)
+
+    async def async_last_stream_id(self, stream: str) -> Any:
+        if entries := await self.async_connect.xrevrange(stream, count=1):
+            return entries[0][0]
+
+    async def async_incr(self, key: Any) -> int:
+        return await self.async_connect.incr(key)
+
+    async def async_hset(self, key: Any, field: Any, value: Any):
+        await self.async_connect.hset(key, field, value)
+
+    async def async_hgetall(self, key: Any) -> dict:
+        return await self.async_connect.hgetall(key)
+
+    def sync_eval(self, script: str, keys: list, args: list) -> Any:
+        return self.sync_connect.eval(script, len(keys), *keys, *args)
+
+    async def async_eval(self, script: str, keys: list, args: list) -> Any:
+        return await self.async_connect.eval(script, len(keys), *keys, *args)
+
+    def async_pubsub(self):
+        return self.async_connect.pubsub(ignore_subscribe_messages=True)
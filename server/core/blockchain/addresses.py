@@ -0,0 +1,55 @@
+"""
+Canonical form of an address: its 20 raw bytes, the same for Tron and EVM.
+Indexes are keyed on these, text forms are made only for what leaves the scraper.
+Conversions are cached: the same deposit and contract addresses come up block after block.
+"""
+import functools
+
+import base58
+from eth_utils import to_checksum_address
+
+ADDRESS_SIZE = 20
+TRON_PREFIX = b'\x41'
+
+
+@functools.lru_cache(maxsize=65536)
+def to_key(address: str) -> bytes:
+    """Any text form: Tron base58 or hex with the 41 prefix, EVM hex in any case, bare 40 hex digits"""
+    if len(address) == 34 and address[0] == 'T':
+        raw_address = base58.b58decode_check(address)
+        if raw_address[:1] != TRON_PREFIX:
+            raise ValueError(f'Not a Tron address: {address}')
+        return raw_address[1:]
+    hex_address = address[2:] if address[:2] in ('0x', '0X') else address
+    if len(hex_address) == 2 * ADDRESS_SIZE + 2 and hex_address[:2] == '41':
+        hex_address = hex_address[2:]
+    if len(hex_address) != 2 * ADDRESS_SIZE:
+        raise ValueError(f'Not an address: {address}')
+    return bytes.fromhex(hex_address)
+
+
+def from_tron_hex(address: str) -> bytes:
+    """Key of an address of a block fetched without `visible`: `41` and 40 hex digits, no cache needed"""
+    if len(address) == 2 * ADDRESS_SIZE + 2:
+        return bytes.fromhex(address[2:])
+    # Blocks cached before the switch hold base58
+    return to_key(address)
+
+
+@functools.lru_cache(maxsize=65536)
+def to_base58(key: bytes) -> str:
+    return base58.b58encode_check(TRON_PREFIX + key).decode()
+
+
+@functools.lru_cache(maxsize=65536)
+def to_checksum(key: bytes) -> str:
+    return to_checksum_address(key)
+
+
+def to_hex(key: bytes) -> str:
+    return '0x' + key.hex()
+
+
+def to_topic(key: bytes) -> str:
+    """Indexed `address` argument of an EVM log"""
+    return '0x' + key.hex().rjust(64, '0')
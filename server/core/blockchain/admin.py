@@ -1,6 +1,29 @@
+from typing import Any
+
 from sqladmin import ModelView
 
 from core.blockchain import models
+from core.blockchain.events import DependencyAction, DependencyKind, publish_dependency_change
+
+
+class DependencyAdminMixin:
+    """Saves reach the running scrapers of the network as a change notification"""
+    dependency_kind: DependencyKind
+
+    async def on_model_change(self, data: dict, model: Any, is_created: bool) -> None:
+        # Before the form is applied: a row moved to another network is deleted from the former one
+        model._previous_network_id = None if is_created else model.network_id
+
+    async def after_model_change(self, data: dict, model: Any, is_created: bool) -> None:
+        previous_network_id = getattr(model, '_previous_network_id', None)
+        if previous_network_id is not None and previous_network_id != model.network_id:
+            await publish_dependency_change(
+                previous_network_id, self.dependency_kind, DependencyAction.DELETED, model.id,
+            )
+        await publish_dependency_change(model.network_id, self.dependency_kind, DependencyAction.SAVED, model.id)
+
+    async def after_model_delete(self, model: Any) -> None:
+        await publish_dependency_change(model.network_id, self.dependency_kind, DependencyAction.DELETED, model.id)
 
 
 class NetworkAdmin(ModelView, model=models.Network):
@@ -28,13 +51,16 @@ class NetworkAdmin(ModelView, model=models.Network):
         models.Network.native_symbol,
         models.Network.native_decimal_place,
         models.Network.node_url,
+        models.Network.reserve_node_urls,
+        models.Network.node_ws_url,
         models.Network.is_active,
         models.Network.family,
     )
     form_columns = column_details_list
 
 
-class StableCoinAdmin(ModelView, model=models.StableCoin):
+class StableCoinAdmin(DependencyAdminMixin, ModelView, model=models.StableCoin):
+    dependency_kind = DependencyKind.STABLE_COIN
     can_create = can_edit = can_delete = True
     column_searchable_list = (
         models.StableCoin.name,
@@ -65,7 +91,8 @@ class StableCoinAdmin(ModelView, model=models.StableCoin):
     form_columns = column_details_list
 
 
-class OrderProviderAdmin(ModelView, model=models.OrderProvider):
+class OrderProviderAdmin(DependencyAdminMixin, ModelView, model=models.OrderProvider):
+    dependency_kind = DependencyKind.ORDER_PROVIDER
     can_create = can_edit = can_delete = True
 
     column_searchable_list = (
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import dataclasses
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+import settings
+from config import get_logger
+from config.redis import RedisConnector
+from core.blockchain.gates.base import split_range
+
+# KEYS[1] - lease, ARGV[1] - owner, ARGV[2] - ttl, ms
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+# KEYS[1] - lease, ARGV[1] - owner
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Chunk:
+    start_block: int
+    end_block: int
+
+    @property
+    def size(self) -> int:
+        return self.end_block - self.start_block + 1
+
+
+class BackfillCoordinator:
+    """
+    Historical block range split into chunks that any number of workers, on any host, claim through Redis.
+    Keys of the backfill `name`:
+        backfill:{name}:plan            {"start_block", "end_block", "chunk_size", "created_at"}, set once
+        backfill:{name}:lease:{start}   owner of the chunk being scanned, expires without renewal
+        backfill:{name}:done            chunk start -> {"blocks", "seconds", "owner"}
+    A dead worker's lease expires and its chunk is claimed again. Scanning is idempotent: a chunk
+    scanned twice after a lost lease costs node requests, not duplicate payments.
+    """
+    lease_ttl: float = 60                                   # 1 min
+
+    def __init__(self, name: str, redis: Optional[aioredis.Redis] = None, owner: Optional[str] = None):
+        self.name = name
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+        self._redis = redis or RedisConnector(uri=settings.DAEMON_STORAGE_BACKEND_URL).async_connect
+        self._plan_key = f'backfill:{name}:plan'
+        self._done_key = f'backfill:{name}:done'
+        self._chunks: Optional[list[Chunk]] = None
+
+    def get_lease_key(self, chunk: Chunk) -> str:
+        return f'backfill:{self.name}:lease:{chunk.start_block}'
+
+    async def plan(self, start_block: int, end_block: int, chunk_size: int) -> dict:
+        """The plan in effect: workers joining later get the first one whatever they pass"""
+        await self._redis.set(self._plan_key, json.dumps({
+            'start_block': start_block,
+            'end_block': end_block,
+            'chunk_size': chunk_size,
+            'created_at': time.time(),
+        }), nx=True)
+        return await self.get_plan()
+
+    async def get_plan(self) -> dict:
+        if (plan := await self._redis.get(self._plan_key)) is None:
+            raise ValueError(f'Backfill {self.name} is not planned')
+        return json.loads(plan)
+
+    async def get_chunks(self) -> list[Chunk]:
+        if self._chunks is None:
+            plan = await self.get_plan()
+            self._chunks = [
+                Chunk(start_block=chunk_start, end_block=chunk_end)
+                for chunk_start, chunk_end in split_range(plan['start_block'], plan['end_block'], plan['chunk_size'])
+            ]
+        return self._chunks
+
+    async def get_done(self) -> dict[int, dict]:
+        return {
+            int(chunk_start): json.loads(stats)
+            for chunk_start, stats in (await self._redis.hgetall(self._done_key)).items()
+        }
+
+    async def claim(self) -> Optional[Chunk]:
+        """The lowest chunk neither done nor leased, None when there is no such chunk right now"""
+        done = await self.get_done()
+        chunks = [chunk for chunk in await self.get_chunks() if chunk.start_block not in done]
+        if not chunks:
+            return None
+        leases = await self._redis.mget([self.get_lease_key(chunk) for chunk in chunks])
+        for chunk, lease in zip(chunks, leases):
+            if lease is None and await self._redis.set(
+                    self.get_lease_key(chunk), self.owner, nx=True, px=int(self.lease_ttl * 1000)):
+                return chunk
+        return None
+
+    async def renew(self, chunk: Chunk) -> bool:
+        """False when the lease expired and may be someone else's now"""
+        return bool(await self._redis.eval(
+            RENEW_LEASE_SCRIPT, 1, self.get_lease_key(chunk), self.owner, int(self.lease_ttl * 1000),
+        ))
+
+    async def complete(self, chunk: Chunk, seconds: float):
+        await self._redis.hset(self._done_key, str(chunk.start_block), json.dumps({
+            'blocks': chunk.size,
+            'seconds': seconds,
+            'owner': self.owner,
+        }))
+        await self._redis.eval(RELEASE_LEASE_SCRIPT, 1, self.get_lease_key(chunk), self.owner)
+
+    async def progress(self) -> dict:
+        plan = await self.get_plan()
+        chunks = await self.get_chunks()
+        done = await self.get_done()
+        pending = [chunk for chunk in chunks if chunk.start_block not in done]
+        leases = await self._redis.mget([self.get_lease_key(chunk) for chunk in pending]) if pending else []
+        blocks_done = sum(stats['blocks'] for stats in done.values())
+        blocks_total = plan['end_block'] - plan['start_block'] + 1
+        elapsed = max(time.time() - plan['created_at'], 1e-9)
+        rate = blocks_done / elapsed
+        return {
+            'chunks': len(chunks),
+            'done': len(done),
+            'leased': sum(lease is not None for lease in leases),
+            'blocks_done': blocks_done,
+            'blocks_total': blocks_total,
+            'blocks_per_second': rate,
+            'eta_seconds': (blocks_total - blocks_done) / rate if rate else None,
+            'is_finished': not pending,
+        }
+
+
+class BackfillWorker:
+    """Claims chunks of a backfill till none is left, the lease is renewed while a chunk is scanned"""
+    idle_delay: float = 5                                   # wait for the leased chunks of others
+
+    def __init__(self, scraper, coordinator: BackfillCoordinator):
+        self.scraper = scraper
+        self.coordinator = coordinator
+        self.logger = get_logger(name=f'backfill:{coordinator.name}')
+
+    async def keep_lease(self, chunk: Chunk):
+        while True:
+            await asyncio.sleep(self.coordinator.lease_ttl / 3)
+            if not await self.coordinator.renew(chunk):
+                self.logger.warning(f'Lease of chunk {chunk.start_block}-{chunk.end_block} lost, scanning on')
+                return
+
+    async def scan(self, chunk: Chunk) -> float:
+        heartbeat = asyncio.create_task(self.keep_lease(chunk))
+        started_at = time.monotonic()
+        try:
+            await self.scraper.scan_range(start_block=chunk.start_block, end_block=chunk.end_block)
+        finally:
+            heartbeat.cancel()
+        return time.monotonic() - started_at
+
+    async def run(self):
+        await self.scraper.setup()
+        # The head tells which blocks of the range are deep enough to send without confirmations
+        await self.scraper.node.get_latest_block_number()
+        while True:
+            if (chunk := await self.coordinator.claim()) is None:
+                progress = await self.coordinator.progress()
+                if progress['is_finished']:
+                    self.logger.info(f'Backfill done: {progress["blocks_done"]} blocks')
+                    return
+                await asyncio.sleep(self.idle_delay)
+                continue
+
+            seconds = await self.scan(chunk)
+            await self.coordinator.complete(chunk, seconds)
+            progress = await self.coordinator.progress()
+            self.logger.info(
+                f'Chunk {chunk.start_block}-{chunk.end_block}: {chunk.size / max(seconds, 1e-9):.1f} blocks/sec, '
+                f'{progress["done"]}/{progress["chunks"]} chunks, {progress["blocks_per_second"]:.1f} blocks/sec total'
+            )
@@ -0,0 +1,166 @@
+import time
+import enum
+import asyncio
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from config import get_logger
+from config.redis import RedisConnector
+from core.blockchain.events import get_events_storage
+from core.common.metrics import NULL_CHILD
+
+IN_FLIGHT_TTL = 3600                            # 1 hour without a publish or a release: the counter is reset
+
+# KEYS[1] - counter, ARGV[1] - messages (negative on release), ARGV[2] - ttl.
+# Never below zero: a redelivered task releases its messages twice.
+CHANGE_IN_FLIGHT_SCRIPT = """
+local in_flight = redis.call('incrby', KEYS[1], ARGV[1])
+if in_flight < 0 then
+    in_flight = 0
+    redis.call('set', KEYS[1], 0)
+end
+redis.call('expire', KEYS[1], ARGV[2])
+return in_flight
+"""
+
+
+class BackpressureState(enum.IntEnum):
+    OPEN = 0
+    SLOWED = 1
+    PAUSED = 2
+
+
+def get_in_flight_key(network_id: int) -> str:
+    """Messages of the network published to the consumer queue and not handled yet"""
+    return f'messages:in_flight:{network_id}'
+
+
+def sync_release_in_flight(network_id: int, count: int, storage: RedisConnector = None) -> int:
+    return (storage or get_events_storage()).sync_eval(
+        CHANGE_IN_FLIGHT_SCRIPT,
+        keys=[get_in_flight_key(network_id)],
+        args=[-count, IN_FLIGHT_TTL],
+    )
+
+
+class Backpressure:
+    """
+    In-flight credit between a scraper and the consumers of its messages: a Redis counter per network,
+    increased by the publisher before a batch is sent and decreased by the task once it is handled.
+    Below `low_watermark` blocks are scanned at full speed, above it every chunk of blocks waits
+    in proportion to the backlog, at `high_watermark` the scan pauses till the backlog drops below
+    `low_watermark` again. Messages already parsed are still published: only block ingestion waits.
+    Advisory only: with Redis unavailable nothing waits and nothing is counted, and a counter
+    left over by lost tasks expires `IN_FLIGHT_TTL` after the last change.
+    """
+    __slots__ = (
+        'network_id',
+        'high_watermark',
+        'low_watermark',
+        'max_delay',
+        'check_interval',
+        'in_flight',
+        'state',
+        'pauses',
+        'in_flight_metric',
+        'state_metric',
+        'wait_metric',
+        '_key',
+        '_storage',
+        '_checked_at',
+        '_logger',
+    )
+
+    def __init__(self, network_id: int, high_watermark: int = 50_000, low_watermark: int = 10_000,
+                 max_delay: float = 1.0, check_interval: float = 1.0, storage: Optional[RedisConnector] = None,
+                 in_flight_metric=NULL_CHILD, state_metric=NULL_CHILD, wait_metric=NULL_CHILD):
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError(f'Low watermark {low_watermark} must be below the high one {high_watermark}')
+        self.network_id = network_id
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_delay = max_delay                          # seconds per chunk right below `high_watermark`
+        self.check_interval = check_interval                # seconds between reads of the counter
+        self.in_flight = 0
+        self.state = BackpressureState.OPEN
+        self.pauses = 0
+        self.in_flight_metric = in_flight_metric            # gauge of `in_flight`
+        self.state_metric = state_metric                    # gauge of `state`
+        self.wait_metric = wait_metric                      # counter of seconds ingestion waited
+
+        self._key = get_in_flight_key(network_id)
+        self._storage = storage or get_events_storage()
+        self._checked_at: Optional[float] = None
+        self._logger = get_logger(name=f'backpressure:{network_id}')
+
+    def _set_in_flight(self, in_flight: int):
+        self.in_flight = in_flight
+        self.in_flight_metric.set(in_flight)
+
+    async def _change(self, count: int):
+        try:
+            self._set_in_flight(int(await self._storage.async_eval(
+                CHANGE_IN_FLIGHT_SCRIPT,
+                keys=[self._key],
+                args=[count, IN_FLIGHT_TTL],
+            )))
+        except RedisError as error:
+            self._logger.warning(f'In-flight messages not counted: {error!r}')
+
+    async def acquire(self, count: int):
+        """Before a batch of `count` messages is sent"""
+        await self._change(count)
+
+    async def release(self, count: int):
+        """A batch that was not sent after all"""
+        await self._change(-count)
+
+    async def refresh(self):
+        self._checked_at = time.monotonic()
+        try:
+            self._set_in_flight(int(await self._storage.async_get(self._key) or 0))
+        except RedisError as error:
+            self._logger.warning(f'In-flight messages unknown, not waiting: {error!r}')
+            self._set_in_flight(0)
+
+    def update_state(self) -> BackpressureState:
+        """Hysteresis: paused at `high_watermark`, open again at `low_watermark`"""
+        if self.in_flight >= self.high_watermark:
+            state = BackpressureState.PAUSED
+        elif self.state == BackpressureState.PAUSED and self.in_flight > self.low_watermark:
+            state = BackpressureState.PAUSED
+        elif self.in_flight > self.low_watermark:
+            state = BackpressureState.SLOWED
+        else:
+            state = BackpressureState.OPEN
+
+        if state == BackpressureState.PAUSED and self.state != BackpressureState.PAUSED:
+            self.pauses += 1
+            self._logger.warning(f'{self.in_flight} messages in flight, block ingestion paused')
+        elif state != BackpressureState.PAUSED and self.state == BackpressureState.PAUSED:
+            self._logger.info(f'{self.in_flight} messages in flight, block ingestion resumed')
+        self.state = state
+        self.state_metric.set(state)
+        return state
+
+    def get_delay(self) -> float:
+        if self.state != BackpressureState.SLOWED:
+            return 0.0
+        backlog = (self.in_flight - self.low_watermark) / (self.high_watermark - self.low_watermark)
+        return self.max_delay * min(backlog, 1.0)
+
+    async def wait(self):
+        """Before every chunk of blocks: returns at once while consumers keep up"""
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            await self.refresh()
+        started_at, waited = time.monotonic(), False
+        while self.update_state() == BackpressureState.PAUSED:
+            waited = True
+            await asyncio.sleep(self.check_interval)
+            await self.refresh()
+        if delay := self.get_delay():
+            waited = True
+            await asyncio.sleep(delay)
+        if waited:
+            self.wait_metric.inc(time.monotonic() - started_at)
@@ -0,0 +1,153 @@
+from typing import Iterable, Optional
+
+from core.blockchain.messages import Message
+
+
+class BlockHashRing:
+    """Hash and parent hash of the last `size` blocks, slot `number % size`: fixed memory whatever the height"""
+    __slots__ = (
+        'size',
+        '_numbers',
+        '_hashes',
+        '_parents',
+    )
+
+    def __init__(self, size: int):
+        self.size = size
+        self._numbers: list[int] = [-1] * size
+        self._hashes: list[Optional[str]] = [None] * size
+        self._parents: list[Optional[str]] = [None] * size
+
+    def get(self, block_number: int) -> Optional[tuple[str, str]]:
+        """(hash, parent hash) of the block if still in the ring"""
+        slot = block_number % self.size
+        if self._numbers[slot] != block_number:
+            return None
+        return self._hashes[slot], self._parents[slot]
+
+    def put(self, block_number: int, block_hash: str, parent_hash: str):
+        slot = block_number % self.size
+        self._numbers[slot] = block_number
+        self._hashes[slot] = block_hash
+        self._parents[slot] = parent_hash
+
+    def conflicts(self, block_number: int, block_hash: str, parent_hash: str) -> list[int]:
+        """Neighbours that are not on the same chain as the block: one of the two is orphaned"""
+        conflicts = []
+        if (below := self.get(block_number - 1)) and below[0] != parent_hash:
+            conflicts.append(block_number - 1)
+        if (above := self.get(block_number + 1)) and above[1] != block_hash:
+            conflicts.append(block_number + 1)
+        return conflicts
+
+
+class ConfirmationQueue:
+    """
+    Holds messages of a block till it is `depth` blocks below the tip: the highest block with every block
+    up to it added, blocks of a chunk come in any order. A block above a block not added yet is not
+    confirmed by it, their hashes are not checked against each other yet. A conflicting block counts as
+    not added till its current version is: the tip stays below it while it is scanned again.
+    A block seen again with another hash (reorg) replaces its pending messages: the orphaned ones are
+    retracted before they were ever sent, the new version of the block brings its own.
+    Memory: the ring plus the pending messages of the last `depth` blocks.
+    """
+    __slots__ = (
+        'depth',
+        'ring',
+        'tip',
+        'retracted',
+        'reorgs',
+        '_pending',
+        '_added',
+    )
+
+    def __init__(self, depth: int, ring_size: int):
+        self.depth = depth
+        self.ring = BlockHashRing(size=max(ring_size, depth * 2))
+        self.tip = -1
+        self.retracted = 0
+        self.reorgs = 0
+        # block number: (block hash, messages)
+        self._pending: dict[int, tuple[str, list[Message]]] = {}
+        self._added: set[int] = set()                       # above the tip
+
+    def __len__(self) -> int:
+        return sum(len(messages) for _, messages in self._pending.values())
+
+    @property
+    def lowest_pending(self) -> Optional[int]:
+        return min(self._pending) if self._pending else None
+
+    def start(self, block_number: int, done: Iterable[tuple[int, int]] = ()):
+        """The next block to add, the tip moves over the `done` ranges above it as if they were added"""
+        self.tip = block_number - 1
+        self._added = {number for start_block, end_block in done for number in range(start_block, end_block + 1)}
+        self._advance()
+
+    def _advance(self):
+        while self.tip + 1 in self._added:
+            self.tip += 1
+            self._added.discard(self.tip)
+
+    def hold(self, block_number: int):
+        """The block is to be added again: the tip goes back below it"""
+        if block_number <= self.tip:
+            self._added.update(range(block_number + 1, self.tip + 1))
+            self.tip = block_number - 1
+        else:
+            self._added.discard(block_number)
+
+    def resolve(self, block_numbers: Iterable[int]):
+        """Held blocks not added again after all"""
+        self._added.update(number for number in block_numbers if number > self.tip)
+        self._advance()
+
+    def is_confirmed(self, block_number: int) -> bool:
+        return self.tip - block_number >= self.depth
+
+    def add_block(self, block_number: int, block_hash: str, parent_hash: str,
+                  messages: list[Message]) -> tuple[list[Message], list[int]]:
+        """(messages confirmed by now, blocks to fetch again because they conflict with this one)"""
+        conflicts = self.ring.conflicts(block_number, block_hash, parent_hash)
+        if (known := self.ring.get(block_number)) and known[0] != block_hash:
+            self.reorgs += 1
+            _, orphaned = self._pending.pop(block_number, (None, []))
+            self.retracted += len(orphaned)
+        self.ring.put(block_number, block_hash, parent_hash)
+
+        if messages:
+            self._pending[block_number] = (block_hash, messages)
+        if self.tip < 0:
+            # Not started: blocks come in order
+            self.tip = block_number - 1
+        if block_number > self.tip:
+            self._added.add(block_number)
+            self._advance()
+        conflicts = [number for number in conflicts if self.tip - number < self.ring.size]
+        for number in conflicts:
+            self.hold(number)
+        return self.pop_confirmed(), conflicts
+
+    def pop_confirmed(self) -> list[Message]:
+        confirmed = []
+        for block_number in sorted(number for number in self._pending if self.is_confirmed(number)):
+            _, messages = self._pending.pop(block_number)
+            confirmed.extend(messages)
+        return confirmed
+
+    def release(self, block_number: int) -> list[Message]:
+        """Pending messages up to the block whatever the tip: known to be deep enough from elsewhere"""
+        released = []
+        for number in sorted(number for number in self._pending if number <= block_number):
+            _, messages = self._pending.pop(number)
+            released.extend(messages)
+        return released
+
+    def metrics(self) -> dict:
+        return {
+            'tip': self.tip,
+            'pending_blocks': len(self._pending),
+            'pending_messages': len(self),
+            'reorgs': self.reorgs,
+            'retracted': self.retracted,
+        }
@@ -0,0 +1,154 @@
+import time
+import asyncio
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from typing import Optional
+
+import settings
+from config import get_logger
+from core.common.metrics import labels, start_http_server
+from core.blockchain.dao import NetworkDAO
+from core.blockchain.models import Network
+from core.blockchain.metrics import DAEMON_RESTARTS, DAEMON_WORKERS
+
+
+async def run_scraper(filters: list, start_block: Optional[int] = None, end_block: Optional[int] = None,
+                      metrics_port_offset: Optional[int] = None):
+    """Metrics on METRICS_PORT + `metrics_port_offset`, none without it: METRICS_PORT is the supervisor's"""
+    from core.blockchain.scrapers import get_transaction_scraper
+
+    network = await NetworkDAO.get_or_none(filters=filters)
+    if network is None:
+        raise ValueError('Network not found')
+    scraper = await get_transaction_scraper(network=network)
+    if settings.METRICS_ENABLED and settings.METRICS_PORT and metrics_port_offset is not None:
+        start_http_server(port=settings.METRICS_PORT + metrics_port_offset)
+    if start_block or end_block:
+        await scraper.start_with_params(start_block=start_block, end_block=end_block)
+    else:
+        await scraper.handler()
+
+
+async def run_backfill(filters: list, start_block: int, end_block: int, chunk_size: int):
+    """Joins the backfill of the range: run it on as many processes and hosts as the node allows"""
+    from core.blockchain.scrapers import get_transaction_scraper
+    from core.blockchain.backfill import BackfillCoordinator, BackfillWorker
+
+    network = await NetworkDAO.get_or_none(filters=filters)
+    if network is None:
+        raise ValueError('Network not found')
+    coordinator = BackfillCoordinator(name=f'{network.short_name}:{start_block}-{end_block}')
+    await coordinator.plan(start_block=start_block, end_block=end_block, chunk_size=chunk_size)
+    await BackfillWorker(scraper=await get_transaction_scraper(network=network), coordinator=coordinator).run()
+
+
+def run_worker(network_id: int):
+    """Entry point of a worker process: one network, its own interpreter and event loop"""
+    # Every worker process on its own port; a foreground run of the same network would take it too, so it has none
+    asyncio.run(run_scraper(filters=[Network.id == network_id], metrics_port_offset=network_id))
+
+
+class Worker:
+    __slots__ = (
+        'network_id',
+        'name',
+        'process',
+        'started_at',
+        'failures',
+        'next_start',
+    )
+
+    def __init__(self, network_id: int, name: str):
+        self.network_id = network_id
+        self.name = name
+        self.process: Optional[BaseProcess] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.next_start = 0.0
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class DaemonSupervisor:
+    """
+    One scraper process per active network: separate GILs for the CPU-heavy block parsing.
+    Crashed workers are restarted with exponential backoff, networks switched on or off
+    in the admin are picked up on the next sync.
+    """
+    sync_interval: int = 10                                 # 10 sec
+    restart_delay: float = 1
+    restart_max_delay: float = 300                          # 5 min
+    stable_after: float = 600                               # 10 min running resets the backoff
+    stop_timeout: float = 30
+
+    def __init__(self):
+        self.workers: dict[int, Worker] = {}
+        self.context = multiprocessing.get_context('spawn')
+        self.logger = get_logger(name='daemon:supervisor')
+
+    async def get_networks(self) -> list[Network]:
+        return await NetworkDAO.get_current_networks()
+
+    def spawn(self, network_id: int) -> BaseProcess:
+        return self.context.Process(target=run_worker, args=(network_id,), name=f'scraper:{network_id}')
+
+    def start(self, worker: Worker):
+        worker.process = self.spawn(worker.network_id)
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        self.logger.info(f'Worker {worker.name} started, pid {worker.process.pid}')
+
+    async def stop(self, worker: Worker):
+        if worker.is_alive:
+            worker.process.terminate()
+            await asyncio.to_thread(worker.process.join, self.stop_timeout)
+            if worker.process.is_alive():
+                worker.process.kill()
+                await asyncio.to_thread(worker.process.join)
+        self.logger.info(f'Worker {worker.name} stopped')
+
+    def schedule_restart(self, worker: Worker, now: float):
+        if now - worker.started_at >= self.stable_after:
+            worker.failures = 0
+        worker.failures += 1
+        delay = min(self.restart_delay * 2 ** (worker.failures - 1), self.restart_max_delay)
+        worker.next_start = now + delay
+        labels(DAEMON_RESTARTS, network=worker.name).inc()
+        self.logger.error(
+            f'Worker {worker.name} exited with {worker.process.exitcode}, restart in {delay:.0f} sec '
+            f'(failure {worker.failures})'
+        )
+        worker.process = None
+
+    async def sync(self):
+        networks = {network.id: network for network in await self.get_networks()}
+
+        for network_id in [network_id for network_id in self.workers if network_id not in networks]:
+            await self.stop(self.workers.pop(network_id))
+
+        now = time.monotonic()
+        for network_id, network in networks.items():
+            if (worker := self.workers.get(network_id)) is None:
+                worker = self.workers[network_id] = Worker(network_id=network_id, name=network.short_name)
+            if worker.is_alive:
+                continue
+            if worker.process is not None:
+                self.schedule_restart(worker, now)
+            if now >= worker.next_start:
+                self.start(worker)
+        labels(DAEMON_WORKERS).set(sum(worker.is_alive for worker in self.workers.values()))
+
+    async def run(self):
+        if settings.METRICS_ENABLED and settings.METRICS_PORT:
+            start_http_server(port=settings.METRICS_PORT)
+        try:
+            while True:
+                try:
+                    await self.sync()
+                except Exception as error:
+                    self.logger.error(f'Sync failed: {error!r}')
+                await asyncio.sleep(self.sync_interval)
+        finally:
+            await asyncio.gather(*[self.stop(worker) for worker in self.workers.values()])
@@ -1,10 +1,15 @@
 from typing import Optional
 
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config.database import dynamic_db_query_handler
 from core.common.dao import BaseDAO
 from core.common.caches import ram_cached
 from core.blockchain import models
+from core.blockchain.events import OrderEvent, publish_order_event, sync_publish_order_events
+from core.blockchain.messages import Message
 
 
 class NetworkDAO(BaseDAO):
@@ -26,3 +31,127 @@ class StableCoinDAO(BaseDAO):
 
 class OrderProviderDAO(BaseDAO):
     model = models.OrderProvider
+
+
+class OrderDAO(BaseDAO):
+    """
+    Publishes the order events the scrapers' address indexes follow.
+    With `auto_commit=False` call `publish_event` after the commit yourself.
+    """
+    model = models.Order
+
+    @classmethod
+    async def publish_event(cls, order: model):
+        await publish_order_event(
+            network_id=order.network_id,
+            event=OrderEvent(order.status.value),
+            address=order.address,
+            order_id=order.id,
+        )
+
+    @classmethod
+    def sync_publish_events(cls, orders: list):
+        """Orders or rows of `id`, `network_id`, `address` and `status`, in one round trip"""
+        if orders:
+            sync_publish_order_events([
+                (order.network_id, OrderEvent(order.status.value), order.address, order.id)
+                for order in orders
+            ])
+
+    @classmethod
+    async def create(cls, obj: model, *, session: Optional[AsyncSession] = None, **kwargs) -> model:
+        order = await super().create(obj=obj, session=session, **kwargs)
+        if kwargs.get('auto_commit', True):
+            await cls.publish_event(order)
+        return order
+
+    @classmethod
+    async def update(cls, obj: model, data: dict, *, session: Optional[AsyncSession] = None, **kwargs) -> model:
+        order = await super().update(obj=obj, data=data, session=session, **kwargs)
+        if kwargs.get('auto_commit', True) and 'status' in data:
+            await cls.publish_event(order)
+        return order
+
+    @classmethod
+    @dynamic_db_query_handler
+    async def raw_open_addresses(cls, network_id: int, session: AsyncSession) -> list[tuple[str, int]]:
+        query = select(cls.model.address, cls.model.id).where(
+            cls.model.network_id == network_id,
+            cls.model.status == models.OrderStatus.created,
+        )
+        result = await session.execute(query)
+        return result.all()
+
+    @classmethod
+    async def get_open_addresses(cls, network_id: int, *,
+                                 session: Optional[AsyncSession] = None) -> list[tuple[str, int]]:
+        """(address, order_id) of all unpaid orders of the network"""
+        return await cls.raw_open_addresses(network_id=network_id, session=session)
+
+
+class PaymentDAO(BaseDAO):
+    """
+    Payments of the scrapers' messages, written in bulk. An order is paid once its payments cover it,
+    partial ones add up across batches. Idempotent: a redelivered batch inserts nothing
+    and marks the same orders paid again, so call `OrderDAO.sync_publish_events` with the returned orders
+    every time, a lost publish is then repeated by the redelivery.
+    """
+    model = models.Payment
+    insert_batch_size: int = 1000                       # rows per INSERT, below the bind parameter limit
+
+    @classmethod
+    def get_rows(cls, messages: list[Message]) -> list[dict]:
+        """One row per transaction, sorted: concurrent batches lock the same rows in the same order"""
+        rows = {}
+        for message in messages:
+            rows.setdefault((message.network_id, message.transaction_id), {
+                'network_id': message.network_id,
+                'transaction_id': message.transaction_id,
+                'order_id': message.order_id,
+                'currency_id': message.currency_id,
+                'amount': message.amount,
+                'fee': message.fee,
+                'commission_detail': message.commission_detail,
+                'block_number': message.block_number,
+                'timestamp': message.timestamp,
+            })
+        return [rows[key] for key in sorted(rows)]
+
+    @classmethod
+    def get_insert_query(cls, rows: list[dict]):
+        return insert(cls.model).values(rows).on_conflict_do_nothing(
+            index_elements=[cls.model.network_id, cls.model.transaction_id],
+        )
+
+    @classmethod
+    def get_pay_query(cls, order_ids: list[int]):
+        """Orders paid in full: the payments in their currency add up to their amount, if they have one"""
+        order, payment = models.Order, cls.model
+        paid_amount = select(func.coalesce(func.sum(payment.amount), 0)).where(
+            payment.order_id == order.id,
+            payment.currency_id.is_not_distinct_from(order.currency_id),
+        ).scalar_subquery()
+        return update(order).where(
+            order.id.in_(order_ids),
+            order.status.in_([models.OrderStatus.created, models.OrderStatus.paid]),
+            or_(order.amount.is_(None), paid_amount >= order.amount),
+        ).values(status=models.OrderStatus.paid).returning(
+            order.id, order.network_id, order.address, order.status,
+        )
+
+    @classmethod
+    @dynamic_db_query_handler
+    async def raw_save_messages(cls, messages: list[Message], session: AsyncSession) -> list:
+        if not (rows := cls.get_rows(messages)):
+            return []
+        for offset in range(0, len(rows), cls.insert_batch_size):
+            await session.execute(cls.get_insert_query(rows[offset:offset + cls.insert_batch_size]))
+        result = await session.execute(cls.get_pay_query(sorted({row['order_id'] for row in rows})))
+        orders = result.all()
+        await session.commit()
+        return orders
+
+    @classmethod
+    async def save_messages(cls, messages: list[Message], *, session: Optional[AsyncSession] = None) -> list:
+        """Payments and paid orders in one transaction, returns the paid orders"""
+        return await cls.raw_save_messages(messages=messages, session=session)
@@ -0,0 +1,123 @@
+import json
+import enum
+import functools
+
+import settings
+from config.redis import RedisConnector
+
+ORDER_EVENTS_MAXLEN = 100_000
+
+
+class OrderEvent(enum.StrEnum):
+    CREATED = 'created'
+    PAID = 'paid'
+    EXPIRED = 'expired'
+
+
+class DependencyKind(enum.StrEnum):
+    STABLE_COIN = 'stable_coin'
+    ORDER_PROVIDER = 'order_provider'
+
+
+class DependencyAction(enum.StrEnum):
+    SAVED = 'saved'
+    DELETED = 'deleted'
+
+
+# KEYS[1] - version counter, KEYS[2] - channel, ARGV[1] - change: numbered and sent as one step
+PUBLISH_DEPENDENCY_CHANGE_SCRIPT = """
+local version = redis.call('incr', KEYS[1])
+redis.call('publish', KEYS[2], version .. ' ' .. ARGV[1])
+return version
+"""
+
+
+def get_order_events_stream(network_id: int) -> str:
+    return f'orders:events:{network_id}'
+
+
+def get_order_event_fields(event: OrderEvent, address: str, order_id: int) -> dict:
+    return {
+        'event': event.value,
+        'address': address,
+        'order_id': order_id,
+    }
+
+
+@functools.cache
+def get_events_storage() -> RedisConnector:
+    # One connector, so one pair of connection pools, per process
+    return RedisConnector(uri=settings.DAEMON_STORAGE_BACKEND_URL)
+
+
+def sync_publish_order_event(network_id: int, event: OrderEvent, address: str, order_id: int,
+                             storage: RedisConnector = None):
+    (storage or get_events_storage()).sync_xadd(
+        stream=get_order_events_stream(network_id),
+        fields=get_order_event_fields(event=event, address=address, order_id=order_id),
+        maxlen=ORDER_EVENTS_MAXLEN,
+    )
+
+
+def sync_publish_order_events(events: list[tuple[int, OrderEvent, str, int]], storage: RedisConnector = None):
+    """(network_id, event, address, order_id) events in one round trip"""
+    (storage or get_events_storage()).sync_xadd_many(
+        entries=[
+            (
+                get_order_events_stream(network_id),
+                get_order_event_fields(event=event, address=address, order_id=order_id),
+            )
+            for network_id, event, address, order_id in events
+        ],
+        maxlen=ORDER_EVENTS_MAXLEN,
+    )
+
+
+async def publish_order_event(network_id: int, event: OrderEvent, address: str, order_id: int,
+                              storage: RedisConnector = None):
+    await (storage or get_events_storage()).async_xadd(
+        stream=get_order_events_stream(network_id),
+        fields=get_order_event_fields(event=event, address=address, order_id=order_id),
+        maxlen=ORDER_EVENTS_MAXLEN,
+    )
+
+
+def get_dependencies_channel(network_id: int) -> str:
+    return f'dependencies:{network_id}'
+
+
+def get_dependencies_version_key(network_id: int) -> str:
+    return f'dependencies:version:{network_id}'
+
+
+def get_dependencies_applied_key(network_id: int) -> str:
+    """Scraper -> version of the dependencies it runs with"""
+    return f'dependencies:applied:{network_id}'
+
+
+def parse_dependency_change(data: bytes) -> tuple[int, dict]:
+    version, change = data.split(b' ', 1)
+    return int(version), json.loads(change)
+
+
+async def publish_dependency_change(network_id: int, kind: DependencyKind, action: DependencyAction, object_id: int,
+                                    storage: RedisConnector = None) -> int:
+    """The new version of the network's dependencies"""
+    return await (storage or get_events_storage()).async_eval(
+        PUBLISH_DEPENDENCY_CHANGE_SCRIPT,
+        keys=[get_dependencies_version_key(network_id), get_dependencies_channel(network_id)],
+        args=[json.dumps({'kind': kind.value, 'action': action.value, 'id': object_id})],
+    )
+
+
+async def get_dependencies_status(network_id: int, storage: RedisConnector = None) -> dict:
+    """Current version and the one every scraper applied: they match once a change is picked up everywhere"""
+    storage = storage or get_events_storage()
+    version = await storage.async_get(get_dependencies_version_key(network_id))
+    return {
+        'version': int(version or 0),
+        'scrapers': {
+            scraper.decode(): json.loads(applied)
+            for scraper, applied in (await storage.async_hgetall(get_dependencies_applied_key(network_id))).items()
+        },
+    }
@@ -1,15 +1,24 @@
+import os
+
 from .base import AbstractNode
+from .cache import BlockCache
 from .tron import Node as TronNode
 from .evm import Node as EVMNode
 
+import settings
 from core.blockchain.models import Network, NetworkFamily
+from core.blockchain.metrics import BLOCK_CACHE
 
 
 def get_node(network: Network) -> AbstractNode:
     match network.family:
         case NetworkFamily.tron:
-            return TronNode(network=network)
+            node = TronNode(network=network)
         case NetworkFamily.evm:
-            return EVMNode(network=network)
+            node = EVMNode(network=network)
         case _:
             raise ValueError('Node not found!')
+    if settings.BLOCK_CACHE_DIR:
+        node.cache = BlockCache(directory=os.path.join(settings.BLOCK_CACHE_DIR, network.short_name))
+        BLOCK_CACHE.add(node.cache.metrics, network=network.short_name)
+    return node
@@ -0,0 +1,79 @@
+import re
+from typing import Any, Callable, Optional, Union
+
+from eth_abi.registry import ABIRegistry
+from eth_abi.decoding import TupleDecoder, ContextFramesBytesIO
+from eth_abi.encoding import TupleEncoder
+
+WORD_SIZE = 32
+
+TRANSFER_SELECTOR = 'a9059cbb'
+TRANSFER_TYPES = ('address', 'uint256')
+
+KNOWN_SELECTORS: dict[str, tuple[str, ...]] = {
+    TRANSFER_SELECTOR: TRANSFER_TYPES,                      # transfer(address,uint256)
+    '23b872dd': ('address', 'address', 'uint256'),          # transferFrom(address,address,uint256)
+    '095ea7b3': ('address', 'uint256'),                     # approve(address,uint256)
+}
+
+_fixed_bytes_type = re.compile(r'^bytes(\d+)$')
+
+
+def to_bytes(data: Union[str, bytes]) -> bytes:
+    if isinstance(data, str):
+        return bytes.fromhex(data[2:] if data[:2] == '0x' else data)
+    return bytes(data)
+
+
+def get_word_decoder(abi_type: str, format_address: Callable[[bytes], str]) -> Optional[Callable[[bytes], Any]]:
+    """Decoder of one static head word, None for types that need the generic codec"""
+    if abi_type == 'address':
+        return lambda word: format_address(word[12:])
+    if abi_type == 'bool':
+        return lambda word: word[31] == 1
+    if re.fullmatch(r'uint\d*', abi_type):
+        return lambda word: int.from_bytes(word, 'big')
+    if re.fullmatch(r'int\d*', abi_type):
+        return lambda word: int.from_bytes(word, 'big', signed=True)
+    if match := _fixed_bytes_type.match(abi_type):
+        size = int(match.group(1))
+        return lambda word: word[:size]
+    return None
+
+
+class StaticDecoder:
+    """Decodes only-static signatures by slicing fixed 32 byte words"""
+    __slots__ = (
+        'types',
+        'size',
+        '_words',
+    )
+
+    def __init__(self, types: tuple[str, ...], word_decoders: list[Callable[[bytes], Any]]):
+        self.types = types
+        self.size = len(word_decoders) * WORD_SIZE
+        self._words = [
+            (word_decoder, position * WORD_SIZE, (position + 1) * WORD_SIZE)
+            for position, word_decoder in enumerate(word_decoders)
+        ]
+
+    def __call__(self, data: Union[str, bytes]) -> tuple:
+        if isinstance(data, str):
+            data = bytes.fromhex(data[2:] if data[:2] == '0x' else data)
+        if len(data) < self.size:
+            raise ValueError(f'Not enough data to decode {self.types}: {len(data)} < {self.size} bytes')
+        return tuple([word_decoder(data[start:end]) for word_decoder, start, end in self._words])
+
+
+def compile_decoder(registry: ABIRegistry, types: tuple[str, ...],
+                    format_address: Callable[[bytes], str]) -> Callable[[Union[str, bytes]], tuple]:
+    word_decoders = [get_word_decoder(abi_type, format_address) for abi_type in types]
+    if None not in word_decoders:
+        return StaticDecoder(types=types, word_decoders=word_decoders)
+
+    decoder = TupleDecoder(decoders=[registry.get_decoder(abi_type) for abi_type in types])
+    return lambda data: decoder(ContextFramesBytesIO(to_bytes(data)))
+
+
+def compile_encoder(registry: ABIRegistry, types: tuple[str, ...]) -> Callable[[tuple], bytes]:
+    return TupleEncoder(encoders=[registry.get_encoder(abi_type) for abi_type in types])
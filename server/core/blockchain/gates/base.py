@@ -1,29 +1,187 @@
 import abc
+import json
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Iterator, Optional, Union
 
+from eth_abi.registry import ABIRegistry
+
+from core.blockchain import addresses
 from core.blockchain.models import Network
+from core.blockchain.gates.pool import Endpoint, EndpointPool
+from core.blockchain.gates.cache import BlockCache
+from core.blockchain.gates.abi import KNOWN_SELECTORS, compile_decoder, compile_encoder
+
+
+class NodeError(Exception):
+    """Invalid or failed node response"""
+
+
+def split_range(start: int, end: int, size: int) -> Iterator[tuple[int, int]]:
+    """Split inclusive range [start, end] into inclusive chunks of at most `size` items"""
+    for chunk_start in range(start, end + 1, size):
+        yield chunk_start, min(chunk_start + size - 1, end)
 
 
 class AbstractNode(metaclass=abc.ABCMeta):
     __slots__ = (
         'network',
+        'pool',
         'provider',
         'client',
+        'cache',
+        'latest_block_number',
     )
 
-    @abc.abstractclassmethod
-    def encode_data(cls, func_args: tuple, params: tuple) -> str: ...
+    blocks_batch_size: int = 50                 # blocks per one bulk request
+    block_time: float = 3                       # first guess of the poll scheduler, learnt from the chain then
+    hedge_block_requests: bool = True           # race a stalled block fetch against the next endpoint
+    cache_depth: int = 64                       # blocks below the head before they go to the block cache
+    # Errors worth retrying: node down, timeouts, block not produced yet
+    transient_errors: tuple[type[Exception], ...] = (NodeError, OSError, asyncio.TimeoutError)
+    # Errors that are the endpoint's fault: counted against it, the next endpoint is tried
+    endpoint_errors: tuple[type[Exception], ...] = (NodeError, OSError, asyncio.TimeoutError)
+    abi_registry: ABIRegistry
 
     @abc.abstractclassmethod
-    def decode_data(cls, func_args: tuple, data: str) -> tuple: ...
+    def format_address(cls, raw_address: bytes) -> str: ...
+
+    @classmethod
+    def address_key(cls, address: str) -> bytes:
+        """The 20 bytes every index is keyed on, whatever text form the address comes in"""
+        return addresses.to_key(address)
+
+    @classmethod
+    def format_key(cls, key: bytes) -> str:
+        """Text form of a key in messages"""
+        return cls.format_address(key)
+
+    @classmethod
+    @functools.cache
+    def get_decoder(cls, func_args: tuple[str, ...],
+                    raw_addresses: bool = False) -> Callable[[Union[str, bytes]], tuple]:
+        return compile_decoder(
+            registry=cls.abi_registry,
+            types=func_args,
+            format_address=bytes if raw_addresses else cls.format_address,
+        )
+
+    @classmethod
+    @functools.cache
+    def get_encoder(cls, func_args: tuple[str, ...]) -> Callable[[tuple], bytes]:
+        return compile_encoder(registry=cls.abi_registry, types=func_args)
+
+    @classmethod
+    def encode_data(cls, func_args: tuple, params: tuple) -> str:
+        return cls.get_encoder(tuple(func_args))(params).hex()
+
+    @classmethod
+    def decode_data(cls, func_args: tuple, data: Union[str, bytes], raw_addresses: bool = False) -> tuple:
+        """With `raw_addresses` addresses are keys, not text"""
+        return cls.get_decoder(tuple(func_args), raw_addresses)(data)
+
+    @classmethod
+    def decode_call(cls, data: str, methods: Optional[dict] = None) -> Optional[tuple[str, tuple]]:
+        """(selector, arguments) of a known method call, None for unknown selectors"""
+        selector = data[:8]
+        if func_args := (KNOWN_SELECTORS if methods is None else methods).get(selector):
+            return selector, cls.decode_data(func_args, data[8:])
+        return None
 
     def __init__(self, network: Network):
         self.network = network
+        self.pool = EndpointPool(
+            endpoints=[self.create_endpoint(url) for url in network.node_urls],
+            errors=self.endpoint_errors,
+            name=network.short_name,
+        )
+        # The primary endpoint
+        self.provider = self.pool.primary.provider
+        self.client = self.pool.primary.client
+        self.cache: Optional[BlockCache] = None
+        self.latest_block_number: Optional[int] = None
+
+    @abc.abstractmethod
+    def create_endpoint(self, url: str) -> Endpoint: ...
+
+    async def request(self, function: Callable[[Endpoint], Awaitable], hedge: bool = False) -> Any:
+        """`function(endpoint)` on the best endpoint of the pool"""
+        return await self.pool.request(function, hedge=hedge and self.hedge_block_requests)
+
+    async def close(self):
+        pass
 
     @abc.abstractproperty
     async def is_connect(self) -> bool: ...
 
     @abc.abstractmethod
-    async def get_latest_block_number(self) -> int: ...
+    async def fetch_latest_block_number(self) -> int: ...
 
     @abc.abstractmethod
-    async def get_block_detail(self, block_number: int) -> dict: ...
+    async def fetch_block_detail(self, block_number: int) -> dict: ...
+
+    async def fetch_blocks_detail(self, start_block: int, end_block: int) -> list[dict]:
+        """Blocks from `start_block` to `end_block` inclusive from the node, in order"""
+        return list(await asyncio.gather(*[
+            self.fetch_block_detail(block_number=block_number)
+            for block_number in range(start_block, end_block + 1)
+        ]))
+
+    def dump_block(self, block: dict) -> bytes:
+        return json.dumps(block, separators=(',', ':')).encode('utf-8')
+
+    def load_block(self, data: bytes) -> dict:
+        return json.loads(data)
+
+    def is_cacheable(self, block_number: int) -> bool:
+        """Only blocks `cache_depth` below the head: a reorg can't replace them anymore"""
+        return (
+            self.cache is not None
+            and self.latest_block_number is not None
+            and self.latest_block_number - block_number >= self.cache_depth
+        )
+
+    def get_cached_block(self, block_number: int) -> Optional[dict]:
+        if self.cache is not None and (data := self.cache.get(block_number)) is not None:
+            return self.load_block(data)
+        return None
+
+    def cache_block(self, block_number: int, block: dict):
+        if self.is_cacheable(block_number):
+            self.cache.put(block_number, self.dump_block(block))
+
+    async def get_latest_block_number(self) -> int:
+        self.latest_block_number = await self.fetch_latest_block_number()
+        return self.latest_block_number
+
+    async def get_block_detail(self, block_number: int) -> dict:
+        if (block := self.get_cached_block(block_number)) is not None:
+            return block
+        block = await self.fetch_block_detail(block_number=block_number)
+        self.cache_block(block_number, block)
+        return block
+
+    async def get_blocks_detail(self, start_block: int, end_block: int) -> list[dict]:
+        """Blocks from `start_block` to `end_block` inclusive, in order: cached ones from disk, others from the node"""
+        if self.cache is None:
+            return await self.fetch_blocks_detail(start_block=start_block, end_block=end_block)
+
+        blocks = {}
+        missing = []
+        for block_number in range(start_block, end_block + 1):
+            if (block := self.get_cached_block(block_number)) is not None:
+                blocks[block_number] = block
+            elif missing and missing[-1][1] == block_number - 1:
+                missing[-1][1] = block_number
+            else:
+                missing.append([block_number, block_number])
+
+        fetched = await asyncio.gather(*[
+            self.fetch_blocks_detail(start_block=missing_start, end_block=missing_end)
+            for missing_start, missing_end in missing
+        ])
+        for (missing_start, _), chunk in zip(missing, fetched):
+            for block_number, block in enumerate(chunk, start=missing_start):
+                blocks[block_number] = block
+                self.cache_block(block_number, block)
+        return [blocks[block_number] for block_number in range(start_block, end_block + 1)]
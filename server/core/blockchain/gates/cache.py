@@ -0,0 +1,136 @@
+import os
+import mmap
+import fcntl
+import struct
+import contextlib
+from typing import Optional
+
+# block number, offset in the segment, length
+INDEX_RECORD = struct.Struct('<QQI')
+
+
+class BlockCache:
+    """
+    Append-only on-disk store of encoded blocks of one network.
+    `blocks.seg` holds the blocks one after another, `blocks.idx` a fixed size record per block.
+    Reads go through mmap of the segment: a replayed range costs page cache, not node requests.
+    Shared by the processes of a network (daemon, backfill workers): an append takes `flock` of the index
+    and places the block at the real end of the segment, records appended by others are read on a miss.
+    A crash between the two writes leaves a block without an index record: cut off on the next open.
+    """
+    __slots__ = (
+        'directory',
+        'hits',
+        'misses',
+        '_segment',
+        '_index',
+        '_offsets',
+        '_size',
+        '_position',
+        '_map',
+    )
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._segment = open(os.path.join(directory, 'blocks.seg'), 'a+b')
+        self._index = open(os.path.join(directory, 'blocks.idx'), 'a+b')
+        self._offsets: dict[int, tuple[int, int]] = {}
+        self._size = 0
+        self._position = 0                                  # of the index, read up to it
+        self._map: Optional[mmap.mmap] = None
+        self._load()
+
+    @contextlib.contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._index.fileno(), operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._index.fileno(), fcntl.LOCK_UN)
+
+    def _add_records(self, raw: bytes, segment_size: Optional[int] = None) -> int:
+        """Whole records of the raw index, up to the first past `segment_size`: returns their length"""
+        valid = 0
+        for position in range(0, len(raw) - INDEX_RECORD.size + 1, INDEX_RECORD.size):
+            block_number, offset, length = INDEX_RECORD.unpack_from(raw, position)
+            if segment_size is not None and offset + length > segment_size:
+                break
+            self._offsets.setdefault(block_number, (offset, length))
+            self._size = max(self._size, offset + length)
+            valid = position + INDEX_RECORD.size
+        self._position += valid
+        return valid
+
+    def _load(self):
+        with self._locked(fcntl.LOCK_EX):
+            segment_size = os.fstat(self._segment.fileno()).st_size
+            self._index.seek(0)
+            raw = self._index.read()
+            valid = self._add_records(raw, segment_size=segment_size)
+            if valid != len(raw):
+                self._index.truncate(valid)
+            if self._size != segment_size:
+                self._segment.truncate(self._size)
+
+    def _refresh(self):
+        """Records appended by the other processes, the lock is held by the caller"""
+        if os.fstat(self._index.fileno()).st_size > self._position:
+            self._index.seek(self._position)
+            self._add_records(self._index.read())
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, block_number: int) -> bool:
+        return block_number in self._offsets
+
+    def get(self, block_number: int) -> Optional[bytes]:
+        if block_number not in self._offsets:
+            with self._locked(fcntl.LOCK_SH):
+                self._refresh()
+        if (entry := self._offsets.get(block_number)) is None:
+            self.misses += 1
+            return None
+        offset, length = entry
+        if self._map is None or offset + length > len(self._map):
+            self._remap()
+        self.hits += 1
+        return self._map[offset:offset + length]
+
+    def put(self, block_number: int, data: bytes):
+        """First version wins: only blocks deep enough to never change are meant to be stored"""
+        if block_number in self._offsets:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            self._refresh()
+            if block_number in self._offsets:
+                return
+            offset = os.fstat(self._segment.fileno()).st_size
+            self._segment.write(data)
+            self._segment.flush()
+            self._index.write(INDEX_RECORD.pack(block_number, offset, len(data)))
+            self._index.flush()
+            self._add_records(INDEX_RECORD.pack(block_number, offset, len(data)))
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._segment.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._segment.close()
+        self._index.close()
+
+    def metrics(self) -> dict:
+        return {
+            'blocks': len(self),
+            'size': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -1,33 +1,212 @@
-import eth_abi
+import json
+import asyncio
+from collections.abc import Mapping
+from typing import Any, Optional
+
+import aiohttp
+
+from hexbytes import HexBytes
+from eth_utils import to_checksum_address
+from eth_abi.registry import registry as eth_abi_registry
 from web3 import AsyncWeb3, AsyncHTTPProvider
+from web3.exceptions import BlockNotFound
+from web3.datastructures import AttributeDict
 
+from core.blockchain import addresses
 from core.blockchain.models import Network
-from core.blockchain.gates.base import AbstractNode
+from core.blockchain.gates.base import AbstractNode, NodeError, split_range
+from core.blockchain.gates.pool import Endpoint
+
+# keccak('Transfer(address,address,uint256)')
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+# Fields of blocks, transactions, receipts and logs formatted like `web3.eth` does
+QUANTITY_FIELDS = frozenset({
+    'baseFeePerGas', 'blobGasUsed', 'blockNumber', 'chainId', 'cumulativeGasUsed', 'difficulty',
+    'effectiveGasPrice', 'excessBlobGas', 'gas', 'gasLimit', 'gasPrice', 'gasUsed', 'logIndex',
+    'maxFeePerBlobGas', 'maxFeePerGas', 'maxPriorityFeePerGas', 'nonce', 'number', 'size', 'status',
+    'timestamp', 'totalDifficulty', 'transactionIndex', 'type', 'v', 'value', 'yParity',
+})
+ADDRESS_FIELDS = frozenset({'address', 'contractAddress', 'from', 'miner', 'to'})
+
+
+def format_result(value: Any, field: Optional[str] = None) -> Any:
+    """Raw JSON-RPC result to the `AttributeDict`/`HexBytes`/int values `web3.eth` methods return"""
+    if isinstance(value, dict):
+        return AttributeDict({key: format_result(item, key) for key, item in value.items()})
+    if isinstance(value, list):
+        return [format_result(item, field) for item in value]
+    if not isinstance(value, str) or not value.startswith('0x'):
+        return value
+    if field == 'nonce' and len(value) == 18:
+        # Block nonce is 8 bytes of data, transaction nonce is a quantity
+        return HexBytes(value)
+    if field in QUANTITY_FIELDS:
+        return int(value, 16)
+    if field in ADDRESS_FIELDS:
+        return to_checksum_address(value)
+    return HexBytes(value)
+
+
+def unformat_result(value: Any) -> Any:
+    """`format_result` backwards: web3 values to the raw JSON-RPC ones"""
+    if isinstance(value, Mapping):
+        return {key: unformat_result(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [unformat_result(item) for item in value]
+    if isinstance(value, bytes):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, int) and not isinstance(value, bool):
+        return hex(value)
+    return value
 
 
 class Node(AbstractNode):
+    rpc_batch_size: int = 50                    # calls per one JSON-RPC batch request
+    abi_registry = eth_abi_registry
+    transient_errors = AbstractNode.transient_errors + (aiohttp.ClientError, BlockNotFound)
+    endpoint_errors = AbstractNode.endpoint_errors + (aiohttp.ClientError,)
+
     @classmethod
-    def encode_data(cls, func_args: tuple, params: tuple) -> str:
-        return eth_abi.encode(func_args, params).hex()
+    def format_address(cls, raw_address: bytes) -> str:
+        # Normalized (lowercase) like `eth_abi` decodes it
+        return '0x' + raw_address.hex()
 
     @classmethod
-    def decode_data(cls, func_args: tuple, data: str) -> tuple:
-        return eth_abi.decode(func_args, data=data)
+    def format_key(cls, key: bytes) -> str:
+        # Checksummed like `web3` returns them
+        return addresses.to_checksum(key)
 
     def __init__(self, network: Network):
+        self._session: Optional[aiohttp.ClientSession] = None
         super().__init__(network)
-        self.provider = AsyncHTTPProvider(endpoint_uri=network.node_url)
-        self.client = AsyncWeb3(provider=self.provider)
+
+    def create_endpoint(self, url: str) -> Endpoint:
+        provider = AsyncHTTPProvider(endpoint_uri=url)
+        return Endpoint(url=url, provider=provider, client=AsyncWeb3(provider=provider))
+
+    def dump_block(self, block: dict) -> bytes:
+        return super().dump_block(unformat_result(block))
+
+    def load_block(self, data: bytes) -> dict:
+        return format_result(super().load_block(data))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
 
     @property
     async def is_connect(self) -> bool:
-        return await self.client.is_connected()
+        return await self.request(lambda endpoint: endpoint.client.is_connected())
 
-    async def get_latest_block_number(self) -> int:
-        return await self.client.eth.get_block_number
+    async def post(self, endpoint: Endpoint, data: bytes) -> Any:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(raise_for_status=True)
+        request_kwargs = endpoint.provider.get_request_kwargs()
+        async with self._session.post(endpoint.url, data=data, **request_kwargs) as response:
+            return await response.json(content_type=None)
 
-    async def get_block_detail(self, block_number: int) -> dict:
-        return await self.client.eth.get_block(
-            block_identifier=block_number,
-            full_transactions=True,
+    async def make_batch_request(self, method: str, params: list[list], hedge: bool = False) -> list:
+        """One POST with a JSON-RPC call per item of `params`, results are formatted like web3 does"""
+        data = json.dumps([
+            {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': call_params}
+            for request_id, call_params in enumerate(params)
+        ]).encode('utf-8')
+        # A malformed answer is the endpoint's fault too: validated inside the pooled call
+        return await self.request(
+            lambda endpoint: self._make_batch_request(endpoint, method, params, data),
+            hedge=hedge,
         )
+
+    async def _make_batch_request(self, endpoint: Endpoint, method: str, params: list[list], data: bytes) -> list:
+        responses = await self.post(endpoint, data)
+
+        if not isinstance(responses, list):
+            error = responses.get('error', responses) if isinstance(responses, dict) else responses
+            raise NodeError(f'{method} batch failed: {error}')
+
+        results = {}
+        for response in responses:
+            if not isinstance(response, dict) or 'id' not in response:
+                raise NodeError(f'{method} malformed response: {response}')
+            if response.get('error') is not None:
+                raise NodeError(f'{method} failed: {response["error"]}')
+            if 'result' not in response:
+                raise NodeError(f'{method} response without result: {response}')
+            results[response['id']] = response['result']
+
+        if len(results) != len(params) or set(results) != set(range(len(params))):
+            raise NodeError(f'{method} batch returned {len(results)} of {len(params)} results')
+        return [
+            format_result(results[request_id]) if results[request_id] is not None else None
+            for request_id in range(len(params))
+        ]
+
+    async def fetch_latest_block_number(self) -> int:
+        return await self.request(lambda endpoint: endpoint.client.eth.get_block_number())
+
+    async def fetch_block_detail(self, block_number: int) -> dict:
+        return await self.request(
+            lambda endpoint: endpoint.client.eth.get_block(block_identifier=block_number, full_transactions=True),
+            hedge=True,
+        )
+
+    async def fetch_blocks_detail(self, start_block: int, end_block: int) -> list[dict]:
+        chunks = await asyncio.gather(*[
+            self.make_batch_request('eth_getBlockByNumber', [
+                [hex(block_number), True]
+                for block_number in range(chunk_start, chunk_end + 1)
+            ], hedge=True)
+            for chunk_start, chunk_end in split_range(start_block, end_block, self.rpc_batch_size)
+        ])
+
+        blocks = [block for chunk in chunks for block in chunk]
+        if None in blocks:
+            raise BlockNotFound(f'Block {start_block + blocks.index(None)} not found')
+        return blocks
+
+    async def get_blocks_header(self, block_numbers: list[int]) -> dict[int, dict]:
+        """Blocks without transactions, by number"""
+        headers = await asyncio.gather(*[
+            self.make_batch_request('eth_getBlockByNumber', [
+                [hex(block_number), False]
+                for block_number in block_numbers[chunk_start:chunk_end + 1]
+            ])
+            for chunk_start, chunk_end in split_range(0, len(block_numbers) - 1, self.rpc_batch_size)
+        ])
+        return {
+            header['number']: header
+            for chunk in headers
+            for header in chunk
+            if header is not None
+        }
+
+    async def get_transactions_receipt(self, transaction_hashes: list[str]) -> dict[str, dict]:
+        receipts = await asyncio.gather(*[
+            self.make_batch_request('eth_getTransactionReceipt', [
+                [transaction_hash]
+                for transaction_hash in transaction_hashes[chunk_start:chunk_end + 1]
+            ])
+            for chunk_start, chunk_end in split_range(0, len(transaction_hashes) - 1, self.rpc_batch_size)
+        ])
+        return {
+            receipt['transactionHash'].hex(): receipt
+            for chunk in receipts
+            for receipt in chunk
+            if receipt is not None
+        }
+
+    async def get_transfer_logs(self, start_block: int, end_block: int, contracts: list[bytes],
+                                recipients: Optional[list[bytes]] = None) -> list[dict]:
+        """`Transfer` events of `contracts`, optionally only to `recipients`, both as address keys"""
+        log_filter = {
+            'fromBlock': start_block,
+            'toBlock': end_block,
+            'address': [addresses.to_checksum(contract) for contract in contracts],
+            'topics': [
+                TRANSFER_TOPIC,
+                None,
+                [addresses.to_topic(recipient) for recipient in recipients] if recipients else None,
+            ],
+        }
+        return await self.request(lambda endpoint: endpoint.client.eth.get_logs(log_filter))
@@ -0,0 +1,199 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from config import get_logger
+from core.common.metrics import labels
+from core.blockchain.metrics import NODE_ENDPOINTS, NODE_REQUEST_ERRORS, NODE_REQUEST_SECONDS
+
+
+class Endpoint:
+    """One node URL of a network with its client and health"""
+    __slots__ = (
+        'url',
+        'provider',
+        'client',
+        'latency',
+        'error_rate',
+        'requests',
+        'failures',
+        'consecutive_failures',
+        'trips',
+        'open_until',
+        'request_time',
+        'request_errors',
+    )
+
+    def __init__(self, url: str, provider: Any = None, client: Any = None):
+        self.url = url
+        self.provider = provider
+        self.client = client
+        self.latency = 0.0                      # EWMA of successful calls, sec
+        self.error_rate = 0.0                   # EWMA of failed calls, 0..1
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.trips = 0                          # circuit openings in a row
+        self.open_until = 0.0
+        self.request_time = None
+        self.request_errors = None
+
+    def is_open(self, now: float) -> bool:
+        return now < self.open_until
+
+    def __repr__(self):
+        return f'Endpoint({self.url})'
+
+
+class EndpointPool:
+    """
+    Node endpoints of one network.
+    Calls go to the healthy endpoint with the lowest latency and fail over to the next one on `errors`.
+    `failure_threshold` failures in a row open the circuit of an endpoint for `open_timeout` sec,
+    doubled on every new opening; after it one trial call closes it again or reopens it.
+    Errors other than `errors` (a block not produced yet) are not the endpoint's fault: raised at once.
+    A hedged call starts the same request on the next endpoint when the first one is slower than
+    `hedge_factor` times its usual latency, the first answer wins.
+    """
+    latency_alpha: float = 0.2
+    failure_threshold: int = 3
+    open_timeout: float = 5
+    open_max_timeout: float = 300               # 5 min
+    request_timeout: float = 10
+    hedge_factor: float = 3
+    hedge_min_delay: float = 0.3
+
+    def __init__(self, endpoints: list[Endpoint], errors: tuple[type[Exception], ...], name: str = 'node'):
+        if not endpoints:
+            raise ValueError('Node endpoint pool is empty')
+        self.endpoints = endpoints
+        self.errors = errors
+        self.hedged = 0
+        self.failovers = 0
+        self.logger = get_logger(name=f'pool:{name}')
+        for endpoint in endpoints:
+            endpoint.request_time = labels(NODE_REQUEST_SECONDS, network=name, endpoint=endpoint.url)
+            endpoint.request_errors = labels(NODE_REQUEST_ERRORS, network=name, endpoint=endpoint.url)
+            NODE_ENDPOINTS.add(
+                lambda endpoint=endpoint: self.get_endpoint_metrics(endpoint),
+                network=name,
+                endpoint=endpoint.url,
+            )
+
+    @property
+    def primary(self) -> Endpoint:
+        return self.endpoints[0]
+
+    def select(self) -> list[Endpoint]:
+        """Endpoints in the order to try them: closed circuits by latency, then open ones soonest to close"""
+        now = time.monotonic()
+        healthy = sorted(
+            (endpoint for endpoint in self.endpoints if not endpoint.is_open(now)),
+            key=lambda endpoint: endpoint.latency,
+        )
+        broken = sorted(
+            (endpoint for endpoint in self.endpoints if endpoint.is_open(now)),
+            key=lambda endpoint: endpoint.open_until,
+        )
+        return healthy + broken
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        return max(endpoint.latency * self.hedge_factor, self.hedge_min_delay)
+
+    def record_success(self, endpoint: Endpoint, latency: float):
+        endpoint.requests += 1
+        endpoint.request_time.observe(latency)
+        if endpoint.latency:
+            endpoint.latency += self.latency_alpha * (latency - endpoint.latency)
+        else:
+            endpoint.latency = latency
+        endpoint.error_rate -= self.latency_alpha * endpoint.error_rate
+        endpoint.consecutive_failures = 0
+        endpoint.trips = 0
+
+    def record_failure(self, endpoint: Endpoint, error: Exception):
+        endpoint.requests += 1
+        endpoint.failures += 1
+        endpoint.request_errors.inc()
+        endpoint.error_rate += self.latency_alpha * (1 - endpoint.error_rate)
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            timeout = min(self.open_timeout * 2 ** endpoint.trips, self.open_max_timeout)
+            endpoint.trips += 1
+            endpoint.open_until = time.monotonic() + timeout
+            self.logger.error(f'{endpoint} circuit open for {timeout:.0f} sec: {error!r}')
+
+    async def call(self, endpoint: Endpoint, function: Callable[[Endpoint], Awaitable]) -> Any:
+        started_at = time.monotonic()
+        try:
+            result = await asyncio.wait_for(function(endpoint), timeout=self.request_timeout)
+        except self.errors as error:
+            self.record_failure(endpoint, error)
+            raise
+        self.record_success(endpoint, time.monotonic() - started_at)
+        return result
+
+    async def request(self, function: Callable[[Endpoint], Awaitable], hedge: bool = False) -> Any:
+        """`function(endpoint)` on the best endpoint, then on the next ones while it fails with `errors`"""
+        candidates = self.select()
+        last_error: Optional[Exception] = None
+        if not hedge or len(candidates) == 1:
+            for number, endpoint in enumerate(candidates):
+                if number:
+                    self.failovers += 1
+                try:
+                    return await self.call(endpoint, function)
+                except self.errors as error:
+                    last_error = error
+            raise last_error
+
+        pending: dict[asyncio.Task, Endpoint] = {}
+
+        def launch():
+            endpoint = candidates.pop(0)
+            pending[asyncio.create_task(self.call(endpoint, function))] = endpoint
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if candidates:
+                    timeout = self.hedge_delay(max(pending.values(), key=lambda endpoint: endpoint.latency))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                    if (error := task.exception()) is None:
+                        return task.result()
+                    if not isinstance(error, self.errors):
+                        raise error
+                    last_error = error
+
+                if not pending and candidates:
+                    self.failovers += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            # The losers are not counted against their endpoints
+            await asyncio.gather(*pending, return_exceptions=True)
+        raise last_error
+
+    @staticmethod
+    def get_endpoint_metrics(endpoint: Endpoint, now: Optional[float] = None) -> dict:
+        return {
+            'url': endpoint.url,
+            'latency': endpoint.latency,
+            'error_rate': endpoint.error_rate,
+            'requests': endpoint.requests,
+            'failures': endpoint.failures,
+            'is_open': endpoint.is_open(now or time.monotonic()),
+        }
+
+    def metrics(self) -> list[dict]:
+        now = time.monotonic()
+        return [self.get_endpoint_metrics(endpoint, now) for endpoint in self.endpoints]
@@ -1,37 +1,99 @@
-from tronpy.abi import tron_abi
+import asyncio
+
+import httpx
+
+from tronpy.abi import registry as tron_abi_registry
+from tronpy.exceptions import BlockNotFound, BugInJavaTron
 from tronpy.async_tron import AsyncTron, AsyncHTTPProvider
 
-from core.blockchain.models import Network
-from core.blockchain.gates.base import AbstractNode
+from core.blockchain import addresses
+from core.blockchain.gates.base import AbstractNode, split_range
+from core.blockchain.gates.pool import Endpoint
 
 
 class Node(AbstractNode):
+    blocks_batch_size: int = 100
+    range_request_limit: int = 100              # max blocks of one `getblockbylimitnext`
+    abi_registry = tron_abi_registry
+    transient_errors = AbstractNode.transient_errors + (httpx.HTTPError, BlockNotFound, BugInJavaTron)
+    endpoint_errors = AbstractNode.endpoint_errors + (httpx.HTTPError, BugInJavaTron)
 
     @classmethod
-    def encode_data(cls, func_args: tuple, params: tuple) -> str:
-        return tron_abi.encode_single(func_args, params).hex()
+    def format_address(cls, raw_address: bytes) -> str:
+        return addresses.to_base58(bytes(raw_address))
 
-    @classmethod
-    def decode_data(cls, func_args: tuple, data: str) -> tuple:
-        return tron_abi.decode_single(func_args, data=data)
-
-    def __init__(self, network: Network):
-        super().__init__(network)
-        self.provider = AsyncHTTPProvider(endpoint_uri=network.node_url)
-        self.client = AsyncTron(provider=self.provider)
+    def create_endpoint(self, url: str) -> Endpoint:
+        provider = AsyncHTTPProvider(endpoint_uri=url)
+        return Endpoint(url=url, provider=provider, client=AsyncTron(provider=provider))
 
     @property
     async def is_connect(self) -> bool:
         from httpx._exceptions import HTTPStatusError
         try:
-            await self.client.list_nodes()
+            await self.request(lambda endpoint: endpoint.client.list_nodes())
         except HTTPStatusError:
             return False
         else:
             return True
 
-    async def get_latest_block_number(self) -> int:
-        return await self.client.get_latest_block_number()
+    async def fetch_latest_block_number(self) -> int:
+        return await self.request(lambda endpoint: endpoint.client.get_latest_block_number())
+
+    async def fetch_block_detail(self, block_number: int) -> dict:
+        return await self.request(
+            # Hex addresses: no base58 encoding on the node, keys are cut straight out of them
+            lambda endpoint: endpoint.client.get_block(id_or_num=block_number, visible=False),
+            hedge=True,
+        )
+
+    async def get_blocks_by_limit_next(self, start_block: int, end_block: int) -> list[dict]:
+        return await self.request(
+            lambda endpoint: self._get_blocks_by_limit_next(endpoint, start_block, end_block),
+            hedge=True,
+        )
+
+    @staticmethod
+    async def _get_blocks_by_limit_next(endpoint: Endpoint, start_block: int, end_block: int) -> list[dict]:
+        response = await endpoint.provider.make_request('wallet/getblockbylimitnext', {
+            'startNum': start_block,
+            'endNum': end_block + 1,            # exclusive
+            'visible': False,
+        })
+        if not isinstance(response, dict) or 'Error' in response:
+            raise BugInJavaTron(response)
+        # `{}` when none of the blocks is produced yet
+        return response.get('block', [])
+
+    async def fetch_blocks_detail(self, start_block: int, end_block: int) -> list[dict]:
+        chunks = await asyncio.gather(*[
+            self.get_blocks_by_limit_next(start_block=chunk_start, end_block=chunk_end)
+            for chunk_start, chunk_end in split_range(start_block, end_block, self.range_request_limit)
+        ])
+
+        blocks = {
+            block['block_header']['raw_data']['number']: block
+            for chunk in chunks
+            for block in chunk
+        }
+        if missing := [number for number in range(start_block, end_block + 1) if number not in blocks]:
+            raise BlockNotFound(f'Blocks not found: {missing[:10]}')
+        return [blocks[number] for number in range(start_block, end_block + 1)]
+
+    async def get_block_transactions_info(self, block_number: int) -> list[dict]:
+        """Fee, energy and bandwidth of every transaction of the block in one call"""
+        return await self.request(
+            lambda endpoint: self._get_block_transactions_info(endpoint, block_number),
+            hedge=True,
+        )
 
-    async def get_block_detail(self, block_number: int) -> dict:
-        return await self.client.get_block(id_or_num=block_number, visible=True)
+    @staticmethod
+    async def _get_block_transactions_info(endpoint: Endpoint, block_number: int) -> list[dict]:
+        response = await endpoint.provider.make_request(
+            'wallet/gettransactioninfobyblocknum', {'num': block_number},
+        )
+        if isinstance(response, dict):
+            # `{}` for a block without transactions, or not indexed yet: callers check their transactions
+            if 'Error' in response:
+                raise BugInJavaTron(response)
+            return []
+        return response
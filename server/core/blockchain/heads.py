@@ -0,0 +1,133 @@
+import json
+import time
+import asyncio
+from typing import Optional
+
+import websockets
+
+from config import get_logger
+
+
+class PollScheduler:
+    """
+    Predicts the next block from the observed block times: polls right after it is due,
+    then often while it is late, instead of a fixed sleep between polls.
+    """
+    __slots__ = (
+        'block_time',
+        'last_block',
+        'last_seen_at',
+    )
+
+    alpha: float = 0.2
+    grace: float = 0.05                         # share of the block time after the due moment
+    late_poll: float = 0.1                      # share of the block time between polls of a late block
+    min_delay: float = 0.05
+    max_delay: float = 30
+
+    def __init__(self, block_time: float):
+        self.block_time = block_time
+        self.last_block: Optional[int] = None
+        self.last_seen_at: Optional[float] = None
+
+    def observe(self, block_number: int, now: float):
+        if self.last_block is not None and block_number > self.last_block:
+            block_time = (now - self.last_seen_at) / (block_number - self.last_block)
+            self.block_time += self.alpha * (block_time - self.block_time)
+        if self.last_block is None or block_number > self.last_block:
+            self.last_block = block_number
+            self.last_seen_at = now
+
+    def delay(self, now: float) -> float:
+        if self.last_seen_at is None:
+            return self.min_delay
+        due_in = self.last_seen_at + self.block_time * (1 + self.grace) - now
+        if due_in <= 0:
+            due_in = self.block_time * self.late_poll
+        return min(max(due_in, self.min_delay), self.max_delay)
+
+
+class HeadWatcher:
+    """
+    Latest block number of a network: pushed by a `newHeads` subscription when the network has a
+    websocket endpoint, polled at the predicted block time otherwise or while the subscription is down.
+    """
+    reconnect_delay: float = 1
+    reconnect_max_delay: float = 60             # 1 min
+    stall_blocks: float = 3                     # block times without a pushed head before one poll
+
+    def __init__(self, node, ws_url: Optional[str] = None):
+        self.node = node
+        self.ws_url = ws_url
+        self.scheduler = PollScheduler(block_time=node.block_time)
+        self.latest_block: Optional[int] = None
+        self.is_subscribed = False
+        self.pushed = 0
+        self.polled = 0
+        self._new_head = asyncio.Event()
+        self.logger = get_logger(name=f'heads:{node.network.short_name}')
+
+    def on_head(self, block_number: int):
+        if self.latest_block is None or block_number > self.latest_block:
+            self.latest_block = block_number
+            self.node.latest_block_number = max(self.node.latest_block_number or 0, block_number)
+            self.scheduler.observe(block_number, time.monotonic())
+            self._new_head.set()
+
+    async def poll(self):
+        self.polled += 1
+        self.on_head(await self.node.get_latest_block_number())
+
+    async def wait(self, above: int) -> int:
+        """The latest block number once it is above `above`"""
+        if self.latest_block is None:
+            await self.poll()
+        while self.latest_block <= above:
+            if self.is_subscribed:
+                # A silent subscription may be a dead one
+                timeout = max(self.scheduler.block_time * self.stall_blocks, self.scheduler.min_delay)
+            else:
+                timeout = self.scheduler.delay(time.monotonic())
+            self._new_head.clear()
+            try:
+                await asyncio.wait_for(self._new_head.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await self.poll()
+        return self.latest_block
+
+    async def listen(self, websocket):
+        await websocket.send(json.dumps({
+            'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads'],
+        }))
+        response = json.loads(await websocket.recv())
+        if 'result' not in response:
+            raise ConnectionError(f'newHeads subscription refused: {response}')
+        self.is_subscribed = True
+        async for message in websocket:
+            head = json.loads(message)['params']['result']
+            self.pushed += 1
+            self.on_head(int(head['number'], 16))
+
+    async def subscribe(self):
+        """Runs in the background for the scraper's lifetime, polling covers the gaps"""
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with websockets.connect(self.ws_url) as websocket:
+                    delay = self.reconnect_delay
+                    await self.listen(websocket)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException, ValueError, KeyError) as error:
+                self.logger.warning(f'newHeads subscription lost, polling for {delay:.0f} sec: {error!r}')
+            finally:
+                self.is_subscribed = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    def metrics(self) -> dict:
+        return {
+            'latest_block': self.latest_block,
+            'block_time': self.scheduler.block_time,
+            'is_subscribed': self.is_subscribed,
+            'pushed': self.pushed,
+            'polled': self.polled,
+        }
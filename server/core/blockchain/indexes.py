@@ -0,0 +1,205 @@
+import asyncio
+import sys
+from typing import Callable, Hashable, Iterable, Optional
+
+from config import get_logger
+from config.redis import RedisConnector
+from core.blockchain.dao import OrderDAO
+from core.blockchain.events import OrderEvent, get_order_events_stream, get_events_storage
+
+
+class WatchedAddressIndex:
+    """
+    Deposit address -> order id of the open orders of one network, keyed on `normalize` of the address.
+    Loaded from the database once, then kept up to date by the order events stream.
+    """
+    __slots__ = (
+        'network_id',
+        'version',
+        'listeners',
+        '_orders',
+        '_stream',
+        '_last_event_id',
+        '_storage',
+        '_normalize',
+        '_logger',
+    )
+
+    read_count: int = 1000
+    read_block_ms: int = 5000
+
+    def __init__(self, network_id: int, storage: Optional[RedisConnector] = None,
+                 normalize: Callable[[str], Hashable] = str):
+        self.network_id = network_id
+        self.version = 0
+        self.listeners: list[Callable[[OrderEvent, Hashable], None]] = []
+
+        self._orders: dict[Hashable, int] = {}
+        self._stream = get_order_events_stream(network_id)
+        self._last_event_id = '0-0'
+        self._storage = storage or get_events_storage()
+        self._normalize = normalize
+        self._logger = get_logger(name=f'index:{network_id}')
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._orders
+
+    def __getitem__(self, address: str) -> int:
+        return self._orders[address]
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __iter__(self):
+        return iter(self._orders)
+
+    def get(self, address: str, default: Optional[int] = None) -> Optional[int]:
+        return self._orders.get(address, default)
+
+    def apply(self, event: OrderEvent, address: str, order_id: int):
+        """Idempotent: events replayed after `load` change nothing"""
+        address = self._normalize(address)
+        if event == OrderEvent.CREATED:
+            self._orders[address] = order_id
+        elif self._orders.get(address) == order_id:
+            del self._orders[address]
+        else:
+            return
+        self.version += 1
+        for listener in self.listeners:
+            listener(event, address)
+
+    async def load(self):
+        # Remember the stream position before the snapshot, events racing with it are replayed by `follow`
+        self._last_event_id = await self._storage.async_last_stream_id(self._stream) or '0-0'
+        self._orders = {
+            self._normalize(address): order_id
+            for address, order_id in await OrderDAO.get_open_addresses(network_id=self.network_id)
+        }
+        self.version += 1
+
+    async def read_events(self) -> int:
+        response = await self._storage.async_xread(
+            streams={self._stream: self._last_event_id},
+            count=self.read_count,
+            block=self.read_block_ms,
+        )
+        applied = 0
+        for _, entries in response or []:
+            for event_id, fields in entries:
+                self.apply(
+                    event=OrderEvent(fields[b'event'].decode()),
+                    address=fields[b'address'].decode(),
+                    order_id=int(fields[b'order_id']),
+                )
+                self._last_event_id = event_id
+                applied += 1
+        return applied
+
+    async def follow(self, retry_after: int = 1):
+        while True:
+            try:
+                await self.read_events()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self._logger.error(f'Order events read failed: {error!r}')
+                await asyncio.sleep(retry_after)
+
+
+class AddressPrefilter:
+    """
+    Every address form a scraper reacts to: deposit addresses, order providers, stable coins.
+    A set, not a Bloom filter: in CPython a set lookup is faster than hashing into a bit array.
+    Additions go straight into the set, removals only mark it stale until the background rebuild.
+    """
+    __slots__ = (
+        'rebuilds',
+        'checks',
+        'passed',
+        'misses',
+        '_keys',
+        '_key_function',
+        '_stale',
+        '_pending',
+        '_rebuild_lock',
+    )
+
+    def __init__(self, key_function: Callable[[bytes], Iterable[bytes]]):
+        self.rebuilds = 0
+        self.checks = 0
+        self.passed = 0
+        self.misses = 0
+
+        self._keys: set[bytes] = set()
+        self._key_function = key_function
+        self._stale = True
+        self._pending: Optional[list[bytes]] = None
+        self._rebuild_lock = asyncio.Lock()
+
+    def __contains__(self, key: bytes) -> bool:
+        self.checks += 1
+        if key in self._keys:
+            self.passed += 1
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def is_stale(self) -> bool:
+        return self._stale
+
+    def mark_stale(self):
+        self._stale = True
+
+    def miss(self):
+        """Passed the prefilter but matched nothing: a removed address still in the stale set"""
+        self.misses += 1
+
+    def add(self, address: bytes):
+        self._keys.update(self._key_function(address))
+        if self._pending is not None:
+            self._pending.append(address)
+
+    def on_order_event(self, event: OrderEvent, address: bytes):
+        if event == OrderEvent.CREATED:
+            self.add(address)
+        else:
+            self.mark_stale()
+
+    def _build(self, addresses: list[bytes]) -> set[bytes]:
+        return {key for address in addresses for key in self._key_function(address)}
+
+    async def rebuild(self, addresses: Iterable[bytes]):
+        async with self._rebuild_lock:
+            # Snapshot in the loop, convert in a thread: the sources keep changing meanwhile
+            self._stale = False
+            self._pending = []
+            try:
+                keys = await asyncio.to_thread(self._build, list(addresses))
+                # Additions made while building, no await till the swap
+                for address in self._pending:
+                    keys.update(self._key_function(address))
+                self._keys = keys
+            finally:
+                self._pending = None
+            self.rebuilds += 1
+
+    def memory_bytes(self) -> int:
+        """Footprint of the set: its hash table and the keys it holds"""
+        keys = self._keys
+        return sys.getsizeof(keys) + sum(map(sys.getsizeof, keys))
+
+    def metrics(self) -> dict:
+        return {
+            'keys': len(self._keys),
+            'memory_bytes': self.memory_bytes(),
+            'checks': self.checks,
+            'passed': self.passed,
+            'misses': self.misses,
+            # Share of the passed keys that matched nothing
+            'false_positive_rate': self.misses / self.passed if self.passed else 0.0,
+            'rebuilds': self.rebuilds,
+        }
@@ -0,0 +1,165 @@
+import abc
+import json
+import decimal
+from typing import Any, Optional, Self
+from dataclasses import dataclass
+
+import msgpack
+
+DECIMAL_EXT_TYPE = 1
+
+
+@dataclass(slots=True)
+class Participant:
+    address: str
+    amount: decimal.Decimal
+
+    def to_list(self) -> list:
+        return [self.address, self.amount]
+
+
+@dataclass(slots=True)
+class Message:
+    timestamp: int
+    order_id: int
+    network_id: int
+    transaction_id: str
+    fee: decimal.Decimal
+    commission_detail: dict
+    amount: decimal.Decimal
+    inputs: list[Participant]
+    outputs: list[Participant]
+    currency_id: Optional[int] = None
+    block_number: Optional[int] = None
+
+    @classmethod
+    def from_json(cls, raw_message: dict) -> Self:
+        return JSONMessageCodec.from_dict(raw_message)
+
+    def to_json(self) -> str:
+        return JSONMessageCodec.encode(self)
+
+
+class MessageCodec(metaclass=abc.ABCMeta):
+    """`Message` <-> task payload. `serializer` is the Celery serializer able to carry the payload"""
+    name: str
+    serializer: str
+
+    @abc.abstractclassmethod
+    def encode(cls, message: Message) -> Any: ...
+
+    @abc.abstractclassmethod
+    def decode(cls, payload: Any) -> Message: ...
+
+
+class JSONMessageCodec(MessageCodec):
+    """Decimals as strings, readable in the broker UI"""
+    name = 'json'
+    serializer = 'json'
+
+    @classmethod
+    def to_dict(cls, message: Message) -> dict:
+        return {
+            'timestamp': message.timestamp,
+            'order_id': message.order_id,
+            'network_id': message.network_id,
+            'transaction_id': message.transaction_id,
+            'fee': str(message.fee),
+            'commission_detail': message.commission_detail,
+            'amount': str(message.amount),
+            'inputs': [{'address': p.address, 'amount': str(p.amount)} for p in message.inputs],
+            'outputs': [{'address': p.address, 'amount': str(p.amount)} for p in message.outputs],
+            'currency_id': message.currency_id,
+            'block_number': message.block_number,
+        }
+
+    @classmethod
+    def from_dict(cls, raw_message: dict) -> Message:
+        return Message(
+            timestamp=raw_message['timestamp'],
+            order_id=raw_message['order_id'],
+            network_id=raw_message['network_id'],
+            transaction_id=raw_message['transaction_id'],
+            fee=decimal.Decimal(raw_message['fee']),
+            commission_detail=raw_message['commission_detail'],
+            amount=decimal.Decimal(raw_message['amount']),
+            inputs=[Participant(p['address'], decimal.Decimal(p['amount'])) for p in raw_message['inputs']],
+            outputs=[Participant(p['address'], decimal.Decimal(p['amount'])) for p in raw_message['outputs']],
+            currency_id=raw_message.get('currency_id'),
+            block_number=raw_message.get('block_number'),
+        )
+
+    @classmethod
+    def encode(cls, message: Message) -> str:
+        return json.dumps(cls.to_dict(message), default=str)
+
+    @classmethod
+    def decode(cls, payload: str) -> Message:
+        return cls.from_dict(json.loads(payload))
+
+
+def _msgpack_default(value: Any):
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(DECIMAL_EXT_TYPE, str(value).encode('ascii'))
+    raise TypeError(f'Cannot serialize {type(value)}')
+
+
+def _msgpack_ext_hook(code: int, data: bytes):
+    if code == DECIMAL_EXT_TYPE:
+        return decimal.Decimal(data.decode('ascii'))
+    return msgpack.ExtType(code, data)
+
+
+class MsgpackMessageCodec(MessageCodec):
+    """Positional array in field order, decimals as an extension type: compact and lossless"""
+    name = 'msgpack'
+    serializer = 'msgpack'
+
+    @classmethod
+    def encode(cls, message: Message) -> bytes:
+        return msgpack.packb([
+            message.timestamp,
+            message.order_id,
+            message.network_id,
+            message.transaction_id,
+            message.fee,
+            message.commission_detail,
+            message.amount,
+            [participant.to_list() for participant in message.inputs],
+            [participant.to_list() for participant in message.outputs],
+            message.currency_id,
+            message.block_number,
+        ], default=_msgpack_default, use_bin_type=True)
+
+    @classmethod
+    def decode(cls, payload: bytes) -> Message:
+        (
+            timestamp, order_id, network_id, transaction_id, fee,
+            commission_detail, amount, inputs, outputs, currency_id, block_number,
+        ) = msgpack.unpackb(payload, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+        return Message(
+            timestamp=timestamp,
+            order_id=order_id,
+            network_id=network_id,
+            transaction_id=transaction_id,
+            fee=fee,
+            commission_detail=commission_detail,
+            amount=amount,
+            inputs=[Participant(address, participant_amount) for address, participant_amount in inputs],
+            outputs=[Participant(address, participant_amount) for address, participant_amount in outputs],
+            currency_id=currency_id,
+            block_number=block_number,
+        )
+
+
+MESSAGE_CODECS: dict[str, type[MessageCodec]] = {
+    JSONMessageCodec.name: JSONMessageCodec,
+    MsgpackMessageCodec.name: MsgpackMessageCodec,
+}
+
+
+def get_message_codec(name: str) -> type[MessageCodec]:
+    try:
+        return MESSAGE_CODECS[name]
+    except KeyError:
+        raise ValueError(f'Unknown message codec: {name}')
@@ -0,0 +1,72 @@
+from core.common.metrics import DEFAULT_BUCKETS, Counter, Gauge, Histogram, StatsCollector, labels
+
+# Stages nest: `parse` holds `match`, which holds `fee`
+STAGE_SECONDS = Histogram(
+    'scraper_stage_seconds',
+    'Scraper time per stage: fetch, parse, match, fee, publish',
+    labelnames=('network', 'stage'),
+    buckets=DEFAULT_BUCKETS,
+)
+BLOCKS = Counter('scraper_blocks_total', 'Blocks scanned', labelnames=('network',))
+TRANSACTIONS = Counter('scraper_transactions_total', 'Transactions of the scanned blocks', labelnames=('network',))
+MATCHES = Counter('scraper_matches_total', 'Payments found', labelnames=('network',))
+TIP = Gauge('scraper_tip_block', 'Latest block of the network', labelnames=('network',))
+LAG = Gauge('scraper_lag_blocks', 'Blocks between the tip and the last scanned one', labelnames=('network',))
+IN_FLIGHT = Gauge('scraper_in_flight_messages', 'Published messages not handled by the consumers yet',
+                  labelnames=('network',))
+BACKPRESSURE = Gauge('scraper_backpressure_state', 'Block ingestion: 0 - open, 1 - slowed, 2 - paused',
+                     labelnames=('network',))
+BACKPRESSURE_SECONDS = Counter('scraper_backpressure_seconds_total', 'Time block ingestion waited for the consumers',
+                               labelnames=('network',))
+
+NODE_REQUEST_SECONDS = Histogram(
+    'node_request_seconds',
+    'Successful node requests by endpoint',
+    labelnames=('network', 'endpoint'),
+    buckets=DEFAULT_BUCKETS,
+)
+NODE_REQUEST_ERRORS = Counter('node_request_errors_total', 'Failed node requests', labelnames=('network', 'endpoint'))
+
+DAEMON_WORKERS = Gauge('daemon_workers_alive', 'Running scraper processes')
+DAEMON_RESTARTS = Counter('daemon_worker_restarts_total', 'Scraper processes restarted', labelnames=('network',))
+
+# `metrics()` of the scraper parts, read on scrape
+PREFILTER = StatsCollector('scraper_prefilter', 'Address prefilter', labelnames=('network',))
+CONFIRMATIONS = StatsCollector('scraper_confirmations', 'Confirmation queue', labelnames=('network',))
+HEADS = StatsCollector('scraper_heads', 'New heads watcher', labelnames=('network',))
+BLOCK_CACHE = StatsCollector('node_block_cache', 'On-disk block cache', labelnames=('network',))
+NODE_ENDPOINTS = StatsCollector('node_endpoint', 'Node endpoint pool', labelnames=('network', 'endpoint'))
+
+
+class ScraperMetrics:
+    """Children of one network, bound once"""
+    __slots__ = (
+        'fetch',
+        'parse',
+        'match',
+        'fee',
+        'publish',
+        'blocks',
+        'transactions',
+        'matches',
+        'tip',
+        'lag',
+        'in_flight',
+        'backpressure',
+        'backpressure_wait',
+    )
+
+    def __init__(self, network: str):
+        self.fetch = labels(STAGE_SECONDS, network=network, stage='fetch')
+        self.parse = labels(STAGE_SECONDS, network=network, stage='parse')
+        self.match = labels(STAGE_SECONDS, network=network, stage='match')
+        self.fee = labels(STAGE_SECONDS, network=network, stage='fee')
+        self.publish = labels(STAGE_SECONDS, network=network, stage='publish')
+        self.blocks = labels(BLOCKS, network=network)
+        self.transactions = labels(TRANSACTIONS, network=network)
+        self.matches = labels(MATCHES, network=network)
+        self.tip = labels(TIP, network=network)
+        self.lag = labels(LAG, network=network)
+        self.in_flight = labels(IN_FLIGHT, network=network)
+        self.backpressure = labels(BACKPRESSURE, network=network)
+        self.backpressure_wait = labels(BACKPRESSURE_SECONDS, network=network)
@@ -7,6 +7,7 @@ from sqlalchemy.orm import relationship
 
 import settings
 from core.common import models
+from core.common.mixins import DateTimeMixin
 
 
 class NetworkFamily(enum.Enum):
@@ -23,6 +24,12 @@ class ABIType(enum.Enum):
     TRON_ORDER_PROVIDER = 'tron_order_provider'
 
 
+class OrderStatus(enum.Enum):
+    created = 'created'
+    paid = 'paid'
+    expired = 'expired'
+
+
 class Network(models.Model):
     __tablename__ = 'blockchain__network'
 
@@ -42,9 +49,17 @@ class Network(models.Model):
     native_decimal_place = Column(fields.Integer, nullable=False, default=18)
 
     node_url = Column(fields.String(length=255), nullable=False)
+    # Fallback endpoints of the same network: ["https://...", ...]
+    reserve_node_urls = Column(fields.JSON, nullable=True, default=list)
+    # `newHeads` subscription, EVM only: "wss://..."
+    node_ws_url = Column(fields.String(length=255), nullable=True)
     is_active = Column(fields.Boolean, default=True, nullable=False)
     family = Column(fields.Enum(NetworkFamily), nullable=False)
 
+    @property
+    def node_urls(self) -> list[str]:
+        return [self.node_url, *(self.reserve_node_urls or [])]
+
     @property
     def central_address(self) -> CentralWallet:
         return self.CentralWallet(
@@ -83,3 +98,53 @@ class OrderProvider(models.Model):
 
     def __repr__(self):
         return f'OrderProvider: {self.network.name}'
+
+
+class Order(DateTimeMixin, models.Model):
+    __tablename__ = 'blockchain__order'
+
+    address = Column(fields.String(length=42), index=True, nullable=False)
+    amount = Column(fields.Numeric(50, 18), nullable=True)
+    status = Column(fields.Enum(OrderStatus), default=OrderStatus.created, index=True, nullable=False)
+
+    network_id = Column(fields.Integer, fields.ForeignKey('blockchain__network.id', ondelete='CASCADE'))
+    network = relationship(Network, backref='orders', lazy='selectin')
+    currency_id = Column(
+        fields.Integer,
+        fields.ForeignKey('blockchain__stable_coin.id', ondelete='SET NULL'),
+        nullable=True,
+    )
+
+    def __repr__(self):
+        return f'Order: {self.id} ({self.status.value})'
+
+
+class Payment(models.Model):
+    """A transaction paying an order, saved once however many times its message is delivered"""
+    __tablename__ = 'blockchain__payment'
+    __table_args__ = (
+        fields.UniqueConstraint('network_id', 'transaction_id', name='blockchain__payment_transaction_uc'),
+    )
+
+    transaction_id = Column(fields.String(length=255), nullable=False)
+    amount = Column(fields.Numeric(50, 18), nullable=False)
+    fee = Column(fields.Numeric(50, 18), nullable=False)
+    commission_detail = Column(fields.JSON, nullable=True, default=None)
+    block_number = Column(fields.BigInteger, nullable=True)
+    timestamp = Column(fields.BigInteger, nullable=False)              # milliseconds, of the block
+
+    network_id = Column(fields.Integer, fields.ForeignKey('blockchain__network.id', ondelete='CASCADE'))
+    order_id = Column(
+        fields.Integer,
+        fields.ForeignKey('blockchain__order.id', ondelete='CASCADE'),
+        index=True,
+        nullable=False,
+    )
+    currency_id = Column(
+        fields.Integer,
+        fields.ForeignKey('blockchain__stable_coin.id', ondelete='SET NULL'),
+        nullable=True,
+    )
+
+    def __repr__(self):
+        return f'Payment: {self.transaction_id} (order {self.order_id})'
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Optional
+
+from config import celery_app
+from core.blockchain.messages import Message, MessageCodec
+from core.blockchain.backpressure import Backpressure
+from core.common.metrics import NULL_CHILD
+
+
+class MessagePublisher:
+    """
+    Buffers scraper messages and sends them as one task per batch: one publisher confirm per batch,
+    not per message. Flushed when `batch_size` messages are buffered, every `max_latency` seconds
+    by `run`, and by the scraper before every checkpoint.
+    """
+    __slots__ = (
+        'task_path',
+        'codec',
+        'batch_size',
+        'max_latency',
+        'batches',
+        'published',
+        'send_time',
+        'backpressure',
+        '_buffer',
+        '_lock',
+    )
+
+    def __init__(self, task_path: str, codec: type[MessageCodec], batch_size: int = 500, max_latency: float = 0.5,
+                 send_time=NULL_CHILD, backpressure: Optional[Backpressure] = None):
+        self.task_path = task_path
+        self.codec = codec
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.batches = 0
+        self.published = 0
+        self.send_time = send_time                          # histogram of `send`
+        self.backpressure = backpressure                    # counts the sent messages till they are handled
+
+        self._buffer: list[Message] = []
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._buffer) >= self.batch_size
+
+    def add(self, messages: list[Message]):
+        self._buffer.extend(messages)
+
+    def send(self, messages: list[Message]):
+        # Blocks till the broker confirms
+        celery_app.send_task(
+            self.task_path,
+            kwargs=dict(
+                messages=[self.codec.encode(message) for message in messages],
+                codec=self.codec.name,
+            ),
+            serializer=self.codec.serializer,
+        )
+
+    async def flush(self):
+        """Unsent messages stay buffered on failure, the next flush sends them first"""
+        async with self._lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                # Counted before the send: a fast consumer may handle the batch before the call returns
+                if self.backpressure is not None:
+                    await self.backpressure.acquire(len(batch))
+                try:
+                    with self.send_time.time():
+                        await asyncio.to_thread(self.send, batch)
+                except Exception:
+                    if self.backpressure is not None:
+                        await self.backpressure.release(len(batch))
+                    raise
+                # Added meanwhile are appended, the sent batch is still the head
+                del self._buffer[:len(batch)]
+                self.batches += 1
+                self.published += len(batch)
+
+    async def run(self, logger: logging.Logger):
+        while True:
+            await asyncio.sleep(self.max_latency)
+            if not self._buffer or self._lock.locked():
+                continue
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning(f'Messages flush failed, {len(self._buffer)} buffered: {error!r}')
@@ -1,49 +1,87 @@
 import abc
+import os
+import json
+import time
+import socket
 import asyncio
-import decimal
 import enum
-import json
-from typing import Optional, Self
-from dataclasses import dataclass, asdict
+import itertools
+from typing import Iterable, Optional
+
+from kombu.exceptions import OperationalError
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 
-from config import celery_app
+import settings
+from core.common.amounts import get_scale
 from core.blockchain.gates import get_node
-from core.blockchain.storages import BlockNumberStorage
+from core.blockchain.gates.base import split_range
+from core.blockchain.storages import Checkpoint, CheckpointStorage, Range, get_ranges
+from core.blockchain.messages import Message, Participant, get_message_codec  # noqa: F401
+from core.blockchain.publishers import MessagePublisher
+from core.blockchain.backpressure import Backpressure
+from core.blockchain.confirmations import ConfirmationQueue
+from core.blockchain.heads import HeadWatcher
+from core.blockchain.metrics import CONFIRMATIONS, HEADS, PREFILTER, ScraperMetrics
+from core.blockchain.indexes import WatchedAddressIndex, AddressPrefilter
+from core.blockchain.events import (
+    DependencyAction,
+    DependencyKind,
+    get_events_storage,
+    get_dependencies_applied_key,
+    get_dependencies_channel,
+    get_dependencies_version_key,
+    parse_dependency_change,
+)
 from core.blockchain.dao import StableCoinDAO, OrderProviderDAO
 from core.blockchain.models import Network, StableCoin, OrderProvider
 
 
-class TransactionType(enum.StrEnum):
+class TransactionType(enum.IntEnum):
     INPUT_NATIVE_TRANSACTION = 0                # Transfer
     INPUT_STABLE_COIN_TRANSACTION = 1           # Transfer
     INPUT_PROVIDER_TRANSACTION = 2
 
 
-@dataclass()
-class Participant:
-    address: str
-    amount: decimal.Decimal
-
-
-@dataclass()
-class Message:
-    timestamp: int
-    order_id: int
-    network_id: Network.id
-    transaction_id: str
-    fee: decimal.Decimal
-    commission_detail: dict
-    amount: decimal.Decimal
-    inputs: list[Participant]
-    outputs: list[Participant]
-    currency_id: Optional[StableCoin.id] = None
-
-    @classmethod
-    def from_json(cls, raw_message: dict) -> Self:
-        return cls(**raw_message)
-
-    def to_json(self) -> str:
-        return json.dumps(asdict(self), default=str)
+class BlockWatermark:
+    """Contiguous "safe" block: every block up to it is done, blocks above may finish out of order"""
+    __slots__ = (
+        'safe_block',
+        '_completed',
+    )
+
+    def __init__(self, safe_block: int, ranges: Iterable[Range] = ()):
+        self.safe_block = safe_block
+        self._completed: set[int] = set()
+        for start_block, end_block in ranges:
+            for block_number in range(start_block, end_block + 1):
+                self.complete(block_number)
+
+    def complete(self, block_number: int) -> bool:
+        """Mark block as done. Returns True if the safe block moved forward"""
+        if block_number <= self.safe_block:
+            return False
+
+        self._completed.add(block_number)
+        advanced = False
+        while self.safe_block + 1 in self._completed:
+            self.safe_block += 1
+            self._completed.discard(self.safe_block)
+            advanced = True
+        return advanced
+
+    def get_checkpoint(self) -> Checkpoint:
+        return Checkpoint(safe_block=self.safe_block, ranges=get_ranges(self._completed))
+
+    def get_gaps(self, start_block: int, end_block: int) -> list[Range]:
+        """Ranges of the blocks between the two that are not done yet"""
+        gaps, gap_start = [], max(start_block, self.safe_block + 1)
+        for block_number in sorted(number for number in self._completed if gap_start <= number <= end_block):
+            if block_number > gap_start:
+                gaps.append((gap_start, block_number - 1))
+            gap_start = block_number + 1
+        if gap_start <= end_block:
+            gaps.append((gap_start, end_block))
+        return gaps
 
 
 class AbstractTransactionScraper(metaclass=abc.ABCMeta):
@@ -51,19 +89,93 @@ class AbstractTransactionScraper(metaclass=abc.ABCMeta):
     use_order_providers: bool = True
 
     block_pack_size: int = 1
-    dependency_update_interval_by_blocks: int = 100         # every 10 blocks
-    sleep_after_new_block = 1                               # 1 sec
+    use_head_subscription: bool = False                     # `newHeads` over websocket instead of polling
+    dependency_update_interval_by_blocks: int = 100         # blocks between checks for missed changes
+
+    retry_attempts: int = 10
+    retry_delay: float = 0.5                                # doubled after every attempt
+    retry_max_delay: float = 30
+
+    block_window_size: int = 256                            # blocks in flight
+    fetch_concurrency: int = 16                             # parallel node requests
+    parse_concurrency: int = 4                              # blocks parsed at once
+
+    use_prefilter: bool = False
+    prefilter_rebuild_interval: int = 30                    # 30 sec
+
+    publish_batch_size: int = 500                           # messages per one task
+    publish_max_latency: float = 0.5                        # 0.5 sec in the buffer at most
 
-    task_path = 'core.blockchain.tasks.parsing_daemons_messages_task'
+    use_backpressure: bool = True                           # wait for the consumers of the messages to catch up
+    in_flight_high_watermark: int = 50_000                  # messages in flight: block ingestion paused
+    in_flight_low_watermark: int = 10_000                   # messages in flight: slowed down above, resumed below
+    backpressure_max_delay: float = 1                       # 1 sec per chunk of blocks right below the high one
+
+    confirmation_depth: int = 0                             # blocks on top before sending, 0 - right away
+    block_hash_ring_size: int = 1024                        # recent block hashes kept to detect reorgs
+
+    task_path = 'core.blockchain.tasks.parsing_daemons_messages_batch_task'
 
     def __init__(self, network: Network):
         self.node = get_node(network=network)
-        self.storage = BlockNumberStorage(storage_name=str(self))
+        self.native_scale = get_scale(network.native_decimal_place)
+        self.metrics = ScraperMetrics(network=network.short_name)
+        # Blocks still within reach of a reorg never go to the block cache
+        self.node.cache_depth = max(self.node.cache_depth, self.confirmation_depth)
+        # The former per-scraper key is read once when the network has no checkpoint yet
+        self.storage = CheckpointStorage(network_id=network.id, legacy_key=str(self))
+        self.backpressure: Optional[Backpressure] = None
+        if self.use_backpressure:
+            self.backpressure = Backpressure(
+                network_id=network.id,
+                high_watermark=self.in_flight_high_watermark,
+                low_watermark=self.in_flight_low_watermark,
+                max_delay=self.backpressure_max_delay,
+                in_flight_metric=self.metrics.in_flight,
+                state_metric=self.metrics.backpressure,
+                wait_metric=self.metrics.backpressure_wait,
+            )
+        self.publisher = MessagePublisher(
+            task_path=self.task_path,
+            codec=get_message_codec(settings.MESSAGE_CODEC),
+            batch_size=self.publish_batch_size,
+            max_latency=self.publish_max_latency,
+            send_time=self.metrics.publish,
+            backpressure=self.backpressure,
+        )
         self.central_wallet = network.central_address
-
-        self.stable_coins: dict[str: list[int, int]] = {}
-        self.points_to_stable_coin_address: dict[int: str] = {}
-        self.order_providers: list[str] = []
+        self.heads = HeadWatcher(node=self.node, ws_url=network.node_ws_url if self.use_head_subscription else None)
+        HEADS.add(self.heads.metrics, network=network.short_name)
+
+        # Addresses are keys everywhere: 20 raw bytes, see `core.blockchain.addresses`
+        self.stable_coins: dict[bytes, tuple[int, int]] = {}
+        self.points_to_stable_coin_address: dict[int, bytes] = {}
+        self.order_providers: frozenset[bytes] = frozenset()
+        self.order_provider_addresses: dict[int, bytes] = {}
+        self.dependencies_version = 0
+        self.dependencies_storage = get_events_storage()
+        self._dependencies_lock = asyncio.Lock()
+        self._dependencies_checked_at: Optional[int] = None
+        self.watched_addresses = WatchedAddressIndex(network_id=network.id, normalize=self.node.address_key)
+        self._background_tasks: set[asyncio.Task] = set()
+
+        self.prefilter: Optional[AddressPrefilter] = None
+        if self.use_prefilter:
+            self.prefilter = AddressPrefilter(key_function=self.get_prefilter_keys)
+            self.watched_addresses.listeners.append(self.prefilter.on_order_event)
+            PREFILTER.add(self.prefilter.metrics, network=network.short_name)
+
+        self.confirmations: Optional[ConfirmationQueue] = None
+        if self.confirmation_depth:
+            self.confirmations = ConfirmationQueue(depth=self.confirmation_depth, ring_size=self.block_hash_ring_size)
+            CONFIRMATIONS.add(self.confirmations.metrics, network=network.short_name)
+
+        self.watermark: Optional[BlockWatermark] = None
+        self._persisted: Optional[Checkpoint] = None
+        self._checkpoint_pending = False
+        self._checkpoint_lock = asyncio.Lock()
+        self._fetch_semaphore = asyncio.Semaphore(self.fetch_concurrency)
+        self._parse_semaphore = asyncio.Semaphore(self.parse_concurrency)
 
         self.logger = self._get_logger()
 
@@ -76,17 +188,21 @@ class AbstractTransactionScraper(metaclass=abc.ABCMeta):
 
     __repr__ = __str__
 
+    def set_order_providers(self, order_provider_addresses: dict[int, bytes]):
+        self.order_provider_addresses = order_provider_addresses
+        self.order_providers = frozenset(order_provider_addresses.values())
+
     async def update_stable_coins(self):
         if self.use_stable_coins:
             stable_coins: list[StableCoin] = await StableCoinDAO.filter(filters=[
                 StableCoin.network_id == self.node.network.id,
-                ])
+            ])
             self.stable_coins = {
-                stable_coin.address: stable_coin.decimal_place
+                self.node.address_key(stable_coin.address): (stable_coin.id, stable_coin.decimal_place)
                 for stable_coin in stable_coins
             }
             self.points_to_stable_coin_address = {
-                stable_coin.id: stable_coin.address
+                stable_coin.id: self.node.address_key(stable_coin.address)
                 for stable_coin in stable_coins
             }
 
@@ -95,69 +211,412 @@ class AbstractTransactionScraper(metaclass=abc.ABCMeta):
             order_providers: list[OrderProvider] = await OrderProviderDAO.filter(filters=[
                 OrderProvider.network_id == self.node.network.id
             ])
-            self.order_providers = [
-                order_provider.address
+            self.set_order_providers({
+                order_provider.id: self.node.address_key(order_provider.address)
                 for order_provider in order_providers
-            ]
+            })
 
     async def setup_dependencies(self):
         await self.update_stable_coins()
         await self.update_order_providers()
 
-    update_dependencies = setup_dependencies
+    async def update_dependencies(self):
+        await self.setup_dependencies()
+        if self.prefilter is not None:
+            await self.rebuild_prefilter()
+
+    async def apply_stable_coin_change(self, stable_coin_id: int, action: DependencyAction):
+        stable_coin: Optional[StableCoin] = None
+        if action == DependencyAction.SAVED:
+            stable_coin = await StableCoinDAO.get_or_none(filters=[StableCoin.id == stable_coin_id])
+        # New dicts swapped in: the scan in progress keeps reading a consistent version
+        stable_coins = {
+            address: value for address, value in self.stable_coins.items() if value[0] != stable_coin_id
+        }
+        points_to_stable_coin_address = {
+            coin_id: address for coin_id, address in self.points_to_stable_coin_address.items()
+            if coin_id != stable_coin_id
+        }
+        if stable_coin is not None and stable_coin.network_id == self.node.network.id:
+            address = self.node.address_key(stable_coin.address)
+            stable_coins[address] = (stable_coin.id, stable_coin.decimal_place)
+            points_to_stable_coin_address[stable_coin.id] = address
+            if self.prefilter is not None:
+                self.prefilter.add(address)
+        self.stable_coins, self.points_to_stable_coin_address = stable_coins, points_to_stable_coin_address
+
+    async def apply_order_provider_change(self, order_provider_id: int, action: DependencyAction):
+        order_provider: Optional[OrderProvider] = None
+        if action == DependencyAction.SAVED:
+            order_provider = await OrderProviderDAO.get_or_none(filters=[OrderProvider.id == order_provider_id])
+        addresses = dict(self.order_provider_addresses)
+        addresses.pop(order_provider_id, None)
+        if order_provider is not None and order_provider.network_id == self.node.network.id:
+            addresses[order_provider_id] = self.node.address_key(order_provider.address)
+            if self.prefilter is not None:
+                self.prefilter.add(addresses[order_provider_id])
+        self.set_order_providers(addresses)
+
+    async def apply_dependency_change(self, version: int, change: dict):
+        """In place when it is the next version, a full reload after a gap: a notification was lost"""
+        if version > self.dependencies_version + 1:
+            return await self.reload_dependencies(version)
+        async with self._dependencies_lock:
+            if version <= self.dependencies_version:
+                return
+            action = DependencyAction(change['action'])
+            match DependencyKind(change['kind']):
+                case DependencyKind.STABLE_COIN if self.use_stable_coins:
+                    await self.apply_stable_coin_change(change['id'], action)
+                case DependencyKind.ORDER_PROVIDER if self.use_order_providers:
+                    await self.apply_order_provider_change(change['id'], action)
+            if self.prefilter is not None and action == DependencyAction.DELETED:
+                self.prefilter.mark_stale()
+            self.dependencies_version = version
+        await self.report_dependencies_version()
+
+    async def reload_dependencies(self, version: int):
+        async with self._dependencies_lock:
+            if version <= self.dependencies_version:
+                return
+            self.logger.warning(f'Dependencies {self.dependencies_version} -> {version}, reload')
+            await self.update_dependencies()
+            self.dependencies_version = version
+        await self.report_dependencies_version()
+
+    async def get_dependencies_version(self) -> int:
+        version = await self.dependencies_storage.async_get(get_dependencies_version_key(self.node.network.id))
+        return int(version or 0)
+
+    async def check_dependencies_version(self):
+        """Catches up with changes published while the scraper was not subscribed"""
+        if (version := await self.get_dependencies_version()) > self.dependencies_version:
+            await self.reload_dependencies(version)
+        else:
+            await self.report_dependencies_version()
+
+    async def report_dependencies_version(self):
+        await self.dependencies_storage.async_hset(
+            get_dependencies_applied_key(self.node.network.id),
+            f'{self}@{socket.gethostname()}:{os.getpid()}',
+            json.dumps({'version': self.dependencies_version, 'updated_at': int(time.time())}),
+        )
+
+    async def follow_dependencies(self):
+        channel = get_dependencies_channel(self.node.network.id)
+        while True:
+            pubsub = self.dependencies_storage.async_pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                await self.check_dependencies_version()
+                async for message in pubsub.listen():
+                    await self.apply_dependency_change(*parse_dependency_change(message['data']))
+            except (RedisConnectionError, RedisTimeoutError) as error:
+                self.logger.warning(f'Dependencies channel failed, resubscribe: {error!r}')
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                await pubsub.close()
+
+    async def maybe_check_dependencies(self, block_number: int):
+        """Every `dependency_update_interval_by_blocks` blocks: the safety net for lost notifications"""
+        if self._dependencies_checked_at is None:
+            self._dependencies_checked_at = block_number
+        elif block_number - self._dependencies_checked_at >= self.dependency_update_interval_by_blocks:
+            self._dependencies_checked_at = block_number
+            await self._retry(self.check_dependencies_version)
+
+    def run_in_background(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        task.add_done_callback(self._background_tasks.discard)
+        self._background_tasks.add(task)
+        return task
+
+    async def setup_watched_addresses(self):
+        await self.watched_addresses.load()
+        self.run_in_background(self.watched_addresses.follow())
 
-    def send_to_task(self, message: Message):
-        if message:
-            celery_app.send_task(
-                self.task_path,
-                kwargs=dict(
-                    message=message.to_json(),
-                )
-            )
+    @classmethod
+    def get_prefilter_keys(cls, address: bytes) -> tuple[bytes, ...]:
+        """Every form of the address the scraper checks against the prefilter"""
+        return address,
+
+    def get_prefilter_addresses(self) -> Iterable[bytes]:
+        return itertools.chain(self.watched_addresses, self.order_providers, self.stable_coins)
+
+    def is_candidate(self, transaction: dict) -> bool:
+        """Cheap synchronous check, transactions failing it are not scraped at all"""
+        return True
+
+    def prefilter_miss(self):
+        if self.prefilter is not None:
+            self.prefilter.miss()
+
+    async def rebuild_prefilter(self):
+        await self.prefilter.rebuild(self.get_prefilter_addresses())
+        self.logger.info(f'Prefilter rebuilt: {self.prefilter.metrics()}')
+
+    async def maintain_prefilter(self):
+        while True:
+            await asyncio.sleep(self.prefilter_rebuild_interval)
+            if self.prefilter.is_stale:
+                await self.rebuild_prefilter()
+
+    async def setup(self):
+        # The version before the load: a change racing with it is applied again by `follow_dependencies`
+        self.dependencies_version = await self.get_dependencies_version()
+        await self.setup_dependencies()
+        self.run_in_background(self.follow_dependencies())
+        await self.setup_watched_addresses()
+        self.run_in_background(self.publisher.run(logger=self.logger))
+        if self.prefilter is not None:
+            await self.rebuild_prefilter()
+            self.run_in_background(self.maintain_prefilter())
 
     async def get_search_data(self) -> dict:
-        # TODO
         return {
-            # address: order_id
-            'direct_payments': {},
-            # provider_address: order_id
-            'provider_payments': {},
+            # address key: order_id
+            'direct_payments': self.watched_addresses,
+            # provider address key
+            'provider_payments': self.order_providers,
         }
 
+    async def parse_block(self, block_number: int, block: dict) -> list[Message]:
+        """Messages of the block, nothing is sent: a failed block is parsed again from scratch"""
+        search_data = await self.get_search_data()
+        transactions = block.get('transactions', [])
+        self.metrics.blocks.inc()
+        self.metrics.transactions.inc(len(transactions))
+        with self.metrics.match.time():
+            if self.prefilter is not None:
+                transactions = [transaction for transaction in transactions if self.is_candidate(transaction)]
+            messages = await asyncio.gather(*[
+                self.scrape_transaction(
+                    transaction=transaction,
+                    search_data=search_data,
+                    block_number=block_number,
+                )
+                for transaction in transactions
+            ])
+        messages = [message for message in messages if message]
+        for message in messages:
+            message.block_number = block_number
+        self.metrics.matches.inc(len(messages))
+        return messages
+
+    async def publish(self, messages: list[Message]):
+        """Buffered messages leave the list, so a retry only flushes the buffer again"""
+        self.publisher.add(messages)
+        messages.clear()
+        if self.publisher.is_full:
+            await self.publisher.flush()
+
     async def scrape_block(self, block_number: int):
         block = await self.node.get_block_detail(block_number=block_number)
-        search_data = await self.get_search_data()
+        await self.publish(await self.parse_block(block_number=block_number, block=block))
+
+    async def checkpoint(self):
+        """Group commit: blocks completed while a write is in progress are saved together by the next one"""
+        self._checkpoint_pending = True
+        if self._checkpoint_lock.locked():
+            return
+        async with self._checkpoint_lock:
+            while self._checkpoint_pending:
+                self._checkpoint_pending = False
+                await self.save_checkpoint()
+
+    async def save_checkpoint(self):
+        checkpoint = self.watermark.get_checkpoint()
+        if self.confirmations is not None and (lowest_pending := self.confirmations.lowest_pending) is not None:
+            # Pending messages live in memory only: after a restart their blocks are scanned again
+            checkpoint = checkpoint.clip(lowest_pending - 1)
+        persisted = self._persisted
+        if persisted is None or checkpoint != persisted and checkpoint.safe_block >= persisted.safe_block:
+            # Messages of every done block are sent before it is persisted
+            await self._retry(self.publisher.flush)
+            await self._retry(self.storage.save, checkpoint)
+            self._persisted = checkpoint
+
+    @property
+    def transient_errors(self) -> tuple[type[Exception], ...]:
+        return self.node.transient_errors + (OperationalError, RedisConnectionError, RedisTimeoutError)
+
+    async def _retry(self, function, *args):
+        """Retry transient node, broker and storage failures with backoff, anything else is a bug and raises"""
+        delay = self.retry_delay
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                return await function(*args)
+            except self.transient_errors as error:
+                if attempt == self.retry_attempts:
+                    raise
+                self.logger.warning(f'{function.__name__} failed ({attempt}/{self.retry_attempts}), retry: {error!r}')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max_delay)
+
+    async def fetch_blocks(self, start_block: int, end_block: int) -> list[dict]:
+        async with self._fetch_semaphore:
+            with self.metrics.fetch.time():
+                if start_block == end_block:
+                    return [await self.node.get_block_detail(block_number=start_block)]
+                return await self.node.get_blocks_detail(start_block=start_block, end_block=end_block)
+
+    async def _parse_block(self, block_number: int, block: dict) -> list[Message]:
+        async with self._parse_semaphore:
+            with self.metrics.parse.time():
+                return await self.parse_block(block_number=block_number, block=block)
+
+    async def complete_blocks(self, start_block: int, end_block: int):
+        for block_number in range(start_block, end_block + 1):
+            self.watermark.complete(block_number)
+        # Also when the safe block stays: blocks done above a gap are not scanned again after a restart
+        await self.checkpoint()
+
+    async def rescan_block(self, block_number: int) -> tuple[dict, list[Message]]:
+        """Current version of the block on the node and its messages"""
+        block, = await self._retry(self.fetch_blocks, block_number, block_number)
+        return block, await self._retry(self._parse_block, block_number, block)
+
+    async def confirm_block(self, block_number: int, block: dict, messages: list[Message],
+                            reorg_depth: int = 0) -> list[Message]:
+        """
+        Messages to send now: without `confirmation_depth` the block's own ones, else the ones
+        deep enough. Neighbours on another chain are scanned again, replacing the orphaned version.
+        """
+        if self.confirmations is None:
+            return messages
+
+        block_hash, parent_hash = self.get_block_hashes(block)
+        confirmed, conflicts = self.confirmations.add_block(block_number, block_hash, parent_hash, messages)
+        if conflicts and reorg_depth >= self.confirmation_depth:
+            self.logger.error(f'Reorg deeper than {self.confirmation_depth} blocks at {conflicts}, not followed')
+            self.confirmations.resolve(conflicts)
+        elif conflicts:
+            self.logger.warning(f'Reorg at block {block_number}, scanning again: {conflicts}')
+            for conflict in conflicts:
+                conflict_block, conflict_messages = await self.rescan_block(conflict)
+                confirmed.extend(await self.confirm_block(
+                    conflict,
+                    conflict_block,
+                    conflict_messages,
+                    reorg_depth=reorg_depth + 1,
+                ))
+        return confirmed
+
+    async def process_block(self, block_number: int, block: dict, checkpoint: bool = True):
+        messages = await self._retry(self._parse_block, block_number, block)
+        messages = await self.confirm_block(block_number, block, messages)
+        if messages:
+            await self._retry(self.publish, messages)
+        if checkpoint:
+            await self.complete_blocks(start_block=block_number, end_block=block_number)
+
+    async def process_blocks(self, start_block: int, end_block: int, checkpoint: bool = True):
+        blocks = await self._retry(self.fetch_blocks, start_block, end_block)
         await asyncio.gather(*[
-            self.scrape_transaction(
-                transaction=transaction,
-                search_data=search_data,
-            )
-            for transaction in block.get('transactions', [])
+            self.process_block(block_number=block_number, block=block, checkpoint=checkpoint)
+            for block_number, block in zip(range(start_block, end_block + 1), blocks)
         ])
 
-    async def handler(self):
-        await self.setup_dependencies()
-        start_block = await self.node.get_latest_block_number()
+    async def scrape_blocks(self, start_block: int, end_block: int, checkpoint: bool = True):
+        """
+        Pipelined scan: at most `block_window_size` blocks in flight, fetched in chunks of
+        `node.blocks_batch_size` when catching up.
+        With `checkpoint` the safe block is persisted only when every block below it is done.
+        Every chunk waits for the consumers first while they lag, see `Backpressure`.
+        """
+        chunk_size = self.node.blocks_batch_size
+        window = asyncio.Semaphore(max(self.block_window_size // chunk_size, 1))
+        tasks, failed = set(), []
+
+        def on_done(task: asyncio.Task):
+            window.release()
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                failed.append(task)
+
+        # Blocks done before a restart are skipped
+        gaps = self.watermark.get_gaps(start_block, end_block) if checkpoint else [(start_block, end_block)]
+        chunks = [chunk for gap_start, gap_end in gaps for chunk in split_range(gap_start, gap_end, chunk_size)]
+        try:
+            for chunk_start, chunk_end in chunks:
+                if self.backpressure is not None:
+                    await self.backpressure.wait()
+                await window.acquire()
+                if failed:
+                    window.release()
+                    break
+                task = asyncio.create_task(self.process_blocks(
+                    start_block=chunk_start,
+                    end_block=chunk_end,
+                    checkpoint=checkpoint,
+                ))
+                task.add_done_callback(on_done)
+                tasks.add(task)
+
+            while tasks and not failed:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            # A failed chunk leaves a gap: the other chunks stop, the caller must not move past it
+            pending = list(tasks)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if failed:
+            raise failed[0].exception()
 
+    async def handler(self):
+        await self.setup()
+
+        checkpoint = await self._retry(self.storage.load)
+        if checkpoint is None:
+            checkpoint = Checkpoint(safe_block=await self.node.get_latest_block_number() - 1)
+        self.watermark = BlockWatermark(safe_block=checkpoint.safe_block, ranges=checkpoint.ranges)
+        self._persisted = checkpoint
+        if self.confirmations is not None:
+            self.confirmations.start(checkpoint.safe_block + 1, done=checkpoint.ranges)
+        if checkpoint.ranges:
+            self.logger.info(f'Resumed at block {checkpoint.safe_block}, done above it: {checkpoint.ranges}')
+
+        if self.heads.ws_url:
+            self.run_in_background(self.heads.subscribe())
         while True:
-            end_block = await self.storage.get() or await self.node.get_latest_block_number()
-            if end_block - start_block >= self.block_pack_size:
-                await asyncio.gather(*[
-                    self.scrape_block(block_number=block_number)
-                    for block_number in range(start_block, end_block + 1)
-                ])
-            else:
-                await asyncio.sleep(self.sleep_after_new_block)
+            latest_block = await self.heads.wait(above=self.watermark.safe_block + self.block_pack_size - 1)
+            self.metrics.tip.set(latest_block)
+            self.metrics.lag.set(latest_block - self.watermark.safe_block)
+            await self.scrape_blocks(start_block=self.watermark.safe_block + 1, end_block=latest_block)
+            self.metrics.lag.set(self.heads.latest_block - self.watermark.safe_block)
+            await self.maybe_check_dependencies(latest_block)
 
     async def start_with_params(self, start_block: Optional[int] = None, end_block: Optional[int] = None):
         if not start_block and not end_block:
             raise ValueError('')
 
-        start_block = start_block or await self.node.get_latest_block_number()
-        end_block = end_block or await self.node.get_latest_block_number()
+        await self.setup()
+        # Also tells the node which blocks are deep enough for its block cache
+        latest_block = await self.node.get_latest_block_number()
+        start_block = start_block or latest_block
+        end_block = end_block or latest_block
+
+        await self.scan_range(start_block=start_block, end_block=end_block)
 
-        for block in range(start_block, end_block + 1):
-            await self.scrape_block(block_number=block)
+    async def scan_range(self, start_block: int, end_block: int):
+        """Blocks of a closed range: every message of it is sent when this returns"""
+        if self.confirmations is not None:
+            self.confirmations.start(start_block)
+        await self.scrape_blocks(start_block=start_block, end_block=end_block, checkpoint=False)
+        if self.confirmations is not None and self.node.latest_block_number is not None:
+            # No block above the range comes to confirm its last blocks, the head does
+            await self.publish(self.confirmations.release(self.node.latest_block_number - self.confirmation_depth))
+        await self._retry(self.publisher.flush)
+
+    @abc.abstractmethod
+    def get_block_hashes(self, block: dict) -> tuple[str, str]:
+        """(block hash, parent block hash)"""
 
     @abc.abstractmethod
-    async def scrape_transaction(self, transaction: dict, search_data: dict): ...
+    async def scrape_transaction(
+            self,
+            transaction: dict,
+            search_data: dict,
+            block_number: int,
+    ) -> Optional[Message]: ...
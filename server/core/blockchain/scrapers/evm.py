@@ -1,6 +1,140 @@
+from typing import Optional
+
+from core.common.amounts import get_scale
+from core.blockchain.addresses import to_key
+from core.blockchain.gates.base import NodeError
+from core.blockchain.scrapers.base import Message, Participant
 from core.blockchain.scrapers.base import AbstractTransactionScraper
 
 
 class TransactionScraper(AbstractTransactionScraper):
-    async def scrape_transaction(self, transaction: dict, search_data: dict):
+    # Scan stable coin `Transfer` logs of the whole range instead of full blocks.
+    # Only token transfers are seen this way, native coin transfers need full blocks.
+    use_logs: bool = True
+    log_recipients_limit: int = 100                         # recipients in the node filter, else filter locally
+    confirmation_depth: int = 12
+    use_head_subscription: bool = True                      # when the network has `node_ws_url`
+
+    def get_block_hashes(self, block: dict) -> tuple[str, str]:
+        return block['hash'].hex(), block['parentHash'].hex()
+
+    async def get_blocks_header(self, block_numbers: list[int]) -> dict[int, dict]:
+        async with self._fetch_semaphore:
+            headers = await self.node.get_blocks_header(block_numbers=block_numbers)
+        # Lagging load-balanced nodes: retried as a whole range
+        if missing := [number for number in block_numbers if number not in headers]:
+            raise NodeError(f'Block headers not found: {missing}')
+        return headers
+
+    async def scrape_transaction(self, transaction: dict, search_data: dict, block_number: int) -> Optional[Message]:
         pass
+
+    async def get_transactions_commission(self, transaction_hashes: list[str]) -> dict[str, tuple]:
+        receipts = await self.node.get_transactions_receipt(transaction_hashes=transaction_hashes)
+        result = {}
+        for transaction_hash, receipt in receipts.items():
+            gas_price = receipt.get('effectiveGasPrice', 0)
+            fee = self.native_scale(receipt['gasUsed'] * gas_price)
+            result[transaction_hash] = (fee, {
+                'gas_used': receipt['gasUsed'],
+                'gas_price': gas_price,
+            })
+        return result
+
+    async def get_logs_messages(self, start_block: int, end_block: int,
+                                headers: Optional[dict[int, dict]] = None) -> list[Message]:
+        if not self.stable_coins:
+            return []
+
+        search_data = await self.get_search_data()
+        direct_payments = search_data['direct_payments']
+        recipients = list(direct_payments) if len(direct_payments) <= self.log_recipients_limit else None
+        if recipients == []:
+            return []
+
+        async with self._fetch_semaphore:
+            with self.metrics.fetch.time():
+                logs = await self.node.get_transfer_logs(
+                    start_block=start_block,
+                    end_block=end_block,
+                    contracts=list(self.stable_coins),
+                    recipients=recipients,
+                )
+
+        matched = []
+        with self.metrics.match.time():
+            for log in logs:
+                # ERC721 `Transfer` has the same topic with an indexed token id
+                if len(log['topics']) != 3 or log.get('removed'):
+                    continue
+                to_address = bytes(log['topics'][2][-20:])
+                if order_id := direct_payments.get(to_address):
+                    matched.append((log, order_id, to_address))
+
+        if not matched:
+            return []
+
+        if headers is None:
+            headers = await self.get_blocks_header(block_numbers=sorted({log['blockNumber'] for log, *_ in matched}))
+        transaction_hashes = list({log['transactionHash'].hex() for log, *_ in matched})
+        async with self._fetch_semaphore:
+            with self.metrics.fee.time():
+                commissions = await self.get_transactions_commission(transaction_hashes=transaction_hashes)
+        if missing := [tx_hash for tx_hash in transaction_hashes if tx_hash not in commissions]:
+            raise NodeError(f'Transaction receipts not found: {missing}')
+
+        messages = []
+        for log, order_id, to_address in matched:
+            currency_id, decimal_place = self.stable_coins[to_key(log['address'])]
+            amount = get_scale(decimal_place)(int.from_bytes(log['data'][:32], 'big'))
+            transaction_hash = log['transactionHash'].hex()
+            fee, commission_detail = commissions[transaction_hash]
+            messages.append(Message(
+                timestamp=headers[log['blockNumber']]['timestamp'],
+                order_id=order_id,
+                network_id=self.node.network.id,
+                transaction_id=transaction_hash,
+                fee=fee,
+                commission_detail=commission_detail,
+                amount=amount,
+                inputs=[Participant(
+                    address=self.node.format_key(bytes(log['topics'][1][-20:])),
+                    amount=amount,
+                )],
+                outputs=[Participant(
+                    address=self.node.format_key(to_address),
+                    amount=amount,
+                )],
+                currency_id=currency_id,
+                block_number=log['blockNumber'],
+            ))
+        self.metrics.matches.inc(len(messages))
+        return messages
+
+    async def rescan_block(self, block_number: int) -> tuple[dict, list[Message]]:
+        if not self.use_logs:
+            return await super().rescan_block(block_number=block_number)
+        headers = await self._retry(self.get_blocks_header, [block_number])
+        return headers[block_number], await self._retry(self.get_logs_messages, block_number, block_number, headers)
+
+    async def process_blocks(self, start_block: int, end_block: int, checkpoint: bool = True):
+        if not self.use_logs:
+            return await super().process_blocks(start_block=start_block, end_block=end_block, checkpoint=checkpoint)
+
+        if self.confirmations is None:
+            messages = await self._retry(self.get_logs_messages, start_block, end_block)
+        else:
+            block_numbers = list(range(start_block, end_block + 1))
+            headers = await self._retry(self.get_blocks_header, block_numbers)
+            blocks_messages = {block_number: [] for block_number in block_numbers}
+            for message in await self._retry(self.get_logs_messages, start_block, end_block, headers):
+                blocks_messages[message.block_number].append(message)
+            messages = []
+            for block_number, block_messages in blocks_messages.items():
+                messages.extend(await self.confirm_block(block_number, headers[block_number], block_messages))
+
+        self.metrics.blocks.inc(end_block - start_block + 1)
+        if messages:
+            await self._retry(self.publish, messages)
+        if checkpoint:
+            await self.complete_blocks(start_block=start_block, end_block=end_block)
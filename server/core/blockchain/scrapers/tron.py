@@ -1,47 +1,53 @@
 from __future__ import annotations
 
+import asyncio
 import decimal
-from typing import Coroutine
+from collections import OrderedDict
+from typing import Coroutine, Optional
 
+from core.common.amounts import get_scale
+from core.blockchain.addresses import from_tron_hex
+from core.blockchain.gates.abi import TRANSFER_SELECTOR, TRANSFER_TYPES
+from core.blockchain.gates.base import NodeError
 from core.blockchain.scrapers.base import TransactionType
 from core.blockchain.scrapers.base import Message, Participant
 from core.blockchain.scrapers.base import AbstractTransactionScraper
 
-PROVIDER_METHODS = {}
+# selector: argument types, decoded by the node codec cache
+PROVIDER_METHODS: dict[str, tuple[str, ...]] = {}
 
 
-async def get_input_native_transaction_handler(scraper: TransactionScraper, search_data: dict,
+async def get_input_native_transaction_handler(scraper: TransactionScraper, search_data: dict, block_number: int,
                                                tx_id: str, value: dict, timestamp: int) -> Message:
-    fee, commission_detail = await scraper.get_transaction_commission(tx_id=tx_id)
-    amount = decimal.Decimal(repr(value['amount'] / 10 ** scraper.node.network.native_decimal_place))
+    fee, commission_detail = await scraper.get_transaction_commission(tx_id=tx_id, block_number=block_number)
+    amount = scraper.native_scale(value['amount'])
 
     return Message(
         timestamp=timestamp,
-        order_id=search_data['direct_payments'][value['to_address']],
+        order_id=search_data['direct_payments'][from_tron_hex(value['to_address'])],
         network_id=scraper.node.network.id,
         transaction_id=tx_id,
         fee=fee,
         commission_detail=commission_detail,
         amount=amount,
         inputs=[Participant(
-            address=value['owner_address'],
+            address=scraper.node.format_key(from_tron_hex(value['owner_address'])),
             amount=amount,
         )],
         outputs=[Participant(
-            address=value['to_address'],
+            address=scraper.node.format_key(from_tron_hex(value['to_address'])),
             amount=amount
         )],
     )
 
 
-async def get_input_stable_coin_transaction_handler(scraper: TransactionScraper, search_data: dict,
+async def get_input_stable_coin_transaction_handler(scraper: TransactionScraper, search_data: dict, block_number: int,
                                                     tx_id: str, value: dict, timestamp: int) -> Message:
-    fee, commission_detail = await scraper.get_transaction_commission(tx_id=tx_id)
-    # TODO
-    to_address, raw_amount = scraper.node.decode_data('', value['data'])
+    to_address, raw_amount = scraper.node.decode_data(TRANSFER_TYPES, value['data'][8:], raw_addresses=True)
     if order_id := search_data['direct_payments'].get(to_address):
-        currency_id, decimal_place = scraper.stable_coins[value['contract_address']]
-        amount = decimal.Decimal(repr(raw_amount / 10 ** decimal_place))
+        fee, commission_detail = await scraper.get_transaction_commission(tx_id=tx_id, block_number=block_number)
+        currency_id, decimal_place = scraper.stable_coins[from_tron_hex(value['contract_address'])]
+        amount = get_scale(decimal_place)(raw_amount)
         return Message(
             timestamp=timestamp,
             order_id=order_id,
@@ -51,29 +57,29 @@ async def get_input_stable_coin_transaction_handler(scraper: TransactionScraper,
             commission_detail=commission_detail,
             amount=amount,
             inputs=[Participant(
-                address=value['owner_address'],
+                address=scraper.node.format_key(from_tron_hex(value['owner_address'])),
                 amount=amount,
             )],
             outputs=[Participant(
-                address=to_address,
+                address=scraper.node.format_key(to_address),
                 amount=amount
             )],
             currency_id=currency_id,
         )
 
 
-async def get_input_provider_transaction_handler(scraper: TransactionScraper,
+async def get_input_provider_transaction_handler(scraper: TransactionScraper, block_number: int,
                                                  tx_id: str, value: dict, timestamp: int, **kwargs) -> Message:
 
-    fee, commission_detail = await scraper.get_transaction_commission(tx_id=tx_id)
-    decoded_data = scraper.node.decode_data(PROVIDER_METHODS[value['data'][:8]])
+    fee, commission_detail = await scraper.get_transaction_commission(tx_id=tx_id, block_number=block_number)
+    _, decoded_data = scraper.node.decode_call(value['data'], methods=PROVIDER_METHODS)
 
     if len(decoded_data) == 2:
         currency_id = None
-        amount = decimal.Decimal(repr(value['amount'] / 10 ** scraper.node.network.native_decimal_place))
+        amount = scraper.native_scale(value['amount'])
     else:
-        currency_id, decimal_place = scraper.stable_coins[value['contract_address']]
-        amount = decimal.Decimal(repr(decoded_data[1] / 10 ** decimal_place))
+        currency_id, decimal_place = scraper.stable_coins[from_tron_hex(value['contract_address'])]
+        amount = get_scale(decimal_place)(decoded_data[1])
 
     return Message(
         timestamp=timestamp,
@@ -84,7 +90,7 @@ async def get_input_provider_transaction_handler(scraper: TransactionScraper,
         commission_detail=commission_detail,
         amount=amount,
         inputs=[Participant(
-            address=value['owner_address'],
+            address=scraper.node.format_key(from_tron_hex(value['owner_address'])),
             amount=amount,
         )],
         outputs=[Participant(
@@ -103,36 +109,95 @@ HANDLER: dict[int: Coroutine] = {
 
 
 class TransactionScraper(AbstractTransactionScraper):
-    async def get_transaction_commission(self, tx_id: str) -> tuple[decimal.Decimal, dict]:
-        # TODO calculate fee
-        pass
+    fee_cache_blocks: int = 64                              # blocks with loaded transactions info
+    confirmation_depth: int = 19                            # solidified block
 
-    async def scrape_transaction(self, transaction: dict, search_data: dict):
+    def get_block_hashes(self, block: dict) -> tuple[str, str]:
+        return block['blockID'], block['block_header']['raw_data']['parentHash']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._blocks_fee: OrderedDict[int, asyncio.Task] = OrderedDict()
+
+    def is_candidate(self, transaction: dict) -> bool:
+        contract = transaction['raw_data']['contract'][0]
+        value = contract['parameter']['value']
+        match contract['type']:
+            case 'TransferContract':
+                return from_tron_hex(value['to_address']) in self.prefilter
+            case 'TriggerSmartContract':
+                if from_tron_hex(value['contract_address']) not in self.prefilter:
+                    return False
+                data = value.get('data', '')
+                # TRC20 `transfer` data holds the recipient key as hex
+                return data[:8] != TRANSFER_SELECTOR or bytes.fromhex(data[32:72]) in self.prefilter
+            case _:
+                return False
+
+    async def load_block_fee(self, block_number: int) -> dict[str, dict]:
+        with self.metrics.fee.time():
+            return {
+                info['id']: info
+                for info in await self.node.get_block_transactions_info(block_number=block_number)
+            }
+
+    def get_block_fee(self, block_number: int) -> asyncio.Task:
+        """Transactions info of the block, loaded once on the first matched transaction"""
+        if (task := self._blocks_fee.get(block_number)) is None or (task.done() and task.exception()):
+            task = asyncio.ensure_future(self.load_block_fee(block_number=block_number))
+            self._blocks_fee[block_number] = task
+            while len(self._blocks_fee) > self.fee_cache_blocks:
+                self._blocks_fee.popitem(last=False)
+        return task
+
+    async def parse_block(self, block_number: int, block: dict) -> list[Message]:
+        try:
+            return await super().parse_block(block_number=block_number, block=block)
+        finally:
+            self._blocks_fee.pop(block_number, None)
+
+    async def get_transaction_commission(self, tx_id: str, block_number: int) -> tuple[decimal.Decimal, dict]:
+        if (info := (await self.get_block_fee(block_number=block_number)).get(tx_id)) is None:
+            # Not indexed yet by a lagging node: the block is parsed again rather than stored without its fee
+            raise NodeError(f'Transaction info not found: {tx_id} of block {block_number}')
+        receipt = info.get('receipt', {})
+        fee = self.native_scale(info.get('fee', 0))
+        return fee, {
+            'energy_usage': receipt.get('energy_usage_total', 0),
+            'energy_fee': receipt.get('energy_fee', 0),
+            'net_usage': receipt.get('net_usage', 0),
+            'net_fee': receipt.get('net_fee', 0),
+        }
+
+    async def scrape_transaction(self, transaction: dict, search_data: dict, block_number: int) -> Optional[Message]:
+        contract = transaction['raw_data']['contract'][0]
+        value = contract['parameter']['value']
         if transaction['ret'][0]['contractRet'] != 'SUCCESS':
             return
 
-        value = transaction['raw_data']['contract'][0]['parameter']['value']
-
-        match transaction['raw_data']['contract'][0]['type']:
+        match contract['type']:
             case 'TransferContract':
-                if search_data['direct_payments'].get(value['to_address']):
+                if search_data['direct_payments'].get(from_tron_hex(value['to_address'])):
                     handler = HANDLER[TransactionType.INPUT_NATIVE_TRANSACTION]
                 else:
-                    return None
+                    return self.prefilter_miss()
             case 'TriggerSmartContract':
-                if value['contract_address'] in search_data['provider_payments'] and value['data'][:8] in ['', '']: # TODO
+                selector = value['data'][:8]
+                contract_address = from_tron_hex(value['contract_address'])
+                if contract_address in search_data['provider_payments'] and selector in PROVIDER_METHODS:
                     handler = HANDLER[TransactionType.INPUT_PROVIDER_TRANSACTION]
-                elif value['contract_address'] in self.stable_coins and value['data'][:8] == 'a9059cbb':
+                elif contract_address in self.stable_coins and selector == TRANSFER_SELECTOR:
                     handler = HANDLER[TransactionType.INPUT_STABLE_COIN_TRANSACTION]
                 else:
-                    return None
+                    return self.prefilter_miss()
             case _:
                 return None
 
-        return await self.send_to_task(message=await handler(
+        return await handler(
             scraper=self,
-            order_id=search_data,
+            search_data=search_data,
+            block_number=block_number,
             tx_id=transaction['txID'],
             value=value,
             timestamp=transaction['raw_data']['timestamp'],
-        ))
+        )
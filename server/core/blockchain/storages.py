@@ -1,16 +1,90 @@
-from typing import Optional
+import time
+import dataclasses
+from typing import Iterable, Optional
 
 import settings
 from config.redis import RedisConnector
 
+# KEYS[1] - checkpoint, ARGV[1] - safe block, ARGV[2] - completed ranges, ARGV[3] - updated at.
+# The safe block never goes back: a write of a lagging process is dropped, the stored safe block is returned.
+SAVE_CHECKPOINT_SCRIPT = """
+local stored = tonumber(redis.call('hget', KEYS[1], 'safe_block'))
+if stored and stored > tonumber(ARGV[1]) then
+    return stored
+end
+redis.call('hset', KEYS[1], 'safe_block', ARGV[1], 'ranges', ARGV[2], 'updated_at', ARGV[3])
+return tonumber(ARGV[1])
+"""
 
-class BlockNumberStorage:
-    def __init__(self, storage_name: str):
-        self._key = storage_name
-        self._storage = RedisConnector(uri=settings.DAEMON_STORAGE_BACKEND_URL)
+Range = tuple[int, int]
 
-    async def set(self, block_number: int):
-        await self._storage.async_set(key=self._storage, value=block_number)
 
-    async def get(self) -> Optional[int]:
-        return await self._storage.async_get(key=self._storage)
+def get_ranges(block_numbers: Iterable[int]) -> tuple[Range, ...]:
+    """Sorted inclusive ranges of the block numbers: 5, 6, 7, 9 -> (5, 7), (9, 9)"""
+    ranges = []
+    for block_number in sorted(block_numbers):
+        if ranges and ranges[-1][1] + 1 == block_number:
+            ranges[-1][1] = block_number
+        else:
+            ranges.append([block_number, block_number])
+    return tuple((start_block, end_block) for start_block, end_block in ranges)
+
+
+def encode_ranges(ranges: Iterable[Range]) -> str:
+    return ','.join(f'{start_block}-{end_block}' for start_block, end_block in ranges)
+
+
+def decode_ranges(data: str) -> tuple[Range, ...]:
+    return tuple(
+        (int(start_block), int(end_block))
+        for start_block, end_block in (item.split('-') for item in data.split(',') if item)
+    )
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Checkpoint:
+    """Every block up to `safe_block` is done, and the blocks of `ranges` above it"""
+    safe_block: int
+    ranges: tuple[Range, ...] = ()
+
+    def clip(self, block_number: int) -> 'Checkpoint':
+        """Nothing above the block is done"""
+        return Checkpoint(
+            safe_block=min(self.safe_block, block_number),
+            ranges=tuple(
+                (start_block, min(end_block, block_number))
+                for start_block, end_block in self.ranges
+                if start_block <= block_number
+            ),
+        )
+
+
+class CheckpointStorage:
+    """
+    Scan progress of one network: `checkpoint:{network_id}` hash of `safe_block`, `ranges` and `updated_at`,
+    written as a whole by `SAVE_CHECKPOINT_SCRIPT`. Out of order completions above the safe block are kept
+    so that a restart scans only the gaps.
+    """
+
+    def __init__(self, network_id: int, legacy_key: Optional[str] = None, storage: Optional[RedisConnector] = None):
+        self._key = f'checkpoint:{network_id}'
+        self._legacy_key = legacy_key                       # plain block number of the former storage
+        self._storage = storage or RedisConnector(uri=settings.DAEMON_STORAGE_BACKEND_URL)
+
+    async def save(self, checkpoint: Checkpoint) -> int:
+        """The stored safe block, above the saved one when another process got further"""
+        return int(await self._storage.async_eval(
+            SAVE_CHECKPOINT_SCRIPT,
+            keys=[self._key],
+            args=[checkpoint.safe_block, encode_ranges(checkpoint.ranges), int(time.time())],
+        ))
+
+    async def load(self) -> Optional[Checkpoint]:
+        if values := await self._storage.async_hgetall(self._key):
+            return Checkpoint(
+                safe_block=int(values[b'safe_block']),
+                ranges=decode_ranges(values.get(b'ranges', b'').decode()),
+            )
+        if self._legacy_key is not None and (block_number := await self._storage.async_get(self._legacy_key)):
+            return Checkpoint(safe_block=int(block_number))
+        return None
@@ -1,7 +1,70 @@
-from config import celery_app
+import asyncio
+import functools
+from collections import Counter
 
+from redis.exceptions import RedisError
+from sqlalchemy.exc import DBAPIError, IntegrityError, ProgrammingError
 
-@celery_app.task(acks_late=True)
-def parsing_daemons_messages_task(message: dict):
-    # TODO
-    pass
+from config import celery_app, get_logger
+from core.blockchain.messages import Message, JSONMessageCodec, get_message_codec
+from core.blockchain.dao import OrderDAO, PaymentDAO
+from core.blockchain.backpressure import sync_release_in_flight
+
+logger = get_logger(name='tasks:messages')
+
+# Database or Redis down, deadlock: the task is sent again with a backoff, as long as it takes
+RETRY_ERRORS = (DBAPIError, RedisError, OSError)
+NOT_RETRIED_ERRORS = (IntegrityError, ProgrammingError)
+RETRY_OPTIONS = {
+    'acks_late': True,
+    'autoretry_for': RETRY_ERRORS,
+    'dont_autoretry_for': NOT_RETRIED_ERRORS,
+    'retry_backoff': True,
+    'retry_backoff_max': 600,
+    'max_retries': None,
+}
+
+
+@functools.cache
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    # One loop per worker process: pooled database connections belong to the loop they were opened in
+    return asyncio.new_event_loop()
+
+
+def handle_messages(messages: list[Message]):
+    """Safe to repeat: `acks_late` tasks are delivered again when the worker dies before the ack"""
+    orders = get_event_loop().run_until_complete(PaymentDAO.save_messages(messages))
+    OrderDAO.sync_publish_events(orders)
+    logger.info(f'{len(messages)} messages handled, {len(orders)} orders paid')
+
+
+def is_retried(error: Exception) -> bool:
+    return isinstance(error, RETRY_ERRORS) and not isinstance(error, NOT_RETRIED_ERRORS)
+
+
+@celery_app.task(**RETRY_OPTIONS)
+def parsing_daemons_messages_task(message: str):
+    handle_messages([JSONMessageCodec.decode(message)])
+
+
+@celery_app.task(**RETRY_OPTIONS)
+def parsing_daemons_messages_batch_task(messages: list, codec: str = 'json'):
+    """Messages of the scrapers sent in one task, see `MessagePublisher`"""
+    decode = get_message_codec(codec).decode
+    messages = [decode(message) for message in messages]
+    try:
+        handle_messages(messages)
+    except Exception as error:
+        # A retried batch keeps its credit: the scraper slows down while the consumers can not keep up
+        if not is_retried(error):
+            release_in_flight(Counter(message.network_id for message in messages))
+        raise
+    release_in_flight(Counter(message.network_id for message in messages))
+
+
+def release_in_flight(in_flight: Counter):
+    for network_id, count in in_flight.items():
+        try:
+            sync_release_in_flight(network_id=network_id, count=count)
+        except RedisError as error:
+            logger.warning(f'In-flight messages of network {network_id} not released: {error!r}')
@@ -0,0 +1,44 @@
+import decimal
+
+import pytest
+
+from core.common import amounts
+
+UINT256_MAX = 2 ** 256 - 1
+
+
+def test_scale_amount_is_exact():
+    assert amounts.scale_amount(UINT256_MAX, 18) == decimal.Decimal(
+        '115792089237316195423570985008687907853269984665640564039457.584007913129639935'
+    )
+    raw_amount = 10 ** 25 + 1
+    # The float path and the default 28 digits context both lose the last unit
+    assert decimal.Decimal(repr(raw_amount / 10 ** 18)) != decimal.Decimal('10000000.000000000000000001')
+    assert decimal.Decimal(10 ** 30 + 1).scaleb(-18) != decimal.Decimal('1000000000000.000000000000000001')
+    assert amounts.scale_amount(raw_amount, 18) == decimal.Decimal('10000000.000000000000000001')
+    assert amounts.scale_amount(10 ** 30 + 1, 18) == decimal.Decimal('1000000000000.000000000000000001')
+
+    assert amounts.scale_amount(1_500_000, 6) == decimal.Decimal('1.5')
+    assert amounts.scale_amount(0, 6) == 0
+    assert amounts.get_scale(6) is amounts.get_scale(6)
+
+
+def test_scale_amounts_batch():
+    raw_amounts = [0, 1, 123_456_789, UINT256_MAX]
+    assert amounts.scale_amounts(raw_amounts, 6) == [amounts.scale_amount(raw, 6) for raw in raw_amounts]
+
+
+def test_to_raw():
+    scale = amounts.get_scale(18)
+    assert scale.to_raw(scale(UINT256_MAX)) == UINT256_MAX
+    assert amounts.get_scale(6).to_raw(decimal.Decimal('1.5')) == 1_500_000
+    with pytest.raises(ValueError):
+        amounts.get_scale(6).to_raw(decimal.Decimal('0.0000001'))
+
+
+def test_prices_keep_their_digits():
+    assert amounts.to_decimal(2451.24) == decimal.Decimal('2451.24')
+    assert amounts.to_decimal('0.1') == decimal.Decimal('0.1')
+    assert amounts.to_decimal(54000) == 54000
+    price = amounts.loads('{"usd": 0.12345678901234567890123}')['usd']
+    assert isinstance(price, decimal.Decimal) and price == decimal.Decimal('0.12345678901234567890123')
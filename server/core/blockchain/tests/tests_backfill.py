@@ -0,0 +1,109 @@
+import pytest
+
+from core.blockchain.backfill import (
+    BackfillCoordinator,
+    BackfillWorker,
+    Chunk,
+    RELEASE_LEASE_SCRIPT,
+    RENEW_LEASE_SCRIPT,
+)
+
+
+class FakeRedis:
+    """The commands the coordinator uses, with expiring keys"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.values: dict[str, tuple[bytes, float]] = {}
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+
+    def _get(self, key: str):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= self.now:
+            del self.values[key]
+            return None
+        return value
+
+    async def get(self, key: str):
+        return self._get(key)
+
+    async def mget(self, keys: list[str]) -> list:
+        return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value, nx: bool = False, px: int = None) -> bool:
+        if nx and self._get(key) is not None:
+            return False
+        self.values[key] = (str(value).encode(), self.now + px / 1000 if px else None)
+        return True
+
+    async def hset(self, key: str, field: str, value: str):
+        self.hashes.setdefault(key, {})[field.encode()] = value.encode()
+
+    async def hgetall(self, key: str) -> dict:
+        return dict(self.hashes.get(key, {}))
+
+    async def eval(self, script: str, numkeys: int, key: str, owner: str, *args):
+        if self._get(key) != owner.encode():
+            return 0
+        if script == RENEW_LEASE_SCRIPT:
+            self.values[key] = (owner.encode(), self.now + args[0] / 1000)
+        elif script == RELEASE_LEASE_SCRIPT:
+            del self.values[key]
+        return 1
+
+
+@pytest.mark.anyio
+async def test_backfill_leases():
+    redis = FakeRedis()
+    first = BackfillCoordinator(name='tron:1-250', redis=redis, owner='first')
+    second = BackfillCoordinator(name='tron:1-250', redis=redis, owner='second')
+
+    await first.plan(start_block=1, end_block=250, chunk_size=100)
+    # A late worker joins the existing plan
+    assert (await second.plan(start_block=1, end_block=999, chunk_size=10))['end_block'] == 250
+
+    assert await first.claim() == Chunk(1, 100)
+    assert await second.claim() == Chunk(101, 200)
+    await first.complete(Chunk(1, 100), seconds=2)
+    assert await first.claim() == Chunk(201, 250)
+
+    progress = await first.progress()
+    assert progress['done'] == 1 and progress['leased'] == 2 and not progress['is_finished']
+
+    # Nothing left to claim till the second worker's lease expires
+    assert await first.claim() is None
+    redis.now += first.lease_ttl
+    assert not await second.renew(Chunk(101, 200))
+    assert await first.claim() == Chunk(101, 200)
+
+    await first.complete(Chunk(201, 250), seconds=1)
+    await first.complete(Chunk(101, 200), seconds=1)
+    progress = await second.progress()
+    assert progress['is_finished'] and progress['blocks_done'] == 250
+    assert await second.claim() is None
+
+
+class FakeScraper:
+    def __init__(self):
+        self.scanned = []
+        self.node = self
+
+    async def setup(self):
+        pass
+
+    async def get_latest_block_number(self) -> int:
+        return 1000
+
+    async def scan_range(self, start_block: int, end_block: int):
+        self.scanned.append((start_block, end_block))
+
+
+@pytest.mark.anyio
+async def test_backfill_worker_runs_till_done():
+    coordinator = BackfillCoordinator(name='tron:10-34', redis=FakeRedis(), owner='worker')
+    await coordinator.plan(start_block=10, end_block=34, chunk_size=10)
+    scraper = FakeScraper()
+
+    await BackfillWorker(scraper=scraper, coordinator=coordinator).run()
+    assert scraper.scanned == [(10, 19), (20, 29), (30, 34)]
+    assert sorted(await coordinator.get_done()) == [10, 20, 30]
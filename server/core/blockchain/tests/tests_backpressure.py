@@ -0,0 +1,117 @@
+import asyncio
+import decimal
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from core.blockchain.backpressure import Backpressure, BackpressureState, get_in_flight_key
+from core.blockchain.messages import Message, MsgpackMessageCodec
+from core.blockchain.publishers import MessagePublisher
+
+
+class FakeInFlightStorage:
+    """`CHANGE_IN_FLIGHT_SCRIPT` without Redis"""
+
+    def __init__(self):
+        self.values = {}
+        self.down = False
+
+    def sync_eval(self, script: str, keys: list, args: list) -> int:
+        if self.down:
+            raise RedisConnectionError('down')
+        self.values[keys[0]] = max(self.values.get(keys[0], 0) + int(args[0]), 0)
+        return self.values[keys[0]]
+
+    async def async_eval(self, script: str, keys: list, args: list) -> int:
+        return self.sync_eval(script, keys, args)
+
+    async def async_get(self, key: str):
+        if self.down:
+            raise RedisConnectionError('down')
+        return str(self.values[key]).encode() if key in self.values else None
+
+
+def get_message(network_id: int = 1) -> Message:
+    return Message(
+        timestamp=1700000000000,
+        order_id=42,
+        network_id=network_id,
+        transaction_id='ab' * 32,
+        fee=decimal.Decimal('0'),
+        commission_detail={},
+        amount=decimal.Decimal('1.5'),
+        inputs=[],
+        outputs=[],
+    )
+
+
+@pytest.mark.anyio
+async def test_backpressure_slows_pauses_and_resumes():
+    storage = FakeInFlightStorage()
+    backpressure = Backpressure(
+        network_id=1, high_watermark=100, low_watermark=20, max_delay=0.02, check_interval=0.01, storage=storage,
+    )
+    await backpressure.wait()
+    assert backpressure.state == BackpressureState.OPEN
+
+    await backpressure.acquire(60)
+    assert backpressure.update_state() == BackpressureState.SLOWED
+    assert backpressure.get_delay() == pytest.approx(0.01)
+
+    async def consume():
+        # Consumers catch up: down to the low watermark in steps
+        for _ in range(8):
+            await asyncio.sleep(0.01)
+            storage.sync_eval('', keys=[get_in_flight_key(1)], args=[-15])
+
+    await backpressure.acquire(60)
+    consumer = asyncio.create_task(consume())
+    await backpressure.wait()
+    # Still paused at 105 and 90: open only at the low watermark, not right below the high one
+    assert backpressure.in_flight <= 20 and backpressure.state == BackpressureState.OPEN
+    assert backpressure.pauses == 1
+    await consumer
+
+    # Redelivered tasks release twice: never below zero
+    storage.sync_eval('', keys=[get_in_flight_key(1)], args=[-1000])
+    assert storage.values[get_in_flight_key(1)] == 0
+
+
+@pytest.mark.anyio
+async def test_backpressure_is_advisory_without_redis():
+    storage = FakeInFlightStorage()
+    storage.values[get_in_flight_key(1)] = 1000
+    storage.down = True
+    backpressure = Backpressure(network_id=1, high_watermark=100, low_watermark=20, storage=storage)
+    await backpressure.acquire(10)
+    await backpressure.wait()
+    assert backpressure.state == BackpressureState.OPEN
+
+
+@pytest.mark.anyio
+async def test_publisher_counts_in_flight_messages(mocker):
+    from core.blockchain.tasks import parsing_daemons_messages_batch_task
+
+    storage = FakeInFlightStorage()
+    backpressure = Backpressure(network_id=1, storage=storage)
+    publisher = MessagePublisher(
+        task_path='task', codec=MsgpackMessageCodec, batch_size=2, backpressure=backpressure,
+    )
+    sent = []
+
+    def send_task(task_path: str, kwargs: dict, **options):
+        if sent:
+            raise OSError('broker is gone')
+        sent.append(kwargs)
+
+    mocker.patch('core.blockchain.publishers.celery_app.send_task', new=send_task)
+    publisher.add([get_message() for _ in range(3)])
+    with pytest.raises(OSError):
+        await publisher.flush()
+    # The failed batch is not counted
+    assert storage.values[get_in_flight_key(1)] == 2
+
+    mocker.patch('core.blockchain.backpressure.get_events_storage', return_value=storage)
+    mocker.patch('core.blockchain.tasks.handle_messages')
+    parsing_daemons_messages_batch_task(**sent[0])
+    assert storage.values[get_in_flight_key(1)] == 0
@@ -0,0 +1,171 @@
+import decimal
+
+import pytest
+
+from core.blockchain.confirmations import BlockHashRing, ConfirmationQueue
+from core.blockchain.messages import Message
+from core.blockchain.models import Network, NetworkFamily
+from core.blockchain.scrapers import TronTransactionScraper
+from core.blockchain.scrapers.base import BlockWatermark
+from core.blockchain.storages import Checkpoint
+
+
+def get_message(transaction_id: str, block_number: int) -> Message:
+    return Message(
+        timestamp=0,
+        order_id=42,
+        network_id=1,
+        transaction_id=transaction_id,
+        fee=decimal.Decimal(0),
+        commission_detail={},
+        amount=decimal.Decimal(1),
+        inputs=[],
+        outputs=[],
+        block_number=block_number,
+    )
+
+
+def test_block_hash_ring():
+    ring = BlockHashRing(size=4)
+    for number in range(10, 16):
+        ring.put(number, f'h{number}', f'h{number - 1}')
+
+    assert ring.get(11) is None
+    assert ring.get(15) == ('h15', 'h14')
+    assert ring.conflicts(14, 'h14', 'h13') == []
+    assert ring.conflicts(14, 'x14', 'x13') == [13, 15]
+
+
+def test_confirmation_queue_depth():
+    queue = ConfirmationQueue(depth=2, ring_size=8)
+
+    assert queue.add_block(10, 'h10', 'h9', [get_message('tx-1', 10)]) == ([], [])
+    assert queue.add_block(11, 'h11', 'h10', []) == ([], [])
+    assert queue.lowest_pending == 10
+
+    confirmed, conflicts = queue.add_block(12, 'h12', 'h11', [get_message('tx-2', 12)])
+    assert [message.transaction_id for message in confirmed] == ['tx-1'] and conflicts == []
+    assert queue.lowest_pending == 12 and len(queue) == 1
+
+
+def test_confirmation_queue_reorg():
+    queue = ConfirmationQueue(depth=3, ring_size=8)
+    queue.add_block(10, 'h10', 'h9', [])
+    queue.add_block(11, 'h11', 'h10', [get_message('tx-1', 11)])
+    queue.add_block(12, 'h12', 'h11', [get_message('tx-2', 12)])
+
+    # Block 13 of another chain: its parent is not the known 12
+    assert queue.add_block(13, 'x13', 'x12', []) == ([], [12])
+    # The canonical 12 replaces the orphaned one, its transaction moved to another block
+    assert queue.add_block(12, 'x12', 'h11', []) == ([], [])
+    assert queue.retracted == 1 and queue.reorgs == 1
+
+    confirmed, _ = queue.add_block(14, 'x14', 'x13', [])
+    assert [message.transaction_id for message in confirmed] == ['tx-1']
+    assert queue.lowest_pending is None
+
+
+def test_confirmation_queue_out_of_order():
+    queue = ConfirmationQueue(depth=2, ring_size=8)
+    queue.start(10)
+    queue.add_block(10, 'h10', 'h9', [get_message('tx-1', 10)])
+
+    # 13 finished first in its chunk: 11 and 12 are not added yet, nothing is confirmed by it
+    assert queue.add_block(13, 'h13', 'h12', []) == ([], [])
+    assert queue.tip == 10
+
+    # 12 is on another chain than 13, seen before 10 is released
+    assert queue.add_block(12, 'x12', 'h11', []) == ([], [13])
+    confirmed, _ = queue.add_block(11, 'h11', 'h10', [])
+    # 13 stays held till its current version is added
+    assert queue.tip == 12
+    assert [message.transaction_id for message in confirmed] == ['tx-1']
+
+    # Ranges done before a restart count as added
+    queue.start(20, done=[(21, 22)])
+    assert queue.tip == 19
+    queue.add_block(20, 'h20', 'h19', [])
+    assert queue.tip == 22
+
+
+def test_confirmation_queue_holds_conflicts():
+    queue = ConfirmationQueue(depth=2, ring_size=8)
+    queue.start(10)
+    queue.add_block(10, 'h10', 'h9', [])
+    queue.add_block(11, 'h11', 'h10', [])
+    queue.add_block(12, 'h12', 'h11', [get_message('tx-1', 12)])
+
+    # 12 is orphaned: while it is scanned again the blocks above it confirm nothing
+    assert queue.add_block(13, 'x13', 'x12', []) == ([], [12])
+    assert queue.add_block(14, 'x14', 'x13', []) == ([], [])
+    assert queue.tip == 11
+
+    assert queue.add_block(12, 'x12', 'h11', []) == ([], [])
+    assert queue.tip == 14 and queue.retracted == 1
+
+
+def get_tron_block(number: int, fork: str = 'h', parent_fork: str = None) -> dict:
+    return {
+        'blockID': f'{fork}{number}',
+        'block_header': {'raw_data': {'number': number, 'parentHash': f'{parent_fork or fork}{number - 1}'}},
+        'transactions': [number],
+    }
+
+
+@pytest.mark.anyio
+async def test_scraper_reorg_scans_only_orphaned_blocks(mocker):
+    scraper = TronTransactionScraper(network=Network(
+        id=1,
+        name='Tron',
+        short_name='tron',
+        native_symbol='TRX',
+        native_decimal_place=6,
+        node_url='http://localhost:8090',
+        family=NetworkFamily.tron,
+    ))
+    scraper.confirmations = ConfirmationQueue(depth=2, ring_size=16)
+    scraper.confirmation_depth = 2
+    scraper.watermark = BlockWatermark(safe_block=99)
+    canonical = {100: get_tron_block(100), 101: get_tron_block(101, 'x', 'h'), 102: get_tron_block(102, 'x')}
+    fetched, sent, checkpoints = [], [], []
+
+    async def parse_block(block_number: int, block: dict) -> list[Message]:
+        return [get_message(block['blockID'], block_number)]
+
+    async def fetch_blocks(start_block: int, end_block: int) -> list[dict]:
+        fetched.append(start_block)
+        return [canonical[start_block]]
+
+    async def publish(messages: list[Message]):
+        sent.extend(message.transaction_id for message in messages)
+
+    async def storage_save(checkpoint: Checkpoint):
+        checkpoints.append(checkpoint.safe_block)
+
+    mocker.patch.object(scraper, 'parse_block', new=parse_block)
+    mocker.patch.object(scraper, 'fetch_blocks', new=fetch_blocks)
+    mocker.patch.object(scraper, 'publish', new=publish)
+    mocker.patch.object(scraper.storage, 'save', new=storage_save)
+
+    await scraper.process_block(100, get_tron_block(100))
+    await scraper.process_block(101, get_tron_block(101))
+    assert sent == [] and checkpoints == [99]
+
+    # 102 is built on another 101: only 101 is fetched again
+    await scraper.process_block(102, canonical[102])
+    assert fetched == [101]
+    assert sent == ['h100']
+    assert scraper.confirmations.retracted == 1
+    assert checkpoints == [99, 100]
+
+    await scraper.process_block(103, get_tron_block(103, 'x'))
+    assert sent == ['h100', 'x101']
+
+
+def test_confirmation_queue_release():
+    queue = ConfirmationQueue(depth=5, ring_size=8)
+    queue.add_block(10, 'h10', 'h9', [get_message('tx-1', 10)])
+    queue.add_block(11, 'h11', 'h10', [get_message('tx-2', 11)])
+
+    assert [message.transaction_id for message in queue.release(10)] == ['tx-1']
+    assert queue.lowest_pending == 11
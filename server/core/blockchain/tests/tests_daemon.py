@@ -0,0 +1,80 @@
+import pytest
+
+from core.blockchain.daemon import DaemonSupervisor
+from core.blockchain.models import Network, NetworkFamily
+
+
+class FakeProcess:
+    def __init__(self, network_id: int):
+        self.network_id = network_id
+        self.pid = 1000 + network_id
+        self.exitcode = None
+        self.alive = False
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def terminate(self):
+        self.alive = False
+        self.exitcode = -15
+
+    def join(self, timeout: float = None):
+        pass
+
+    def crash(self):
+        self.alive = False
+        self.exitcode = 1
+
+
+def get_network(network_id: int) -> Network:
+    return Network(id=network_id, short_name=f'net{network_id}', family=NetworkFamily.evm, is_active=True)
+
+
+@pytest.mark.anyio
+async def test_supervisor_starts_stops_and_restarts(mocker):
+    supervisor = DaemonSupervisor()
+    networks = [get_network(1), get_network(2)]
+    spawned, clock = [], [1000.0]
+
+    def spawn(network_id: int) -> FakeProcess:
+        spawned.append(FakeProcess(network_id))
+        return spawned[-1]
+
+    mocker.patch.object(supervisor, 'get_networks', new=mocker.AsyncMock(side_effect=lambda: list(networks)))
+    mocker.patch.object(supervisor, 'spawn', new=spawn)
+    mocker.patch('core.blockchain.daemon.time.monotonic', new=lambda: clock[0])
+
+    await supervisor.sync()
+    assert [process.network_id for process in spawned] == [1, 2]
+
+    # Crash: restarted after 1, 2, 4... seconds
+    spawned[0].crash()
+    await supervisor.sync()
+    assert len(spawned) == 2 and supervisor.workers[1].failures == 1
+    clock[0] += 1
+    await supervisor.sync()
+    assert [process.network_id for process in spawned] == [1, 2, 1]
+
+    spawned[2].crash()
+    clock[0] += 1
+    await supervisor.sync()
+    clock[0] += 1
+    await supervisor.sync()
+    assert len(spawned) == 3 and supervisor.workers[1].failures == 2
+    clock[0] += 1
+    await supervisor.sync()
+    assert len(spawned) == 4
+
+    # Running long enough resets the backoff
+    spawned[3].crash()
+    clock[0] += supervisor.stable_after
+    await supervisor.sync()
+    assert supervisor.workers[1].failures == 1
+
+    # Network switched off in the admin
+    networks.pop(1)
+    await supervisor.sync()
+    assert 2 not in supervisor.workers and spawned[1].exitcode == -15
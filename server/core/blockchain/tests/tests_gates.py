@@ -0,0 +1,247 @@
+import asyncio
+
+import pytest
+from eth_abi.abi import default_codec
+from tronpy.abi import tron_abi
+from tronpy.exceptions import BlockNotFound
+
+from core.blockchain import addresses
+from core.blockchain.gates import TronNode, EVMNode
+from core.blockchain.gates.abi import StaticDecoder, TRANSFER_TYPES
+from core.blockchain.gates.base import NodeError
+from core.blockchain.gates.cache import BlockCache
+from core.blockchain.gates.evm import format_result
+from core.blockchain.gates.pool import Endpoint, EndpointPool
+from core.blockchain.models import Network, NetworkFamily
+
+TRANSFER_DATA = (
+    'a9059cbb'
+    '000000000000000000000000a614f803b6fd780986a42c78ec9c7f77e6ded13c'
+    '00000000000000000000000000000000000000000000000000000000017d7840'
+)
+
+
+@pytest.mark.parametrize('node, codec', [(TronNode, tron_abi), (EVMNode, default_codec)])
+def test_decode_data_matches_codec(node, codec):
+    data = TRANSFER_DATA[8:]
+    assert isinstance(node.get_decoder(TRANSFER_TYPES), StaticDecoder)
+    assert node.get_decoder(TRANSFER_TYPES) is node.get_decoder(TRANSFER_TYPES)
+    assert node.decode_data(TRANSFER_TYPES, data) == codec.decode(TRANSFER_TYPES, bytes.fromhex(data))
+    assert node.decode_data(TRANSFER_TYPES, bytes.fromhex(data)) == node.decode_data(TRANSFER_TYPES, '0x' + data)
+
+
+def test_decode_call():
+    assert TronNode.decode_call(TRANSFER_DATA) == ('a9059cbb', ('TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t', 25000000))
+    assert TronNode.decode_call('deadbeef' + TRANSFER_DATA[8:]) is None
+
+    with pytest.raises(ValueError):
+        TronNode.decode_call(TRANSFER_DATA[:-2])
+
+
+def test_address_keys():
+    key = bytes.fromhex('a614f803b6fd780986a42c78ec9c7f77e6ded13c')
+    # Every text form of one address has one key, on both families
+    for address in (
+        'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t',
+        '41a614f803b6fd780986a42c78ec9c7f77e6ded13c',
+        '0xA614F803B6FD780986A42C78EC9C7F77E6DED13C',
+        '0xa614f803b6fd780986a42c78ec9c7f77e6ded13c',
+        'a614f803b6fd780986a42c78ec9c7f77e6ded13c',
+    ):
+        assert TronNode.address_key(address) == EVMNode.address_key(address) == key
+    assert addresses.from_tron_hex('41a614f803b6fd780986a42c78ec9c7f77e6ded13c') == key
+    assert TronNode.format_key(key) == 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+    assert EVMNode.format_key(key) == '0xa614f803B6FD780986A42c78Ec9c7f77e6DeD13C'
+    assert TronNode.decode_data(TRANSFER_TYPES, TRANSFER_DATA[8:], raw_addresses=True) == (key, 25000000)
+
+    for address in ('TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6', '0x1234', 'not an address'):
+        with pytest.raises(ValueError):
+            addresses.to_key(address)
+
+
+def test_dynamic_types_and_encoding():
+    types = ('address', 'string', 'uint256')
+    params = ('0xa614f803b6fd780986a42c78ec9c7f77e6ded13c', 'order-1', 10)
+
+    data = EVMNode.encode_data(types, params)
+    assert data == default_codec.encode(types, params).hex()
+    assert not isinstance(EVMNode.get_decoder(types), StaticDecoder)
+    assert EVMNode.decode_data(types, data) == params
+
+
+def test_decode_call_with_empty_methods():
+    assert TronNode.decode_call(TRANSFER_DATA, methods={}) is None
+
+
+def get_pool(*urls: str) -> EndpointPool:
+    return EndpointPool(endpoints=[Endpoint(url=url) for url in urls], errors=(NodeError, OSError))
+
+
+@pytest.mark.anyio
+async def test_pool_prefers_fastest_and_fails_over():
+    pool = get_pool('a', 'b')
+    pool.endpoints[0].latency, pool.endpoints[1].latency = 0.5, 0.1
+    calls = []
+
+    async def call(endpoint: Endpoint) -> str:
+        calls.append(endpoint.url)
+        if endpoint.url == 'b':
+            raise OSError('connection reset')
+        return endpoint.url
+
+    assert await pool.request(call) == 'a'
+    assert calls == ['b', 'a'] and pool.failovers == 1
+    assert pool.endpoints[1].failures == 1 and pool.endpoints[1].error_rate > 0
+
+    # Not the endpoint's fault: no failover, no penalty
+    async def not_found(endpoint: Endpoint):
+        raise BlockNotFound()
+
+    with pytest.raises(BlockNotFound):
+        await pool.request(not_found)
+    assert pool.failovers == 1 and pool.endpoints[0].failures == 0
+
+
+@pytest.mark.anyio
+async def test_pool_circuit_breaker(mocker):
+    pool = get_pool('a', 'b')
+    clock = [1000.0]
+    mocker.patch('core.blockchain.gates.pool.time.monotonic', new=lambda: clock[0])
+    broken = {'a'}
+
+    async def call(endpoint: Endpoint) -> str:
+        if endpoint.url in broken:
+            raise NodeError(endpoint.url)
+        return endpoint.url
+
+    for _ in range(pool.failure_threshold):
+        pool.endpoints[1].latency = 1
+        assert await pool.request(call) == 'b'
+    assert pool.endpoints[0].is_open(clock[0])
+    assert [endpoint.url for endpoint in pool.select()] == ['b', 'a']
+
+    # Half-open trial fails: open again for twice as long
+    clock[0] += pool.open_timeout
+    assert await pool.request(call) == 'b'
+    assert pool.endpoints[0].open_until == clock[0] + pool.open_timeout * 2
+
+    # Trial succeeds: closed
+    broken.clear()
+    clock[0] += pool.open_timeout * 2
+    assert await pool.request(call) == 'a'
+    assert not pool.endpoints[0].is_open(clock[0]) and pool.endpoints[0].trips == 0
+
+    # Everything broken: the error of the last endpoint
+    broken.update({'a', 'b'})
+    with pytest.raises(NodeError):
+        await pool.request(call)
+
+
+@pytest.mark.anyio
+async def test_pool_hedges_stalled_request():
+    pool = get_pool('slow', 'fast')
+    pool.hedge_min_delay = 0.01
+    pool.endpoints[0].latency, pool.endpoints[1].latency = 0.001, 0.002
+    cancelled = []
+
+    async def call(endpoint: Endpoint) -> str:
+        try:
+            await asyncio.sleep(10 if endpoint.url == 'slow' else 0)
+        except asyncio.CancelledError:
+            cancelled.append(endpoint.url)
+            raise
+        return endpoint.url
+
+    assert await pool.request(call, hedge=True) == 'fast'
+    assert pool.hedged == 1 and cancelled == ['slow']
+    # The stalled endpoint is not penalized, just outrun
+    assert pool.endpoints[0].failures == 0
+
+
+def test_node_endpoints_from_network():
+    node = EVMNode(network=Network(
+        id=1,
+        short_name='bsc',
+        node_url='http://primary:8545',
+        reserve_node_urls=['http://reserve:8545'],
+        family=NetworkFamily.evm,
+    ))
+    assert [endpoint.url for endpoint in node.pool.endpoints] == ['http://primary:8545', 'http://reserve:8545']
+    assert node.provider is node.pool.primary.provider
+
+
+def test_block_cache_reopen_and_torn_write(tmp_path):
+    cache = BlockCache(directory=str(tmp_path))
+    cache.put(10, b'{"number":10}')
+    cache.put(11, b'{"number":11}')
+    cache.put(10, b'{"number":-1}')
+    assert cache.get(10) == b'{"number":10}' and cache.get(12) is None
+    cache.put(12, b'{"number":12}')
+    assert cache.get(12) == b'{"number":12}'
+    cache.close()
+
+    # Crash: a block written without its index record, half of an index record
+    with open(tmp_path / 'blocks.seg', 'ab') as segment:
+        segment.write(b'{"number":13}')
+    with open(tmp_path / 'blocks.idx', 'ab') as index:
+        index.write(b'\x0d\x00\x00')
+
+    cache = BlockCache(directory=str(tmp_path))
+    assert len(cache) == 3 and 13 not in cache
+    cache.put(13, b'{"number":13}')
+    assert [cache.get(number) for number in (11, 13)] == [b'{"number":11}', b'{"number":13}']
+    assert cache.metrics()['size'] == len(b'{"number":10}') * 4
+    cache.close()
+
+
+def test_block_cache_shared_by_processes(tmp_path):
+    daemon, worker = BlockCache(directory=str(tmp_path)), BlockCache(directory=str(tmp_path))
+    daemon.put(1, b'{"number":1}')
+    worker.put(2, b'{"number":2}')
+    daemon.put(3, b'{"number":3}')
+    worker.put(3, b'{"number":-3}')
+
+    for cache in (daemon, worker):
+        assert [cache.get(number) for number in (1, 2, 3)] == [b'{"number":1}', b'{"number":2}', b'{"number":3}']
+    daemon.close()
+    worker.close()
+
+    cache = BlockCache(directory=str(tmp_path))
+    assert len(cache) == 3 and cache.get(2) == b'{"number":2}'
+    cache.close()
+
+
+@pytest.mark.anyio
+async def test_node_reads_through_block_cache(tmp_path, mocker):
+    node = TronNode(network=Network(id=1, short_name='tron', node_url='http://localhost:8090',
+                                    family=NetworkFamily.tron))
+    node.cache = BlockCache(directory=str(tmp_path))
+    node.cache_depth = 5
+    requests = []
+
+    async def fetch_blocks_detail(start_block: int, end_block: int) -> list[dict]:
+        requests.append((start_block, end_block))
+        return [{'number': number} for number in range(start_block, end_block + 1)]
+
+    mocker.patch.object(node, 'fetch_blocks_detail', new=fetch_blocks_detail)
+    mocker.patch.object(node, 'fetch_latest_block_number', new=mocker.AsyncMock(return_value=20))
+    await node.get_latest_block_number()
+
+    # Only blocks deep enough are stored
+    assert [block['number'] for block in await node.get_blocks_detail(10, 17)] == list(range(10, 18))
+    assert list(range(10, 16)) == [number for number in range(10, 18) if number in node.cache]
+
+    requests.clear()
+    assert [block['number'] for block in await node.get_blocks_detail(8, 17)] == list(range(8, 18))
+    assert requests == [(8, 9), (16, 17)]
+
+
+def test_evm_block_cache_round_trip():
+    raw_block = {
+        'number': '0x10', 'hash': '0x' + '11' * 32, 'nonce': '0x0000000000000042', 'miner': '0x' + 'ab' * 20,
+        'transactions': [{'hash': '0x' + '22' * 32, 'nonce': '0x5', 'to': None, 'input': '0x', 'value': '0x0'}],
+    }
+    node = EVMNode(network=Network(id=1, short_name='bsc', node_url='http://localhost:8545',
+                                   family=NetworkFamily.evm))
+    block = format_result(raw_block)
+    assert node.load_block(node.dump_block(block)) == block
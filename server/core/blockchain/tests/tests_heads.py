@@ -0,0 +1,77 @@
+import json
+import asyncio
+
+import pytest
+import websockets
+
+from core.blockchain.heads import HeadWatcher, PollScheduler
+from core.blockchain.models import Network, NetworkFamily
+
+
+def test_poll_scheduler_predicts_next_block():
+    scheduler = PollScheduler(block_time=10)
+    assert scheduler.delay(now=0) == scheduler.min_delay
+
+    scheduler.observe(100, now=0)
+    scheduler.observe(102, now=6)
+    assert scheduler.block_time == pytest.approx(8.6)
+    # Due 8.6 sec after the last block plus the grace
+    assert scheduler.delay(now=7) == pytest.approx(6 + 8.6 * 1.05 - 7)
+    # Late: polled every tenth of the block time
+    assert scheduler.delay(now=20) == pytest.approx(0.86)
+
+
+class FakeNode:
+    block_time = 0.01
+
+    def __init__(self, heads: list[int]):
+        self.network = Network(id=1, short_name='eth', family=NetworkFamily.evm)
+        self.heads = heads
+        self.latest_block_number = None
+
+    async def get_latest_block_number(self) -> int:
+        return self.heads.pop(0) if len(self.heads) > 1 else self.heads[0]
+
+
+@pytest.mark.anyio
+async def test_head_watcher_polls_till_new_block():
+    watcher = HeadWatcher(node=FakeNode(heads=[100, 100, 100, 101]))
+    assert await watcher.wait(above=99) == 100
+    assert await watcher.wait(above=100) == 101
+    assert watcher.polled == 4 and watcher.node.latest_block_number == 101
+
+
+@pytest.mark.anyio
+async def test_head_watcher_new_heads_subscription():
+    subscribed = asyncio.Event()
+    heads = asyncio.Queue()
+
+    async def node(websocket):
+        request = json.loads(await websocket.recv())
+        assert request['method'] == 'eth_subscribe' and request['params'] == ['newHeads']
+        await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0xabc'}))
+        subscribed.set()
+        while (block_number := await heads.get()) is not None:
+            await websocket.send(json.dumps({
+                'jsonrpc': '2.0',
+                'method': 'eth_subscription',
+                'params': {'subscription': '0xabc', 'result': {'number': hex(block_number)}},
+            }))
+
+    async with websockets.serve(node, '127.0.0.1', 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        watcher = HeadWatcher(node=FakeNode(heads=[1]), ws_url=f'ws://127.0.0.1:{port}')
+        watcher.scheduler.block_time = 60
+        task = asyncio.create_task(watcher.subscribe())
+        try:
+            await asyncio.wait_for(subscribed.wait(), timeout=5)
+            await heads.put(200)
+            assert await asyncio.wait_for(watcher.wait(above=150), timeout=5) == 200
+            await heads.put(201)
+            await heads.put(202)
+            assert await asyncio.wait_for(watcher.wait(above=201), timeout=5) == 202
+            # Only the very first head is polled
+            assert watcher.pushed == 3 and watcher.polled == 1 and watcher.is_subscribed
+        finally:
+            await heads.put(None)
+            task.cancel()
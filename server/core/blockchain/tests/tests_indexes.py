@@ -0,0 +1,143 @@
+import asyncio
+import sys
+
+import pytest
+
+from core.blockchain.dao import OrderDAO
+from core.blockchain.events import OrderEvent
+from core.blockchain.models import Order, OrderStatus
+from core.blockchain.indexes import WatchedAddressIndex
+
+
+class FakeStreamStorage:
+    def __init__(self, entries: list):
+        self.entries = entries
+        self.requested = []
+
+    async def async_xread(self, streams: dict, count: int, block: int) -> list:
+        self.requested.append(streams)
+        stream, = streams
+        entries, self.entries = self.entries, []
+        return [(stream.encode(), entries)] if entries else []
+
+
+def test_watched_address_index_apply():
+    index = WatchedAddressIndex(network_id=1, storage=FakeStreamStorage([]))
+
+    index.apply(OrderEvent.CREATED, 'TAddress1', 1)
+    index.apply(OrderEvent.CREATED, 'TAddress2', 2)
+    assert index.get('TAddress1') == 1
+    assert 'TAddress2' in index and len(index) == 2
+
+    # Other order on the same address is not removed by a stale event
+    index.apply(OrderEvent.CREATED, 'TAddress1', 3)
+    index.apply(OrderEvent.PAID, 'TAddress1', 1)
+    assert index['TAddress1'] == 3
+
+    index.apply(OrderEvent.EXPIRED, 'TAddress2', 2)
+    index.apply(OrderEvent.EXPIRED, 'TAddress2', 2)
+    assert 'TAddress2' not in index
+    assert index.version == 4
+
+
+@pytest.mark.anyio
+async def test_watched_address_index_read_events():
+    storage = FakeStreamStorage([
+        (b'1-0', {b'event': b'created', b'address': b'TAddress1', b'order_id': b'1'}),
+        (b'2-0', {b'event': b'created', b'address': b'TAddress2', b'order_id': b'2'}),
+        (b'3-0', {b'event': b'paid', b'address': b'TAddress1', b'order_id': b'1'}),
+    ])
+    index = WatchedAddressIndex(network_id=1, storage=storage)
+
+    assert await index.read_events() == 3
+    assert list(index) == ['TAddress2']
+
+    assert await index.read_events() == 0
+    assert storage.requested[-1] == {'orders:events:1': b'3-0'}
+
+
+@pytest.mark.anyio
+async def test_order_dao_publishes_events(mocker):
+    published = []
+
+    async def publish_order_event(network_id: int, event: OrderEvent, address: str, order_id: int):
+        published.append((network_id, event, address, order_id))
+
+    async def raw_update(obj: Order, data: dict, session=None, **kwargs) -> Order:
+        for column, value in data.items():
+            setattr(obj, column, value)
+        return obj
+
+    mocker.patch('core.blockchain.dao.publish_order_event', new=publish_order_event)
+    mocker.patch.object(OrderDAO, 'raw_create', new=mocker.AsyncMock(side_effect=lambda obj, **_: obj))
+    mocker.patch.object(OrderDAO, 'raw_update', new=raw_update)
+
+    order = await OrderDAO.create(Order(id=7, network_id=1, address='TAddress1', status=OrderStatus.created))
+    await OrderDAO.update(order, {'amount': 10})
+    await OrderDAO.update(order, {'status': OrderStatus.paid}, auto_commit=False)
+    await OrderDAO.update(order, {'status': OrderStatus.paid})
+
+    assert published == [
+        (1, OrderEvent.CREATED, 'TAddress1', 7),
+        (1, OrderEvent.PAID, 'TAddress1', 7),
+    ]
+
+
+@pytest.mark.anyio
+async def test_address_prefilter():
+    from core.blockchain.indexes import AddressPrefilter
+
+    addresses = [f'TAddress{number}' for number in range(5000)]
+    prefilter = AddressPrefilter(key_function=lambda address: (address, address.lower()))
+    assert prefilter.is_stale
+
+    await prefilter.rebuild(addresses)
+    assert not prefilter.is_stale
+    assert all(address in prefilter and address.lower() in prefilter for address in addresses)
+
+    assert not any(f'TOther{number}' in prefilter for number in range(5000))
+
+    prefilter.on_order_event(OrderEvent.CREATED, 'TNewAddress')
+    assert 'TNewAddress' in prefilter and not prefilter.is_stale
+
+    prefilter.on_order_event(OrderEvent.PAID, 'TNewAddress')
+    assert prefilter.is_stale and 'TNewAddress' in prefilter
+    prefilter.miss()
+
+    # Concurrent rebuilds run one after another, an address added meanwhile survives the swap
+    sources = addresses[:20]
+    rebuild = asyncio.gather(prefilter.rebuild(sources), prefilter.rebuild(sources))
+    await asyncio.sleep(0)
+    sources.append('TAddedDuringRebuild')
+    prefilter.add('TAddedDuringRebuild')
+    await rebuild
+    assert not prefilter.is_stale
+    assert 'TNewAddress' not in prefilter and 'TAddedDuringRebuild' in prefilter
+
+    metrics = prefilter.metrics()
+    assert metrics['keys'] == 42
+    assert metrics['rebuilds'] == 3
+    assert metrics['misses'] == 1
+    assert metrics['false_positive_rate'] == 1 / metrics['passed']
+    assert metrics['memory_bytes'] > sys.getsizeof(prefilter._keys)
+
+
+def test_address_prefilter_exported(mocker):
+    from prometheus_client import CollectorRegistry
+
+    import settings
+    from core.blockchain.indexes import AddressPrefilter
+    from core.common.metrics import StatsCollector
+
+    mocker.patch.object(settings, 'METRICS_ENABLED', True)
+    registry = CollectorRegistry()
+    collector = StatsCollector('scraper_prefilter', 'Address prefilter', labelnames=('network',), registry=registry)
+    prefilter = AddressPrefilter(key_function=lambda address: (address,))
+    prefilter.add('TAddress1')
+    collector.add(prefilter.metrics, network='tron')
+
+    assert 'TAddress1' in prefilter and 'TAddress2' not in prefilter
+    prefilter.miss()
+    labels = {'network': 'tron'}
+    assert registry.get_sample_value('scraper_prefilter_false_positive_rate', labels) == 1.0
+    assert registry.get_sample_value('scraper_prefilter_memory_bytes', labels) == prefilter.memory_bytes()
@@ -0,0 +1,44 @@
+import json
+import decimal
+
+import pytest
+
+from core.blockchain.messages import Message, Participant, MESSAGE_CODECS, get_message_codec
+
+
+def get_message() -> Message:
+    amount = decimal.Decimal('123456789.123456789012345678')
+    return Message(
+        timestamp=1700000000000,
+        order_id=42,
+        network_id=1,
+        transaction_id='ab' * 32,
+        fee=decimal.Decimal('0.000063'),
+        commission_detail={'gas_used': 21000, 'gas_price': 3 * 10 ** 9},
+        amount=amount,
+        inputs=[Participant(address='TJCnKsPa7y5okkXvQAidZBzqx3QyQ6sxMW', amount=amount)],
+        outputs=[Participant(address='TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t', amount=amount)],
+        currency_id=7,
+    )
+
+
+@pytest.mark.parametrize('codec', MESSAGE_CODECS.values())
+def test_message_codec_round_trip(codec):
+    message = get_message()
+
+    decoded = codec.decode(codec.encode(message))
+
+    assert decoded == message
+    assert isinstance(decoded.inputs[0], Participant)
+    assert str(decoded.amount) == '123456789.123456789012345678'
+
+
+def test_message_json():
+    message = get_message()
+
+    assert Message.from_json(json.loads(message.to_json())) == message
+    assert get_message_codec('msgpack').serializer == 'msgpack'
+    assert len(get_message_codec('msgpack').encode(message)) < len(message.to_json())
+
+    with pytest.raises(ValueError):
+        get_message_codec('pickle')
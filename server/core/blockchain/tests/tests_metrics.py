@@ -0,0 +1,73 @@
+import pytest
+from prometheus_client import CollectorRegistry, generate_latest
+
+import settings
+from core.common.metrics import NULL_CHILD, REGISTRY, Histogram, StatsCollector, labels
+
+
+def test_disabled_metrics_are_no_op(mocker):
+    registry = CollectorRegistry()
+    stage = Histogram('stage_seconds', 'Stage', labelnames=('stage',), registry=registry)
+    mocker.patch.object(settings, 'METRICS_ENABLED', False)
+
+    child = labels(stage, stage='fetch')
+    assert child is NULL_CHILD
+    with child.time():
+        child.observe(1)
+    assert registry.get_sample_value('stage_seconds_count', {'stage': 'fetch'}) is None
+
+
+def test_stats_collector(mocker):
+    mocker.patch.object(settings, 'METRICS_ENABLED', True)
+    registry = CollectorRegistry()
+    cache = StatsCollector('block_cache', 'Block cache', labelnames=('network',), registry=registry)
+    cache.add(lambda: {'blocks': 3, 'hits': 7, 'directory': '/tmp', 'is_open': True}, network='tron')
+    cache.add(lambda: {'blocks': 5, 'hits': 1}, network='eth')
+
+    assert registry.get_sample_value('block_cache_blocks', {'network': 'tron'}) == 3
+    assert registry.get_sample_value('block_cache_is_open', {'network': 'tron'}) == 1
+    assert registry.get_sample_value('block_cache_hits', {'network': 'eth'}) == 1
+    # Read on every scrape, a source added again replaces the former one
+    cache.add(lambda: {'blocks': 4}, network='tron')
+    assert registry.get_sample_value('block_cache_blocks', {'network': 'tron'}) == 4
+    assert b'directory' not in generate_latest(registry)
+
+
+@pytest.mark.anyio
+async def test_scraper_stage_metrics(mocker):
+    from core.blockchain.models import Network, NetworkFamily
+    from core.blockchain.scrapers import TronTransactionScraper
+
+    scraper = TronTransactionScraper(network=Network(
+        id=1, name='Tron', short_name='tron', native_decimal_place=6,
+        node_url='http://localhost:8090', family=NetworkFamily.tron,
+    ))
+    if scraper.metrics.blocks is NULL_CHILD:
+        pytest.skip('Metrics are disabled')
+    mocker.patch.object(scraper, 'get_search_data', new=mocker.AsyncMock(return_value={}))
+    mocker.patch.object(scraper, 'scrape_transaction', new=mocker.AsyncMock(side_effect=[None, mocker.Mock()]))
+    mocker.patch.object(scraper.node, 'get_block_detail', new=mocker.AsyncMock(return_value={
+        'transactions': [{}, {}],
+    }))
+
+    def get_samples() -> list:
+        # Children are shared by the scrapers of a network
+        return [
+            REGISTRY.get_sample_value('scraper_stage_seconds_count', {'network': 'tron', 'stage': stage}) or 0
+            for stage in ('fetch', 'parse', 'match')
+        ] + [
+            REGISTRY.get_sample_value(f'scraper_{name}_total', {'network': 'tron'}) or 0
+            for name in ('blocks', 'transactions', 'matches')
+        ]
+
+    before = get_samples()
+    block, = await scraper.fetch_blocks(10, 10)
+    await scraper._parse_block(10, block)
+    assert [new - old for new, old in zip(get_samples(), before)] == [1, 1, 1, 1, 2, 1]
+
+    # The parts' own counters are exported too
+    assert REGISTRY.get_sample_value('scraper_heads_pushed', {'network': 'tron'}) == 0
+    assert REGISTRY.get_sample_value('scraper_confirmations_pending_blocks', {'network': 'tron'}) == 0
+    assert REGISTRY.get_sample_value('node_endpoint_requests', {
+        'network': 'tron', 'endpoint': 'http://localhost:8090',
+    }) is not None
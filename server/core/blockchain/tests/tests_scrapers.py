@@ -0,0 +1,644 @@
+import json
+import decimal
+import random
+import asyncio
+
+import pytest
+from hexbytes import HexBytes
+from eth_utils import to_checksum_address
+
+from core.blockchain.models import Network, NetworkFamily
+from core.blockchain.gates.base import NodeError
+from core.blockchain.messages import get_message_codec
+from core.blockchain.scrapers.base import BlockWatermark, Message
+from core.blockchain.storages import Checkpoint, CheckpointStorage, decode_ranges, encode_ranges, get_ranges
+from core.blockchain.scrapers import TronTransactionScraper
+
+
+def get_network(family: NetworkFamily = NetworkFamily.tron) -> Network:
+    return Network(
+        id=1,
+        name='Tron',
+        short_name='tron',
+        native_symbol='TRX',
+        native_decimal_place=6 if family == NetworkFamily.tron else 18,
+        node_url='http://localhost:8090',
+        family=family,
+    )
+
+
+def test_block_watermark():
+    watermark = BlockWatermark(safe_block=9)
+
+    assert not watermark.complete(11)
+    assert not watermark.complete(12)
+    assert watermark.safe_block == 9
+
+    assert watermark.complete(10)
+    assert watermark.safe_block == 12
+
+    assert not watermark.complete(5)
+    assert watermark.safe_block == 12
+
+
+@pytest.mark.anyio
+async def test_scrape_blocks_checkpoint(mocker):
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.confirmations = None
+    scraper.block_window_size = 8
+    scraper.node.blocks_batch_size = 4
+    scraper.watermark = BlockWatermark(safe_block=99)
+
+    checkpoints = []
+
+    async def get_block_detail(block_number: int) -> dict:
+        await asyncio.sleep(random.random() / 100)
+        return {'number': block_number}
+
+    async def get_blocks_detail(start_block: int, end_block: int) -> list[dict]:
+        await asyncio.sleep(random.random() / 100)
+        return [{'number': block_number} for block_number in range(start_block, end_block + 1)]
+
+    async def parse_block(block_number: int, block: dict):
+        await asyncio.sleep(random.random() / 100)
+
+    async def storage_save(checkpoint: Checkpoint):
+        checkpoints.append(checkpoint.safe_block)
+
+    mocker.patch.object(scraper.node, 'get_block_detail', new=get_block_detail)
+    mocker.patch.object(scraper.node, 'get_blocks_detail', new=get_blocks_detail)
+    mocker.patch.object(scraper, 'parse_block', new=parse_block)
+    mocker.patch.object(scraper.storage, 'save', new=storage_save)
+
+    await scraper.scrape_blocks(start_block=100, end_block=150)
+
+    assert scraper.watermark.safe_block == 150
+    assert checkpoints == sorted(checkpoints)
+    assert checkpoints[-1] == 150
+
+
+@pytest.mark.anyio
+async def test_scrape_blocks_raises_on_failed_chunk(mocker):
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.confirmations = None
+    scraper.block_window_size = 8
+    scraper.node.blocks_batch_size = 4
+    scraper.watermark = BlockWatermark(safe_block=99)
+    processed = []
+
+    async def process_blocks(start_block: int, end_block: int, checkpoint: bool = True):
+        if start_block == 100:
+            raise KeyError('raw_data')
+        await asyncio.sleep(0.01)
+        processed.append(start_block)
+
+    mocker.patch.object(scraper, 'process_blocks', new=process_blocks)
+
+    with pytest.raises(KeyError):
+        await scraper.scrape_blocks(start_block=100, end_block=150, checkpoint=False)
+    # Chunks in flight are cancelled, none is started after the failure
+    assert processed == []
+
+
+class FakeCheckpointStorage:
+    """`SAVE_CHECKPOINT_SCRIPT` without Redis"""
+
+    def __init__(self, values: dict = None):
+        self.values = values or {}
+
+    async def async_eval(self, script: str, keys: list, args: list) -> int:
+        stored = self.values.get(keys[0], {})
+        if b'safe_block' in stored and int(stored[b'safe_block']) > args[0]:
+            return int(stored[b'safe_block'])
+        self.values[keys[0]] = {b'safe_block': str(args[0]).encode(), b'ranges': args[1].encode()}
+        return args[0]
+
+    async def async_hgetall(self, key: str) -> dict:
+        return self.values.get(key, {})
+
+    async def async_get(self, key: str):
+        return self.values.get(key)
+
+
+def test_checkpoint_ranges():
+    watermark = BlockWatermark(safe_block=9, ranges=((12, 13), (15, 15)))
+    checkpoint = watermark.get_checkpoint()
+    assert checkpoint == Checkpoint(safe_block=9, ranges=((12, 13), (15, 15)))
+    assert watermark.get_gaps(5, 20) == [(10, 11), (14, 14), (16, 20)]
+    assert watermark.get_gaps(12, 13) == []
+
+    watermark.complete(10)
+    watermark.complete(11)
+    assert watermark.safe_block == 13
+    assert watermark.get_checkpoint() == Checkpoint(safe_block=13, ranges=((15, 15),))
+
+    assert checkpoint.clip(12) == Checkpoint(safe_block=9, ranges=((12, 12),))
+    assert checkpoint.clip(8) == Checkpoint(safe_block=8)
+    assert get_ranges([9, 5, 6, 7]) == ((5, 7), (9, 9))
+    assert decode_ranges(encode_ranges(checkpoint.ranges)) == checkpoint.ranges
+    assert decode_ranges('') == ()
+
+
+@pytest.mark.anyio
+async def test_checkpoint_storage():
+    storage = FakeCheckpointStorage({'TronTransactionScraper': b'41'})
+    checkpoints = CheckpointStorage(network_id=1, legacy_key='TronTransactionScraper', storage=storage)
+    # The former plain block number is read till the first save
+    assert await checkpoints.load() == Checkpoint(safe_block=41)
+
+    assert await checkpoints.save(Checkpoint(safe_block=50, ranges=((52, 60),))) == 50
+    assert await checkpoints.load() == Checkpoint(safe_block=50, ranges=((52, 60),))
+
+    # A lagging process never moves the safe block back
+    assert await checkpoints.save(Checkpoint(safe_block=45)) == 50
+    assert await checkpoints.load() == Checkpoint(safe_block=50, ranges=((52, 60),))
+
+
+@pytest.mark.anyio
+async def test_scrape_blocks_resumes_at_gaps(mocker):
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.confirmations = None
+    scraper.node.blocks_batch_size = 4
+    scraper.storage = CheckpointStorage(network_id=1, storage=FakeCheckpointStorage())
+    await scraper.storage.save(Checkpoint(safe_block=99, ranges=((102, 107), (110, 110))))
+    fetched = []
+
+    async def get_blocks_detail(start_block: int, end_block: int) -> list[dict]:
+        fetched.append((start_block, end_block))
+        return [{'number': block_number} for block_number in range(start_block, end_block + 1)]
+
+    async def parse_block(block_number: int, block: dict):
+        pass
+
+    mocker.patch.object(scraper.node, 'get_blocks_detail', new=get_blocks_detail)
+    mocker.patch.object(scraper, 'parse_block', new=parse_block)
+
+    checkpoint = await scraper.storage.load()
+    scraper.watermark = BlockWatermark(safe_block=checkpoint.safe_block, ranges=checkpoint.ranges)
+    scraper._persisted = checkpoint
+    await scraper.scrape_blocks(start_block=100, end_block=112)
+
+    # Blocks done before the restart are not fetched again
+    assert sorted(fetched) == [(100, 101), (108, 109), (111, 112)]
+    assert await scraper.storage.load() == Checkpoint(safe_block=112)
+
+
+@pytest.mark.anyio
+async def test_evm_get_blocks_detail(mocker):
+    from core.blockchain.gates import EVMNode
+
+    node = EVMNode(network=get_network(family=NetworkFamily.evm))
+    node.rpc_batch_size = 3
+    requests = []
+
+    async def post(endpoint, data: bytes) -> list:
+        calls = json.loads(data)
+        requests.append(calls)
+        return [
+            {'jsonrpc': '2.0', 'id': call['id'], 'result': {'number': call['params'][0], 'transactions': [
+                {'hash': '0x' + '11' * 32, 'from': '0x' + 'ab' * 20, 'value': '0xde0b6b3a7640000'},
+            ]}}
+            for call in reversed(calls)
+        ]
+
+    mocker.patch.object(node, 'post', new=post)
+
+    blocks = await node.get_blocks_detail(start_block=10, end_block=16)
+    assert [block.number for block in blocks] == list(range(10, 17))
+    assert [len(calls) for calls in requests] == [3, 3, 1]
+    transaction = blocks[0].transactions[0]
+    assert transaction['hash'] == HexBytes('0x' + '11' * 32)
+    assert transaction['from'] == to_checksum_address('0x' + 'ab' * 20)
+    assert transaction['value'] == 10 ** 18
+    assert {call['method'] for calls in requests for call in calls} == {'eth_getBlockByNumber'}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize('response', [
+    {'jsonrpc': '2.0', 'error': {'code': -32005, 'message': 'limit exceeded'}},
+    [{'jsonrpc': '2.0', 'id': 0, 'result': None}],
+    [{'jsonrpc': '2.0', 'id': 0, 'result': None}, {'jsonrpc': '2.0', 'id': 1}],
+    [{'jsonrpc': '2.0', 'id': 0, 'result': None}, {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000}}],
+    [{'jsonrpc': '2.0', 'result': None}, {'jsonrpc': '2.0', 'id': 1, 'result': None}],
+])
+async def test_evm_batch_request_malformed(mocker, response):
+    from core.blockchain.gates import EVMNode
+    node = EVMNode(network=get_network(family=NetworkFamily.evm))
+    mocker.patch.object(node, 'post', new=mocker.AsyncMock(return_value=response))
+
+    with pytest.raises(NodeError):
+        await node.make_batch_request('eth_getTransactionReceipt', [['0x01'], ['0x02']])
+
+
+@pytest.mark.anyio
+async def test_tron_get_blocks_detail(mocker):
+    from core.blockchain.gates import TronNode
+
+    node = TronNode(network=get_network())
+    node.range_request_limit = 4
+    requests = []
+
+    async def make_request(method: str, params: dict = None) -> dict:
+        assert method == 'wallet/getblockbylimitnext'
+        requests.append((params['startNum'], params['endNum']))
+        return {'block': [
+            {'block_header': {'raw_data': {'number': number}}}
+            for number in reversed(range(params['startNum'], params['endNum']))
+        ]}
+
+    mocker.patch.object(node.provider, 'make_request', new=make_request)
+
+    blocks = await node.get_blocks_detail(start_block=100, end_block=109)
+    assert [block['block_header']['raw_data']['number'] for block in blocks] == list(range(100, 110))
+    assert requests == [(100, 104), (104, 108), (108, 110)]
+
+
+@pytest.mark.anyio
+async def test_tron_get_blocks_detail_error(mocker):
+    from tronpy.exceptions import BugInJavaTron
+    from core.blockchain.gates import TronNode
+
+    node = TronNode(network=get_network())
+    mocker.patch.object(node.provider, 'make_request', new=mocker.AsyncMock(return_value={
+        'Error': 'class java.lang.IllegalArgumentException : too many blocks',
+    }))
+
+    with pytest.raises(BugInJavaTron, match='too many blocks'):
+        await node.get_blocks_detail(start_block=100, end_block=109)
+
+
+@pytest.mark.anyio
+async def test_evm_logs_messages(mocker):
+    from hexbytes import HexBytes
+    from core.blockchain.scrapers import EVMTransactionScraper
+    from core.blockchain.addresses import to_key, to_topic
+    from core.blockchain.gates.evm import TRANSFER_TOPIC
+
+    usdt = '0x55d398326f99059fF775485246999027B3197955'
+    sender = '0x8894E0a0c962CB723c1976a4421c95949bE2D4E3'
+    deposit = '0x28C6c06298d514Db089934071355E5743bf21d60'
+
+    scraper = EVMTransactionScraper(network=get_network(family=NetworkFamily.evm))
+    scraper.stable_coins = {to_key(usdt): (7, 18)}
+    # Stored in lowercase, found by the key of the log topic
+    scraper.watched_addresses.apply('created', deposit.lower(), 42)
+
+    def get_log(to_address: str) -> dict:
+        return {
+            'address': usdt,
+            'blockNumber': 101,
+            'transactionHash': HexBytes('0x' + 'ab' * 32),
+            'topics': [
+                HexBytes(TRANSFER_TOPIC),
+                HexBytes(to_topic(to_key(sender))),
+                HexBytes(to_topic(to_key(to_address))),
+            ],
+            'data': HexBytes((25 * 10 ** 17 + 1).to_bytes(32, 'big')),
+        }
+
+    async def get_transfer_logs(start_block: int, end_block: int, contracts: list, recipients: list = None):
+        assert (start_block, end_block, contracts, recipients) == (100, 102, [to_key(usdt)], [to_key(deposit)])
+        return [get_log(deposit), get_log(sender)]
+
+    receipts = {'0x' + 'ab' * 32: {'gasUsed': 21000, 'effectiveGasPrice': 3 * 10 ** 9}}
+
+    async def get_blocks_header(block_numbers: list) -> dict:
+        return {number: {'number': number, 'timestamp': 1700000000} for number in block_numbers}
+
+    async def get_transactions_receipt(transaction_hashes: list) -> dict:
+        return {tx: receipts[tx] for tx in transaction_hashes if tx in receipts}
+
+    mocker.patch.object(scraper.node, 'get_transfer_logs', new=get_transfer_logs)
+    mocker.patch.object(scraper.node, 'get_blocks_header', new=get_blocks_header)
+    mocker.patch.object(scraper.node, 'get_transactions_receipt', new=get_transactions_receipt)
+
+    message, = await scraper.get_logs_messages(start_block=100, end_block=102)
+    assert message.order_id == 42 and message.currency_id == 7
+    assert message.amount == decimal.Decimal('2.500000000000000001')
+    assert message.fee == decimal.Decimal('0.000063')
+    assert message.inputs[0].address == sender and message.outputs[0].address == deposit
+    assert message.timestamp == 1700000000
+
+    # Receipt not on the node yet: a transient error, the range is retried
+    receipts.clear()
+    with pytest.raises(NodeError, match='receipts not found'):
+        await scraper.get_logs_messages(start_block=100, end_block=102)
+
+
+def get_tron_transfer(tx_id: str, to_address: str, amount: int) -> dict:
+    return {
+        'txID': tx_id,
+        'ret': [{'contractRet': 'SUCCESS'}],
+        'raw_data': {
+            'timestamp': 1700000000000,
+            'contract': [{
+                'type': 'TransferContract',
+                'parameter': {'value': {
+                    'owner_address': 'TJCnKsPa7y5okkXvQAidZBzqx3QyQ6sxMW',
+                    'to_address': to_address,
+                    'amount': amount,
+                }},
+            }],
+        },
+    }
+
+
+@pytest.mark.anyio
+async def test_tron_block_fee_loaded_once(mocker):
+    deposit = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.confirmations = None
+    scraper.watched_addresses.apply('created', deposit, 42)
+
+    requested_blocks, messages = [], []
+
+    async def get_block_transactions_info(block_number: int) -> list:
+        requested_blocks.append(block_number)
+        await asyncio.sleep(0)
+        return [
+            {'id': 'tx-1', 'fee': 1100000, 'receipt': {'net_usage': 268}},
+            {'id': 'tx-2', 'fee': 0, 'receipt': {'net_usage': 268}},
+        ]
+
+    def send_task(task_path: str, kwargs: dict, **options):
+        decode = get_message_codec(kwargs['codec']).decode
+        messages.extend(decode(message) for message in kwargs['messages'])
+
+    mocker.patch.object(scraper.node, 'get_block_transactions_info', new=get_block_transactions_info)
+    mocker.patch('core.blockchain.publishers.celery_app.send_task', new=send_task)
+
+    await scraper.process_block(block_number=500, checkpoint=False, block={'transactions': [
+        get_tron_transfer('tx-1', deposit, 2_000_000),
+        get_tron_transfer('tx-2', deposit, 3_000_000),
+        get_tron_transfer('tx-3', 'TJCnKsPa7y5okkXvQAidZBzqx3QyQ6sxMW', 1_000_000),
+    ]})
+    await scraper.publisher.flush()
+
+    assert requested_blocks == [500]
+    assert sorted(
+        (message.transaction_id, decimal.Decimal(message.fee), decimal.Decimal(message.amount))
+        for message in messages
+    ) == [
+        ('tx-1', decimal.Decimal('1.1'), decimal.Decimal('2')),
+        ('tx-2', decimal.Decimal('0'), decimal.Decimal('3')),
+    ]
+    assert messages[0].commission_detail['net_usage'] == 268
+
+
+@pytest.mark.anyio
+async def test_tron_block_fee_not_indexed_yet(mocker):
+    deposit = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.confirmations = None
+    scraper.retry_delay = 0
+    scraper.watched_addresses.apply('created', deposit, 42)
+    responses = [[], [{'id': 'tx-1', 'fee': 1100000, 'receipt': {}}]]
+    published = []
+
+    async def get_block_transactions_info(block_number: int) -> list:
+        return responses.pop(0)
+
+    async def publish(messages: list[Message]):
+        published.extend(messages)
+
+    mocker.patch.object(scraper.node, 'get_block_transactions_info', new=get_block_transactions_info)
+    mocker.patch.object(scraper, 'publish', new=publish)
+
+    # A lagging node answers `{}`: the block is parsed again, not stored with a zero fee
+    await scraper.process_block(block_number=500, checkpoint=False, block={'transactions': [
+        get_tron_transfer('tx-1', deposit, 2_000_000),
+    ]})
+    assert responses == []
+    assert [message.fee for message in published] == [decimal.Decimal('1.1')]
+    assert not scraper._blocks_fee
+
+
+def get_message(transaction_id: str) -> Message:
+    return Message(
+        timestamp=0,
+        order_id=42,
+        network_id=1,
+        transaction_id=transaction_id,
+        fee=decimal.Decimal(0),
+        commission_detail={},
+        amount=decimal.Decimal(1),
+        inputs=[],
+        outputs=[],
+    )
+
+
+@pytest.mark.anyio
+async def test_process_block_retries_transient_errors(mocker):
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.confirmations = None
+    scraper.retry_delay = 0
+    scraper.watermark = BlockWatermark(safe_block=99)
+    calls, events = [], []
+
+    async def parse_block(block_number: int, block: dict) -> list[Message]:
+        calls.append(block_number)
+        if len(calls) < 3:
+            raise OSError('connection reset')
+        return [get_message('tx-1'), get_message('tx-2')]
+
+    def send_task(task_path: str, kwargs: dict, **options):
+        decode = get_message_codec(kwargs['codec']).decode
+        events.append([decode(message).transaction_id for message in kwargs['messages']])
+
+    async def storage_save(checkpoint: Checkpoint):
+        events.append(checkpoint.safe_block)
+
+    mocker.patch.object(scraper, 'parse_block', new=parse_block)
+    mocker.patch('core.blockchain.publishers.celery_app.send_task', new=send_task)
+    mocker.patch.object(scraper.storage, 'save', new=storage_save)
+
+    await scraper.process_block(block_number=100, block={})
+
+    assert calls == [100, 100, 100]
+    # One task for the block, sent before the checkpoint
+    assert events == [['tx-1', 'tx-2'], 100]
+    assert scraper.watermark.safe_block == 100
+
+
+@pytest.mark.anyio
+async def test_process_block_raises_on_bug(mocker):
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.retry_delay = 0
+    scraper.watermark = BlockWatermark(safe_block=99)
+    parse_block = mocker.AsyncMock(side_effect=KeyError('raw_data'))
+
+    mocker.patch.object(scraper, 'parse_block', new=parse_block)
+
+    with pytest.raises(KeyError):
+        await scraper.process_block(block_number=100, block={})
+
+    assert parse_block.await_count == 1
+    assert scraper.watermark.safe_block == 99
+
+
+@pytest.mark.anyio
+async def test_process_block_gives_up_after_max_attempts(mocker):
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.retry_attempts = 3
+    scraper.retry_delay = 0
+    parse_block = mocker.AsyncMock(side_effect=OSError('connection reset'))
+
+    mocker.patch.object(scraper, 'parse_block', new=parse_block)
+
+    with pytest.raises(OSError):
+        await scraper.process_block(block_number=100, block={}, checkpoint=False)
+
+    assert parse_block.await_count == 3
+
+
+@pytest.mark.anyio
+async def test_publisher_flush_failure_does_not_resend(mocker):
+    from core.blockchain.messages import MsgpackMessageCodec
+    from core.blockchain.publishers import MessagePublisher
+
+    publisher = MessagePublisher(task_path='task', codec=MsgpackMessageCodec, batch_size=2)
+    sent, failed = [], []
+
+    def send_task(task_path: str, kwargs: dict, **options):
+        decode = get_message_codec(kwargs['codec']).decode
+        transaction_ids = [decode(message).transaction_id for message in kwargs['messages']]
+        if transaction_ids[0] == 'tx-3' and not failed:
+            failed.append(transaction_ids[0])
+            raise OSError('broker is gone')
+        sent.append(transaction_ids)
+
+    mocker.patch('core.blockchain.publishers.celery_app.send_task', new=send_task)
+
+    publisher.add([get_message(f'tx-{number}') for number in range(1, 6)])
+    assert publisher.is_full
+
+    with pytest.raises(OSError):
+        await publisher.flush()
+    assert sent == [['tx-1', 'tx-2']] and len(publisher) == 3
+
+    await publisher.flush()
+    assert sent == [['tx-1', 'tx-2'], ['tx-3', 'tx-4'], ['tx-5']]
+    assert len(publisher) == 0 and publisher.batches == 3 and publisher.published == 5
+
+
+@pytest.mark.anyio
+async def test_tron_prefilter_skips_non_candidates(mocker):
+    deposit = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+    scraper_class = type('Scraper', (TronTransactionScraper,), {'use_prefilter': True})
+    scraper = scraper_class(network=get_network())
+    scraper.watched_addresses.apply('created', deposit, 42)
+    await scraper.prefilter.rebuild(scraper.get_prefilter_addresses())
+
+    scrape_transaction = mocker.AsyncMock(return_value=None)
+    mocker.patch.object(scraper, 'scrape_transaction', new=scrape_transaction)
+
+    await scraper.parse_block(block_number=500, block={'transactions': [
+        get_tron_transfer('tx-1', deposit, 2_000_000),
+        get_tron_transfer('tx-2', 'TJCnKsPa7y5okkXvQAidZBzqx3QyQ6sxMW', 1_000_000),
+    ]})
+
+    assert [call.kwargs['transaction']['txID'] for call in scrape_transaction.await_args_list] == ['tx-1']
+
+
+class FakeDependenciesStorage:
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.applied = {}
+        self.evals = []
+
+    async def async_get(self, key: str):
+        return str(self.version).encode()
+
+    async def async_hset(self, key: str, field: str, value: str):
+        self.applied[field] = json.loads(value)['version']
+
+    async def async_eval(self, script: str, keys: list, args: list) -> int:
+        self.evals.append((keys, args))
+        self.version += 1
+        return self.version
+
+
+@pytest.mark.anyio
+async def test_publish_dependency_change():
+    from core.blockchain.events import (
+        DependencyAction, DependencyKind, parse_dependency_change, publish_dependency_change,
+    )
+
+    storage = FakeDependenciesStorage(version=4)
+    assert await publish_dependency_change(1, DependencyKind.STABLE_COIN, DependencyAction.SAVED, 7, storage) == 5
+    keys, args = storage.evals[0]
+    assert keys == ['dependencies:version:1', 'dependencies:1']
+    assert parse_dependency_change(b'5 ' + args[0].encode()) == (5, {'kind': 'stable_coin', 'action': 'saved', 'id': 7})
+
+
+@pytest.mark.anyio
+async def test_dependency_moved_to_another_network(mocker):
+    from core.blockchain.admin import StableCoinAdmin
+    from core.blockchain.models import StableCoin
+
+    published = []
+
+    async def publish_dependency_change(network_id, kind, action, dependency_id):
+        published.append((network_id, action.value, dependency_id))
+
+    mocker.patch('core.blockchain.admin.publish_dependency_change', new=publish_dependency_change)
+    admin = StableCoinAdmin()
+    coin = StableCoin(id=7, network_id=1)
+
+    await admin.on_model_change({}, coin, is_created=False)
+    coin.network_id = 2
+    await admin.after_model_change({}, coin, is_created=False)
+    # The former network drops it, the new one loads it
+    assert published == [(1, 'deleted', 7), (2, 'saved', 7)]
+
+    await admin.on_model_change({}, coin, is_created=False)
+    await admin.after_model_change({}, coin, is_created=False)
+    assert published[2:] == [(2, 'saved', 7)]
+
+
+@pytest.mark.anyio
+async def test_scraper_applies_dependency_changes(mocker):
+    from core.blockchain.addresses import to_key
+    from core.blockchain.models import StableCoin, OrderProvider
+    from core.blockchain.events import DependencyAction, DependencyKind
+
+    old_address, new_address = to_key('TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'), 'TJCnKsPa7y5okkXvQAidZBzqx3QyQ6sxMW'
+    scraper = TronTransactionScraper(network=get_network())
+    scraper.dependencies_storage = storage = FakeDependenciesStorage()
+    scraper.stable_coins = {old_address: (1, 6)}
+    scraper.points_to_stable_coin_address = {1: old_address}
+    scraper.set_order_providers({3: to_key('TXLAQ63Xg1NAzckPwKHvzw7CSEmLMEqcdj')})
+    stable_coins_before = scraper.stable_coins
+
+    mocker.patch('core.blockchain.scrapers.base.StableCoinDAO.get_or_none', new=mocker.AsyncMock(
+        return_value=StableCoin(id=1, address=new_address, decimal_place=18, network_id=1),
+    ))
+    mocker.patch('core.blockchain.scrapers.base.OrderProviderDAO.get_or_none', new=mocker.AsyncMock(
+        return_value=OrderProvider(id=4, address='TEkxiTehnzSmSe2XqrBj4w32RUN966rdz8', network_id=2),
+    ))
+    reload = mocker.patch.object(scraper, 'update_dependencies', new=mocker.AsyncMock())
+
+    # Address of a stable coin changed in the admin
+    await scraper.apply_dependency_change(1, {
+        'kind': DependencyKind.STABLE_COIN, 'action': DependencyAction.SAVED, 'id': 1,
+    })
+    assert scraper.stable_coins == {to_key(new_address): (1, 18)}
+    assert scraper.points_to_stable_coin_address == {1: to_key(new_address)}
+    assert stable_coins_before == {old_address: (1, 6)}
+
+    await scraper.apply_dependency_change(2, {'kind': DependencyKind.ORDER_PROVIDER, 'action': 'deleted', 'id': 3})
+    # Saved for another network: not this scraper's
+    await scraper.apply_dependency_change(3, {'kind': DependencyKind.ORDER_PROVIDER, 'action': 'saved', 'id': 4})
+    assert not scraper.order_providers and scraper.dependencies_version == 3
+
+    # Replayed change is ignored, a lost one means a full reload
+    await scraper.apply_dependency_change(3, {'kind': DependencyKind.STABLE_COIN, 'action': 'deleted', 'id': 1})
+    assert not reload.called
+    await scraper.apply_dependency_change(5, {'kind': DependencyKind.STABLE_COIN, 'action': 'deleted', 'id': 1})
+    assert reload.call_count == 1 and scraper.dependencies_version == 5
+
+    # The safety net picks up a version announced while nobody listened
+    storage.version = 6
+    await scraper.check_dependencies_version()
+    assert reload.call_count == 2
+    assert list(storage.applied.values()) == [6]
@@ -0,0 +1,95 @@
+import decimal
+from collections import namedtuple
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from core.blockchain.dao import PaymentDAO
+from core.blockchain.events import OrderEvent
+from core.blockchain.messages import Message, JSONMessageCodec
+from core.blockchain.models import OrderStatus
+
+PaidOrder = namedtuple('PaidOrder', ['id', 'network_id', 'address', 'status'])
+
+
+def get_message(transaction_id: str, order_id: int = 42, network_id: int = 1) -> Message:
+    return Message(
+        timestamp=1700000000000,
+        order_id=order_id,
+        network_id=network_id,
+        transaction_id=transaction_id,
+        fee=decimal.Decimal('0.1'),
+        commission_detail={},
+        amount=decimal.Decimal('1.5'),
+        inputs=[],
+        outputs=[],
+        block_number=100,
+    )
+
+
+def compile_query(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_payment_rows():
+    rows = PaymentDAO.get_rows([
+        get_message('tx-2', order_id=2),
+        get_message('tx-1', order_id=1),
+        get_message('tx-2', order_id=2),
+        get_message('tx-1', order_id=3, network_id=2),
+    ])
+    # Duplicates of the batch are dropped, rows are sorted by transaction
+    assert [(row['network_id'], row['transaction_id']) for row in rows] == [(1, 'tx-1'), (1, 'tx-2'), (2, 'tx-1')]
+    assert rows[0]['amount'] == decimal.Decimal('1.5') and rows[0]['block_number'] == 100
+
+    insert_query = compile_query(PaymentDAO.get_insert_query(rows))
+    assert insert_query.count('VALUES') == 1 and insert_query.count('), (') == 2
+    assert 'ON CONFLICT (network_id, transaction_id) DO NOTHING' in insert_query
+
+    pay_query = compile_query(PaymentDAO.get_pay_query([1, 2, 3]))
+    assert pay_query.startswith('UPDATE blockchain__order SET status=')
+    assert 'RETURNING blockchain__order.id' in pay_query
+    # Paid only once the payments in the order currency cover its amount
+    assert 'sum(blockchain__payment.amount)' in pay_query
+    assert 'blockchain__payment.currency_id IS NOT DISTINCT FROM blockchain__order.currency_id' in pay_query
+    assert '>= blockchain__order.amount' in pay_query
+
+
+def test_batch_task_redelivery(mocker):
+    from core.blockchain.tasks import parsing_daemons_messages_batch_task, RETRY_OPTIONS
+
+    assert RETRY_OPTIONS['acks_late'] and RETRY_OPTIONS['max_retries'] is None
+
+    saved, published, released = [], [], []
+    paid_order = PaidOrder(id=42, network_id=1, address='TAddress', status=OrderStatus.paid)
+
+    async def save_messages(messages: list[Message]) -> list:
+        saved.append([message.transaction_id for message in messages])
+        return [paid_order]
+
+    mocker.patch.object(PaymentDAO, 'save_messages', new=save_messages)
+    mocker.patch('core.blockchain.dao.sync_publish_order_events', new=published.extend)
+    mocker.patch(
+        'core.blockchain.tasks.sync_release_in_flight',
+        new=lambda network_id, count: released.append((network_id, count)),
+    )
+    messages = [JSONMessageCodec.encode(get_message('tx-1')), JSONMessageCodec.encode(get_message('tx-2'))]
+
+    # The worker died before the ack: the same batch is handled again and publishes its events again
+    parsing_daemons_messages_batch_task(messages=messages)
+    parsing_daemons_messages_batch_task(messages=messages)
+    assert saved == [['tx-1', 'tx-2']] * 2
+    assert published == [(1, OrderEvent.PAID, 'TAddress', 42)] * 2
+    assert released == [(1, 2)] * 2
+
+    # Retried with a backoff: the credit stays taken till the batch is done
+    mocker.patch.object(PaymentDAO, 'save_messages', side_effect=OSError('database is gone'))
+    with pytest.raises(OSError):
+        parsing_daemons_messages_batch_task(messages=messages)
+    assert len(released) == 2
+
+    # A bug is not retried: the batch is done
+    mocker.patch.object(PaymentDAO, 'save_messages', side_effect=KeyError('order_id'))
+    with pytest.raises(KeyError):
+        parsing_daemons_messages_batch_task(messages=messages)
+    assert len(released) == 3
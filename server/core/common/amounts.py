@@ -0,0 +1,62 @@
+"""
+Raw integer units of a coin to `Decimal` and back, exactly: no float on the way.
+`Decimal(raw).scaleb(-decimal_place)` in the default context rounds to 28 digits while a uint256 has up to 78,
+so scaling runs in a context wide enough for any raw amount. A `Scale` per decimal place is built once.
+"""
+import json
+import decimal
+import functools
+from typing import Iterable, Union
+
+UINT256_DIGITS = 78
+CONTEXT = decimal.Context(prec=UINT256_DIGITS)
+
+Number = Union[int, float, str, decimal.Decimal]
+
+
+class Scale:
+    __slots__ = ('decimal_place', 'context')
+
+    def __init__(self, decimal_place: int):
+        self.decimal_place = decimal_place
+        self.context = CONTEXT
+
+    def __call__(self, raw_amount: int) -> decimal.Decimal:
+        return decimal.Decimal(raw_amount).scaleb(-self.decimal_place, self.context)
+
+    def many(self, raw_amounts: Iterable[int]) -> list[decimal.Decimal]:
+        exponent, context = -self.decimal_place, self.context
+        return [decimal.Decimal(raw_amount).scaleb(exponent, context) for raw_amount in raw_amounts]
+
+    def to_raw(self, amount: decimal.Decimal) -> int:
+        """`Scale.__call__` backwards, an amount with more decimal places than the coin is a bug"""
+        raw_amount = amount.scaleb(self.decimal_place, self.context)
+        if raw_amount != raw_amount.to_integral_value():
+            raise ValueError(f'{amount} has more than {self.decimal_place} decimal places')
+        return int(raw_amount)
+
+
+@functools.lru_cache(maxsize=None)
+def get_scale(decimal_place: int) -> Scale:
+    return Scale(decimal_place)
+
+
+def scale_amount(raw_amount: int, decimal_place: int) -> decimal.Decimal:
+    return get_scale(decimal_place)(raw_amount)
+
+
+def scale_amounts(raw_amounts: Iterable[int], decimal_place: int) -> list[decimal.Decimal]:
+    return get_scale(decimal_place).many(raw_amounts)
+
+
+def to_decimal(value: Number) -> decimal.Decimal:
+    """A price of an API: a float is taken as its shortest repr, the digits the API sent"""
+    if isinstance(value, decimal.Decimal):
+        return value
+    if isinstance(value, float):
+        return decimal.Decimal(repr(value))
+    return decimal.Decimal(value)
+
+
+# `json.loads` keeping the digits of fractional numbers: no float at all
+loads = functools.partial(json.loads, parse_float=decimal.Decimal)
@@ -0,0 +1,101 @@
+"""
+Prometheus metrics of the app and the daemon processes on `prometheus_client`.
+Children are bound to their label values once, off the hot path: `labels(STAGE, network='tron')`.
+With metrics disabled every child is a shared no-op, recording costs one method call.
+"""
+from typing import Callable, Iterable, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector, CollectorRegistry
+
+import settings
+
+__all__ = (
+    'CONTENT_TYPE_LATEST',
+    'REGISTRY',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'generate_latest',
+    'start_http_server',
+    'DEFAULT_BUCKETS',
+    'NULL_CHILD',
+    'labels',
+    'StatsCollector',
+)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class NullChild:
+    """Every child with metrics disabled"""
+    __slots__ = ()
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self) -> 'NullChild':
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_CHILD = NullChild()
+
+
+def labels(metric, **label_values):
+    """Child of the metric for the label values, the metric itself without labels"""
+    if not settings.METRICS_ENABLED:
+        return NULL_CHILD
+    return metric.labels(**label_values) if label_values else metric
+
+
+class StatsCollector(Collector):
+    """
+    Gauges of objects keeping their own counters, read on every scrape: each numeric value of
+    `source()` is `{name}_{key}`. `PREFILTER.add(prefilter.metrics, network='tron')`
+    exports `scraper_prefilter_keys{network="tron"}` and the rest of `prefilter.metrics()`.
+    A source added again for the same label values replaces the former one.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...],
+                 registry: Optional[CollectorRegistry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._sources: dict[tuple[str, ...], Callable[[], dict]] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def add(self, source: Callable[[], dict], **label_values):
+        if settings.METRICS_ENABLED:
+            self._sources[tuple(str(label_values[name]) for name in self.labelnames)] = source
+
+    def describe(self) -> Iterable:
+        # The names depend on the sources: nothing to check on register
+        return []
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        families: dict[str, GaugeMetricFamily] = {}
+        for label_values, source in list(self._sources.items()):
+            for key, value in source().items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if (family := families.get(key)) is None:
+                    family = families[key] = GaugeMetricFamily(
+                        f'{self.name}_{key}', f'{self.documentation}: {key}', labels=self.labelnames,
+                    )
+                family.add_metric(label_values, float(value))
+        return families.values()
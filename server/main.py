@@ -1,9 +1,13 @@
+import time
+
 import fastapi
+from fastapi.responses import Response
 from sqladmin import Admin
 
 from config.database import engine, extra_engines
 from config.auth import get_authentication_backend
 
+from core.common import metrics
 from core.blockchain import admin as blockchain_admin
 from core.blockchain import router as blockchain_router
 
@@ -35,3 +39,28 @@ admin.add_view(blockchain_admin.OrderProviderAdmin)
 
 # Include routers
 app.include_router(router=blockchain_router.router, prefix='/api')
+
+
+REQUEST_SECONDS = metrics.Histogram(
+    'http_request_seconds',
+    'API requests',
+    labelnames=('method', 'route', 'status'),
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+
+
+@app.middleware('http')
+async def measure_request(request: fastapi.Request, call_next):
+    started_at = time.perf_counter()
+    response = await call_next(request)
+    # The route template, not the path: ids in paths would blow up the label values
+    route = getattr(request.scope.get('route'), 'path', 'unmatched')
+    metrics.labels(REQUEST_SECONDS, method=request.method, route=route, status=response.status_code).observe(
+        time.perf_counter() - started_at,
+    )
+    return response
+
+
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.generate_latest(metrics.REGISTRY), media_type=metrics.CONTENT_TYPE_LATEST)
@@ -0,0 +1,60 @@
+"""
+Transaction scraper daemon.
+    python main_daemon.py                       - every active network, one process each
+    python main_daemon.py -n tron               - one network in the foreground
+    python main_daemon.py -n tron -s 1 -e 100   - blocks from 1 to 100 of one network
+    python main_daemon.py -n tron -s 1 -e 100 -b
+                                                - join the distributed backfill of blocks from 1 to 100
+"""
+import signal
+import asyncio
+import argparse
+
+from core.blockchain.models import Network
+from core.blockchain.daemon import DaemonSupervisor, run_scraper, run_backfill
+
+
+def get_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Transaction scraper daemon')
+    parser.add_argument('-n', '--network', type=str, default=None, help='Network short name, all if omitted')
+    parser.add_argument('-s', '--start', type=int, default=None, help='Start block')
+    parser.add_argument('-e', '--end', type=int, default=None, help='End block')
+    parser.add_argument('-b', '--backfill', action='store_true', help='Scan the range with other workers')
+    parser.add_argument('-c', '--chunk-size', type=int, default=1000, help='Blocks per backfill chunk')
+    return parser.parse_args()
+
+
+async def supervise():
+    task = asyncio.create_task(DaemonSupervisor().run())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    arguments = get_arguments()
+    if arguments.backfill:
+        if not (arguments.network and arguments.start and arguments.end):
+            raise SystemExit('Backfill needs a network, a start and an end block')
+        asyncio.run(run_backfill(
+            filters=[Network.short_name == arguments.network],
+            start_block=arguments.start,
+            end_block=arguments.end,
+            chunk_size=arguments.chunk_size,
+        ))
+    elif arguments.network:
+        asyncio.run(run_scraper(
+            filters=[Network.short_name == arguments.network],
+            start_block=arguments.start,
+            end_block=arguments.end,
+        ))
+    else:
+        asyncio.run(supervise())
+
+
+if __name__ == '__main__':
+    main()
@@ -30,10 +30,20 @@ CELERY_RESULT_BACKEND = REDIS_URL + '/4'
 CELERY_TASK_DEFAULT_QUEUE = 'celery'
 CELERY_BATCHES_QUEUE = 'sl_salary_batches'
 CELERY_BROKER_TRANSPORT_OPTIONS = {'confirm_publish': True}
-CELERY_ACCEPT_CONTENT = {'json', 'application/json'}
+CELERY_ACCEPT_CONTENT = {'json', 'application/json', 'msgpack', 'application/x-msgpack'}
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Scraper messages payload: `json` or `msgpack`, see `core.blockchain.messages`
+MESSAGE_CODEC = os.getenv('MESSAGE_CODEC', 'msgpack')
+
+# Prometheus metrics: `/metrics` of the app, of the daemon on METRICS_PORT and of its workers on METRICS_PORT + network id
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+
+# Local store of old blocks for replays, see `core.blockchain.gates.cache`. Empty - off
+BLOCK_CACHE_DIR = os.getenv('BLOCK_CACHE_DIR', '')
+
 EXCHANGERATE_API_KEY = os.getenv('EXCHANGERATE_API_KEY')
 
 BLOCKCHAIN_CENTRAL_WALLETS = {